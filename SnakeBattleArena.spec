@@ -0,0 +1,48 @@
+# -*- mode: python ; coding: utf-8 -*-
+# PyInstaller build of launcher.py, used by rebuild_distribution.bat:
+#
+#     pyinstaller SnakeBattleArena.spec --clean --noconfirm
+#
+# One-folder build: dist/SnakeBattleArena/ holds the executable next to its
+# libraries. A one-file executable unpacks all of them into a temporary
+# directory on every start, which made each start as slow as the first.
+import sys
+
+# Build the versioned, precompressed client that the executable serves
+sys.path.insert(0, SPECPATH)
+import assets
+assets.build()
+
+a = Analysis(
+    ['launcher.py'],
+    pathex=[],
+    binaries=[],
+    datas=[('static/build', 'static/build')],
+    # Loaded by name when Flask-SocketIO picks its async mode
+    hiddenimports=['engineio.async_drivers.threading'],
+    hookspath=[],
+    runtime_hooks=[],
+    # The frozen build always runs in threading mode (see app.select_async_mode)
+    excludes=['eventlet', 'dns', 'tkinter'],
+    noarchive=False,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='SnakeBattleArena',
+    console=True,
+    # UPX-packed libraries are unpacked in memory on every load
+    upx=False,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    name='SnakeBattleArena',
+)
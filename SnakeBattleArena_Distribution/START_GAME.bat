@@ -25,7 +25,7 @@ echo Check the console window for your network IP address
 echo Share that IP with friends to play multiplayer!
 echo.
 
-"SnakeBattleArena.exe"
+"SnakeBattleArena\SnakeBattleArena.exe"
 
 echo.
 echo Game server stopped.
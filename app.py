@@ -1,500 +1,594 @@
-from flask import Flask, render_template, request
+import importlib.util
+import os
+import sys
+
+# Number of room shards. 1 keeps every room in this process; more than 1 (or
+# 'auto' for one per CPU) runs each shard in its own worker process.
+SHARDS_SETTING = os.getenv('SNAKE_SHARDS', '1')
+
+def select_async_mode():
+    """Pick the Socket.IO async mode from SNAKE_ASYNC_MODE ('auto' by default).
+    
+    'auto' uses eventlet when it is installed, except in the frozen
+    (PyInstaller) build and with multi-process sharding, which stay on
+    threading.
+    """
+    requested = os.getenv('SNAKE_ASYNC_MODE', 'auto')
+    if requested != 'auto':
+        return requested
+    if getattr(sys, 'frozen', False) or SHARDS_SETTING != '1':
+        return 'threading'
+    # The server never looks up host names, so skip eventlet's green DNS
+    # resolver: importing dnspython is about a third of eventlet's import time
+    os.environ.setdefault('EVENTLET_NO_GREENDNS', 'yes')
+    if importlib.util.find_spec('eventlet') is None:
+        return 'threading'
+    return 'eventlet'
+
+ASYNC_MODE = select_async_mode()
+if ASYNC_MODE == 'eventlet':
+    # Patch before Flask and the engine create sockets, locks and threads: the
+    # tick scheduler (which also runs countdowns and comment timers) then runs
+    # as a green thread
+    import eventlet
+    eventlet.monkey_patch()
+
+from flask import Flask, Response, request
 from flask_socketio import SocketIO, emit, join_room, leave_room
+from socketio import packet
+import multiprocessing
+import threading
 import uuid
-import random
 import time
-import threading
-import traceback
+from array import array
+from itertools import chain
+
+import assets
+from engine import POWER_UP_CONFIG, PLAYER_COLORS, DIRECTIONS, SWALLOWED_EXCEPTIONS
+from metrics import REGISTRY, memory_in_use
+from profiling import MAX_SECONDS, PROFILES, merge_dumps
+from shards import ShardRouter, shard_for
 
-app = Flask(__name__)
+# The client is served prebuilt from memory (see assets.py), not from static/
+app = Flask(__name__, static_folder=None)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 
-# Fix for PyInstaller - use threading mode which is more reliable
+# PyInstaller builds stay on threading mode, which is more reliable there
 try:
-    socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+    socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE)
 except:
-    # Fallback if threading doesn't work
+    # Fallback if the selected mode doesn't work
     socketio = SocketIO(app, cors_allowed_origins="*")
 
-# Game state
-games = {}
-players = {}
-
-# Game settings
-GRID_SIZE = 20
-CANVAS_WIDTH = 800
-CANVAS_HEIGHT = 600
-
-# Funny mean comments for dead players
-MEAN_COMMENTS = [
-    "You suck! 😂",
-    "Haha you died! 💀",
-    "Better luck next time, loser! 🐍",
-    "That was embarrassing! 😆",
-    "You call that snake skills? 🙄",
-    "Even a turtle could play better! 🐢",
-    "Your snake died of shame! 😂",
-    "Did you forget how to use arrow keys? ⌨️",
-    "That was painful to watch! 😬",
-    "Maybe try checkers instead? 🔴",
-    "RIP your dignity! ⚰️",
-    "Your snake had commitment issues! 💔",
-    "I've seen rocks move faster! 🪨",
-    "That crash was epic! 💥",
-    "Snake.exe has stopped working! 🖥️",
-    "You got outplayed by a wall! 🧱",
-    "Press F to pay respects... to your skills! F",
-    "Your snake just rage quit! 😤",
-    "That's what we call a 'tactical disaster'! 🎯",
-    "Next time, try not dying! 💡",
-    "Skill issue detected! 🚨",
-    "Your snake went to the graveyard! 🪦",
-    "That was a masterclass in how NOT to play! 📚",
-    "Game over, man! Game over! 🎮",
-    "You made that look so easy... to lose! 🤣"
-]
+# Front-end state; rooms themselves live in the shards
+players = {}  # sid -> {'name', 'room'} once a shard has seated the player
+spectators = {}  # sid -> room_id for clients watching a room
+joining = {}  # sid -> room_id of the create_room or join_room forwarded for it, until a shard seats it
+client_encodings = {}  # sid -> 'binary' for clients that negotiated the binary wire format
+shard_stats = {}  # shard_id -> latest RoomService.stats() report
+client_assets = {}  # URL path -> assets.Asset, loaded by start_services
+
+CONNECTED_SOCKETS = REGISTRY.gauge('snake_connected_sockets', 'Connected Socket.IO clients')
+EMITTED_EVENTS = REGISTRY.counter('snake_emitted_events_total', 'Events sent to clients, one per recipient', ('event',))
+EMITTED_BYTES = REGISTRY.counter('snake_emitted_bytes_total', 'Encoded bytes sent to clients', ('event',))
+FRAMES_DROPPED = REGISTRY.counter('snake_frames_dropped_total',
+                                  'State frames superseded before a congested client could take them', ('event',))
+KEYFRAME_RESYNCS = REGISTRY.counter('snake_keyframe_resyncs_total',
+                                    'Keyframes requested for clients too far behind to patch deltas')
+CONGESTED_CLIENTS = REGISTRY.gauge('snake_congested_clients', 'Clients with state frames held back')
+SEND_QUEUE_PACKETS = REGISTRY.gauge('snake_send_queue_packets', 'Packets waiting in client send queues, total and worst',
+                                    ('stat',))
+
+def serve_asset(path):
+    """Answer from the prebuilt client: a 304 when the browser's copy is current,
+    else the precompressed body in the best encoding the browser takes"""
+    asset = client_assets.get(path)
+    if asset is None:
+        return {'error': 'Not found'}, 404
+    headers = {'ETag': 'W/"%s"' % asset.etag, 'Cache-Control': asset.cache_control, 'Vary': 'Accept-Encoding'}
+    if request.if_none_match.contains_weak(asset.etag):
+        return Response(status=304, headers=headers)
+    
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.bodies and request.accept_encodings[encoding]:
+            headers['Content-Encoding'] = encoding
+            break
+    else:
+        encoding = 'identity'
+    return Response(asset.bodies[encoding], headers=headers, content_type=asset.content_type)
 
 @app.route('/')
 def index():
     """Main game page"""
-    return render_template('index.html')
+    return serve_asset('/')
+
+@app.route('/assets/<name>')
+def client_asset(name):
+    """Versioned stylesheet and scripts of the page"""
+    return serve_asset('/assets/' + name)
 
 @app.route('/health')
 def health():
     """Health check endpoint"""
-    return {'status': 'ok', 'players': len(players), 'games': len(games)}
-
-# Game classes
-class Snake:
-    def __init__(self, x, y, color):
-        self.body = [(x, y)]
-        self.direction = 'RIGHT'
-        self.color = color
-        self.alive = True
-        self.score = 0
-        self.just_died = False  # New field to track fresh deaths
-        
-        # Power-up effects
-        self.speed_boost_time = 0  # Remaining time for speed boost (in updates)
-        self.invincible_time = 0   # Remaining time for invincibility
-        self.shield_active = False # One-time shield protection        self.normal_move_delay = 1 # Normal movement (every update)
-        self.speed_move_delay = 0.5 # Fast movement (every other update)
-        self.move_counter = 0      # Counter for speed boost timing
-    
-    def move(self):
-        if not self.alive or not self.body:
-            return
-        
-        # Handle speed boost timing
-        if self.speed_boost_time > 0:
-            self.move_counter += 1
-            # With speed boost, move every update (faster)
-            should_move = True
-            self.speed_boost_time -= 1
-        else:
-            # Normal speed - move every update
-            should_move = True
-        
-        if not should_move:
-            return
-            
-        head = self.body[0]
-        
-        if self.direction == 'UP':
-            new_head = (head[0], head[1] - 1)
-        elif self.direction == 'DOWN':
-            new_head = (head[0], head[1] + 1)
-        elif self.direction == 'LEFT':
-            new_head = (head[0] - 1, head[1])
-        elif self.direction == 'RIGHT':
-            new_head = (head[0] + 1, head[1])        
-        else:
-            return
-        
-        self.body.insert(0, new_head)
+    reports = list(shard_stats.values())
+    evictions = {}
+    for report in reports:
+        for state, count in report.get('evictions', {}).items():
+            evictions[state] = evictions.get(state, 0) + count
+    memory = memory_in_use()
+    return {'status': 'ok', 'players': len(players),
+            'spectators': sum(report.get('spectators', 0) for report in reports),
+            'games': sum(report['games'] for report in reports),
+            'running_games': sum(report['running_games'] for report in reports),
+            'max_tick_jitter_ms': round(max((report['max_tick_jitter'] for report in reports), default=0.0) * 1000, 2),
+            'cpu_seconds': round(time.process_time() + sum(report.get('cpu_seconds', 0.0) for report in reports), 3),
+            'memory_mb': round((memory + sum(report.get('memory_bytes', 0) for report in reports)) / 2 ** 20, 1)
+                         if memory is not None else None,
+            'evictions': evictions, 'rooms_refused': sum(report.get('rooms_refused', 0) for report in reports),
+            'shards': router.shard_count, 'async_mode': socketio.async_mode, 'wire': wire_stats}
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint; worker shards' values arrive with their stats reports"""
+    sockets = list(socketio.server.eio.sockets.values())
+    CONNECTED_SOCKETS.set(len(sockets))
+    depths = [socket.queue.qsize() for socket in sockets]
+    SEND_QUEUE_PACKETS.set(sum(depths), 'total')
+    SEND_QUEUE_PACKETS.set(max(depths, default=0), 'max')
+    CONGESTED_CLIENTS.set(len(held_frames))
+    snapshots = [report['metrics'] for report in list(shard_stats.values()) if 'metrics' in report]
+    return Response(REGISTRY.render(snapshots), mimetype='text/plain; version=0.0.4')
+
+# Admin endpoints
+#
+# With SNAKE_ADMIN_TOKEN set, admin requests must carry it in an X-Admin-Token
+# header (or a token parameter); without it only clients on this machine are
+# admins.
+ADMIN_TOKEN = os.getenv('SNAKE_ADMIN_TOKEN')
+MAX_PROFILES = 20  # Finished profiles kept for download
+
+profiles = {}  # profile_id -> {'mode', 'room', 'pending' shard ids, 'dumps', 'errors'}
+
+def is_admin():
+    if ADMIN_TOKEN:
+        return request.headers.get('X-Admin-Token', request.values.get('token')) == ADMIN_TOKEN
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@app.route('/admin/profile', methods=['POST'])
+def start_profile():
+    """Profile one room (room=<id>) or the whole tick loop for a few seconds.
     
-    def check_collision(self, width, height, other_snakes):
-        if not self.alive or not self.body:
-            return
-        
-        # Update power-up timers
-        if self.invincible_time > 0:
-            self.invincible_time -= 1
-            
-        head = self.body[0]
-        
-        # Check wall collision (only if not invincible)
-        if not self.invincible_time > 0:
-            if head[0] < 0 or head[0] >= width or head[1] < 0 or head[1] >= height:
-                if self.shield_active:
-                    # Shield protects once, then deactivates
-                    self.shield_active = False
-                    # Move snake away from wall
-                    if head[0] < 0:
-                        self.body[0] = (0, head[1])
-                    elif head[0] >= width:
-                        self.body[0] = (width - 1, head[1])
-                    elif head[1] < 0:
-                        self.body[0] = (head[0], 0)
-                    elif head[1] >= height:
-                        self.body[0] = (head[0], height - 1)
-                    return
-                else:
-                    self.alive = False
-                    self.just_died = True
-                    return
-        
-        # Check self collision (only if not invincible)
-        if not self.invincible_time > 0 and head in self.body[1:]:
-            if self.shield_active:
-                # Shield protects once, then deactivates
-                self.shield_active = False
-                # Remove the colliding segment
-                if head in self.body[1:]:
-                    collision_index = self.body[1:].index(head) + 1
-                    self.body = self.body[:collision_index]
-                return
-            else:
-                self.alive = False
-                self.just_died = True
-                return
-          # Check collision with other snakes (only if not invincible)
-        if not self.invincible_time > 0:
-            for other_snake in other_snakes:
-                if other_snake != self and other_snake.alive and head in other_snake.body:
-                    if self.shield_active:
-                        # Shield protects once, then deactivates
-                        self.shield_active = False
-                        return
-                    else:
-                        self.alive = False
-                        self.just_died = True
-                        return
-    
-    def apply_power_up(self, effect):
-        """Apply power-up effect to snake with configurable duration"""
-        config = POWER_UP_CONFIG
-        
-        if effect == 'speed_boost':
-            self.speed_boost_time = config['speed']['duration']
-        elif effect == 'invincibility':
-            self.invincible_time = config['invincible']['duration']
-        elif effect == 'shield':
-            self.shield_active = True
-    
-    def get_power_up_status(self):
-        """Get current power-up status for client rendering"""
-        status = {}
-        
-        # Check if any power-up is about to expire (last 3 seconds = 15 updates at 5 FPS)
-        if self.speed_boost_time > 0:
-            status['speed_boost'] = {
-                'active': True,
-                'time_left': self.speed_boost_time,
-                'blinking': self.speed_boost_time <= 15  # Blink in last 3 seconds
-            }
-        
-        if self.invincible_time > 0:
-            status['invincible'] = {
-                'active': True,
-                'time_left': self.invincible_time,
-                'blinking': self.invincible_time <= 15  # Blink in last 3 seconds
-            }
-        
-        if self.shield_active:
-            status['shield'] = {
-                'active': True,
-                'time_left': -1,  # Shield doesn't expire with time
-                'blinking': False
-            }
-        
-        return status
-
-# Power-up configuration - Easy to modify drop rates and durations
-POWER_UP_CONFIG = {
-    'normal': {'color': '#ff4444', 'weight': 70, 'growth': 1, 'effect': None, 'duration': 0},
-    'speed': {'color': '#ffff44', 'weight': 12, 'growth': 1, 'effect': 'speed_boost', 'duration': 50},  # 10 seconds at 5 FPS
-    'invincible': {'color': '#4444ff', 'weight': 8, 'growth': 1, 'effect': 'invincibility', 'duration': 50},  # 10 seconds at 5 FPS
-    'super': {'color': '#ff44ff', 'weight': 8, 'growth': 3, 'effect': None, 'duration': 0},
-    'shield': {'color': '#44ff44', 'weight': 2, 'growth': 1, 'effect': 'shield', 'duration': 0}  # Shield is one-time use
+    mode is phases (default), sample or cprofile, see profiling.py. The
+    dump is downloaded from the returned URL once the window has passed.
+    """
+    if not is_admin():
+        return {'error': 'Forbidden'}, 403
+    
+    mode = request.values.get('mode', 'phases')
+    room_id = request.values.get('room') or None
+    try:
+        seconds = float(request.values.get('seconds', 10))
+    except ValueError:
+        seconds = 0
+    if mode not in PROFILES:
+        return {'error': 'mode must be one of %s' % ', '.join(PROFILES)}, 400
+    if not 0 < seconds <= MAX_SECONDS:
+        return {'error': 'seconds must be between 0 and %d' % MAX_SECONDS}, 400
+    
+    profile_id = uuid.uuid4().hex[:12]
+    if room_id:
+        shard_ids = [shard_for(room_id, router.shard_count)]
+    else:
+        shard_ids = list(range(router.shard_count))
+    profiles[profile_id] = {'mode': mode, 'room': room_id, 'pending': set(shard_ids), 'dumps': [], 'errors': []}
+    while len(profiles) > MAX_PROFILES:
+        del profiles[next(iter(profiles))]
+    
+    for shard_id in shard_ids:
+        router.send_shard(shard_id, 'profile', None,
+                          {'id': profile_id, 'mode': mode, 'roomId': room_id, 'seconds': seconds})
+    return {'id': profile_id, 'mode': mode, 'room': room_id, 'seconds': seconds,
+            'download': '/admin/profile/' + profile_id}, 202
+
+@app.route('/admin/profile/<profile_id>')
+def download_profile(profile_id):
+    """The merged dump of a finished profile"""
+    if not is_admin():
+        return {'error': 'Forbidden'}, 403
+    profile = profiles.get(profile_id)
+    if profile is None:
+        return {'error': 'Unknown profile'}, 404
+    if profile['pending']:
+        return {'status': 'running'}, 202
+    if profile['errors'] and not profile['dumps']:
+        return {'status': 'failed', 'errors': profile['errors']}, 409
+    
+    dump_format = PROFILES[profile['mode']].format
+    filename = 'profile-%s-%s.%s' % (profile_id, profile['mode'], 'prof' if dump_format == 'pstats' else 'txt')
+    return Response(merge_dumps(dump_format, profile['dumps']),
+                    mimetype='application/octet-stream' if dump_format == 'pstats' else 'text/plain',
+                    headers={'Content-Disposition': 'attachment; filename=%s' % filename})
+
+@app.route('/admin/clients')
+def list_clients():
+    """Connected clients with the deepest send queues and most dropped frames first, to spot bad links"""
+    if not is_admin():
+        return {'error': 'Forbidden'}, 403
+    try:
+        limit = int(request.values.get('limit', 50))
+    except ValueError:
+        limit = 50
+    
+    manager = socketio.server.manager
+    clients = []
+    for eio_sid, socket in list(socketio.server.eio.sockets.items()):
+        sid = manager.sid_from_eio_sid(eio_sid, '/')
+        if sid is None:
+            continue
+        held = held_frames.get(sid)
+        stats = link_stats.get(sid, {})
+        player = players.get(sid)
+        clients.append({
+            'sid': sid,
+            'name': player['name'] if player else None,
+            'room': player['room'] if player else spectators.get(sid),
+            'queue_depth': socket.queue.qsize(),
+            'held_frames': len(held['frames']) if held else 0,
+            'dropped_frames': stats.get('dropped', 0),
+            'resyncs': stats.get('resyncs', 0)
+        })
+    clients.sort(key=lambda client: (client['dropped_frames'], client['queue_depth']), reverse=True)
+    return {'clients': clients[:limit], 'connected': len(clients), 'congested': len(held_frames)}
+
+# Wire encoding
+#
+# Clients can opt into a binary encoding of game_state/game_delta frames with
+# the 'set_encoding' event. Binary frames keep the JSON frame layout but pack
+# cells into little-endian int16 x,y pairs (foods as x,y,type triples) sent as
+# Socket.IO binary attachments, and replace colours, food types and
+# directions with indices into the palette sent once on negotiation.
+# Lockstep frames (lockstep_sync, lockstep_tick) are small and always JSON.
+BINARY_EVENTS = ('game_state', 'game_delta')
+FOOD_TYPE_INDEX = {food_type: i for i, food_type in enumerate(POWER_UP_CONFIG)}
+COLOR_INDEX = {color: i for i, color in enumerate(PLAYER_COLORS)}
+DIRECTION_INDEX = {direction: i for i, direction in enumerate(DIRECTIONS)}
+
+# Per-format frame counters: frames, encoded bytes per recipient and
+# seconds spent encoding and handing frames to Socket.IO
+wire_stats = {
+    'json': {'frames': 0, 'bytes': 0, 'encode_seconds': 0.0},
+    'binary': {'frames': 0, 'bytes': 0, 'encode_seconds': 0.0}
 }
 
-class Food:
-    # Food types with their properties - Now using configurable system
-    FOOD_TYPES = POWER_UP_CONFIG
+# Last encoded packets per format, as (event, game_state, packets). Games hand out
+# the same snapshot object until they change, so a keyframe broadcast and
+# late joiners in the same tick share one encoding.
+encoded_states = {'json': (None, None, None), 'binary': (None, None, None)}
+
+def get_palette():
+    """Lookup tables that binary frames index into"""
+    return {
+        'food_types': list(POWER_UP_CONFIG),
+        'food_colors': [food_data['color'] for food_data in POWER_UP_CONFIG.values()],
+        'colors': PLAYER_COLORS,
+        'directions': DIRECTIONS
+    }
+
+def _pack(values):
+    packed = array('h', values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+def pack_cells(cells):
+    """Pack (x, y) cells as int16 pairs"""
+    return _pack(chain.from_iterable(cells))
+
+def pack_foods(foods):
+    """Pack food dicts as int16 (x, y, type index) triples"""
+    return _pack(chain.from_iterable(
+        (food['x'], food['y'], FOOD_TYPE_INDEX[food['type']]) for food in foods))
+
+def encode_binary_state(game_state):
+    """Convert a game_state or game_delta payload to the binary wire format"""
+    frame = dict(game_state)
+    frame['binary'] = True
     
-    def __init__(self, width, height):
-        self.x = random.randint(0, width - 1)
-        self.y = random.randint(0, height - 1)
-        self.type = self._choose_food_type()
-        
-    def _choose_food_type(self):
-        """Choose food type based on weighted probabilities"""
-        total_weight = sum(food_data['weight'] for food_data in self.FOOD_TYPES.values())
-        random_num = random.randint(1, total_weight)
-        
-        current_weight = 0
-        for food_type, food_data in self.FOOD_TYPES.items():
-            current_weight += food_data['weight']
-            if random_num <= current_weight:
-                return food_type
-        
-        return 'normal'  # Fallback
-    
-    def get_properties(self):
-        """Get the properties of this food type"""
-        return self.FOOD_TYPES[self.type]
-    
-    def respawn(self, width, height, snakes):
-        while True:
-            self.x = random.randint(0, width - 1)
-            self.y = random.randint(0, height - 1)
-            
-            # Make sure food doesn't spawn on snake
-            collision = False
-            for snake in snakes:
-                if (self.x, self.y) in snake.body:
-                    collision = True
-                    break
-            
-            if not collision:
-                break
-        
-        # Choose new type when respawning
-        self.type = self._choose_food_type()
-
-class Game:
-    def __init__(self, room_id):
-        self.room_id = room_id
-        self.players = {}
-        self.snakes = {}
-        self.foods = [Food(CANVAS_WIDTH // GRID_SIZE, CANVAS_HEIGHT // GRID_SIZE)]  # List of foods
-        self.game_running = False
-        self.countdown_active = False
-        self.game_started = False
-        self.last_update = time.time()
-        self.dead_players = set()  # Track players who have died
-        self.game_winner = None  # Track the winner
-    
-    def add_player(self, player_id, player_name):
-        colors = ['#ff4444', '#44ff44', '#4444ff', '#ffff44']
-        color = colors[len(self.players) % len(colors)]
-        
-        # Starting positions
-        start_positions = [(5, 5), (35, 5), (5, 25), (35, 25)]
-        start_pos = start_positions[len(self.players) % len(start_positions)]
-        
-        self.players[player_id] = {
-            'name': player_name,
-            'color': color,
-            'ready': False
-        }
-        
-        self.snakes[player_id] = Snake(start_pos[0], start_pos[1], color)
-    
-    def remove_player(self, player_id):
-        if player_id in self.players:
-            del self.players[player_id]
-        if player_id in self.snakes:
-            del self.snakes[player_id]
-    
-    def start_game(self):
-        if self.game_started or self.countdown_active:
-            return False
-            
-        self.countdown_active = True
-        self.game_started = True
-          # Reset all snakes to starting positions
-        start_positions = [(5, 5), (35, 5), (5, 25), (35, 25)]
-        for i, (player_id, snake) in enumerate(self.snakes.items()):
-            start_pos = start_positions[i % len(start_positions)]
-            snake.body = [start_pos]
-            snake.direction = 'RIGHT'
-            snake.alive = True
-            snake.score = 0
-            snake.just_died = False
-            # Reset power-up effects
-            snake.speed_boost_time = 0
-            snake.invincible_time = 0
-            snake.shield_active = False
-            snake.move_counter = 0
-        
-        # Reset death tracking
-        self.dead_players.clear()
-        self.game_winner = None
-        
-        # Reset foods to just one
-        self.foods = [Food(CANVAS_WIDTH // GRID_SIZE, CANVAS_HEIGHT // GRID_SIZE)]
+    snakes = {}
+    for pid, snake in game_state['snakes'].items():
+        packed = dict(snake)
+        for key in ('body', 'h', 'g'):
+            if key in packed:
+                packed[key] = pack_cells(packed[key])
+        if 'color' in packed:
+            packed['color'] = COLOR_INDEX.get(packed['color'], packed['color'])
+        if 'direction' in packed:
+            packed['direction'] = DIRECTION_INDEX[packed['direction']]
+        snakes[pid] = packed
+    frame['snakes'] = snakes
+    
+    for key in ('foods', 'foods_add'):
+        if key in frame:
+            frame[key] = pack_foods(frame[key])
+    if 'foods_remove' in frame:
+        frame['foods_remove'] = pack_cells(frame['foods_remove'])
+    
+    return frame
+
+def binary_room(room_id):
+    """Socket.IO room holding the binary-encoding members of a game room"""
+    return room_id + '/binary'
+
+def room_members(room):
+    """(sid, eio_sid) pairs currently in a Socket.IO room"""
+    manager = socketio.server.manager
+    if '/' not in manager.rooms:
+        return []
+    return list(manager.get_participants('/', room))
+
+def encode_state(event, game_state, encoding):
+    """Encode a state frame as a ready-to-send Socket.IO packet list, once per game_state"""
+    cached_event, cached_state, packets = encoded_states[encoding]
+    if cached_state is game_state and cached_event == event:
+        return packets
+    
+    start = time.perf_counter()
+    frame = encode_binary_state(game_state) if encoding == 'binary' else game_state
+    packets = socketio.server.packet_class(packet.EVENT, namespace='/', data=[event, frame]).encode()
+    if not isinstance(packets, list):
+        packets = [packets]
+    encoded_states[encoding] = (event, game_state, packets)
+    
+    stats = wire_stats[encoding]
+    stats['encode_seconds'] += time.perf_counter() - start
+    stats['frames'] += 1
+    return packets
+
+def send_packets(eio_sids, packets, event):
+    """Send the same encoded packets to every client in eio_sids"""
+    eio = socketio.server.eio
+    size = sum(len(data) for data in packets)
+    for eio_sid in eio_sids:
+        for data in packets:
+            eio.send(eio_sid, data)
+    EMITTED_EVENTS.inc(event, amount=len(eio_sids))
+    EMITTED_BYTES.inc(event, amount=size * len(eio_sids))
+    return size * len(eio_sids)
+
+def emit_event(event, data, room, skip_sid=None):
+    """socketio.emit() to a room or sid, but encoded once for all recipients"""
+    if isinstance(data, tuple):
+        args = list(data)
+    elif data is not None:
+        args = [data]
+    else:
+        args = []
+    packets = socketio.server.packet_class(packet.EVENT, namespace='/', data=[event] + args).encode()
+    if not isinstance(packets, list):
+        packets = [packets]
+    eio_sids = [eio_sid for sid, eio_sid in room_members(room) if sid != skip_sid]
+    send_packets(eio_sids, packets, event)
+
+def broadcast_state(room_id, event, game_state):
+    """Send a state frame to a game room, encoded once per negotiated encoding"""
+    binary_sids = set()
+    if event in BINARY_EVENTS:
+        binary_sids = set(sid for sid, _ in room_members(binary_room(room_id)))
+    by_encoding = {'json': [], 'binary': []}
+    for sid, eio_sid in room_members(room_id):
+        by_encoding['binary' if sid in binary_sids else 'json'].append((sid, eio_sid))
+    
+    for encoding, members in by_encoding.items():
+        if members:
+            packets = encode_state(event, game_state, encoding)
+            send_frame(members, event, packets, encoding)
+
+def send_state(sid, event, game_state):
+    """Send a state frame to a single client in its negotiated encoding"""
+    eio_sid = socketio.server.manager.eio_sid_from_sid(sid, '/')
+    if eio_sid is None:
+        return
+    encoding = client_encodings.get(sid, 'json') if event in BINARY_EVENTS else 'json'
+    packets = encode_state(event, game_state, encoding)
+    send_frame([(sid, eio_sid)], event, packets, encoding)
+
+# Backpressure
+#
+# Every client has its own Engine.IO send queue, and a slow link lets it
+# grow without bound: the player sees an ever older board and the server
+# keeps every frame. game_state and game_delta frames therefore only go
+# into a queue holding less than SEND_QUEUE_FRAMES frames' worth of
+# packets; otherwise they wait in held_frames, where a newer keyframe
+# replaces whatever was held. Deltas patch the frame before them, so up to
+# MAX_HELD_FRAMES of them wait behind it; past that they are dropped and a
+# fresh keyframe is requested for the player. All other events skip this
+# and are always delivered in order: lockstep frames carry the inputs every
+# later tick builds on, so send_frame passes them straight on.
+SEND_QUEUE_FRAMES = max(1, int(os.getenv('SNAKE_SEND_QUEUE_FRAMES', 2)))
+MAX_HELD_FRAMES = 5  # Deltas held for a congested client before falling back to a keyframe
+FLUSH_INTERVAL = 0.02  # Seconds between attempts to send held frames
+
+held_frames = {}  # sid -> {'eio_sid', 'frames': [(event, packets, encoding)], 'resync': waiting for a keyframe}
+link_stats = {}  # sid -> {'dropped': frames dropped, 'resyncs': keyframes requested}, for /admin/clients
+link_lock = threading.RLock()  # Sending can close a dead socket, which runs on_disconnect
+
+def queue_depth(eio_sid):
+    """Packets waiting in a client's Engine.IO send queue"""
+    socket = socketio.server.eio.sockets.get(eio_sid)
+    return socket.queue.qsize() if socket is not None else 0
+
+def send_frame(members, event, packets, encoding):
+    """Send a state frame to (sid, eio_sid) members, holding game state back for congested clients"""
+    limit = SEND_QUEUE_FRAMES * len(packets)
+    ready = []
+    with link_lock:
+        if event not in BINARY_EVENTS:
+            ready = [eio_sid for sid, eio_sid in members]
+            wire_stats[encoding]['bytes'] += send_packets(ready, packets, event)
+            return
         
-        # Start countdown in separate thread
-        countdown_thread = threading.Thread(target=self.countdown, daemon=True)
-        countdown_thread.start()
-        return True
+        for sid, eio_sid in members:
+            if sid in held_frames or queue_depth(eio_sid) >= limit:
+                hold_frame(sid, eio_sid, event, packets, encoding)
+            else:
+                ready.append(eio_sid)
+        wire_stats[encoding]['bytes'] += send_packets(ready, packets, event)
+
+def drop_frames(sid, frames):
+    if not frames:
+        return
+    stats = link_stats.setdefault(sid, {'dropped': 0, 'resyncs': 0})
+    stats['dropped'] += len(frames)
+    for event, _, _ in frames:
+        FRAMES_DROPPED.inc(event)
+
+def hold_frame(sid, eio_sid, event, packets, encoding):
+    """Queue a state frame in held_frames (link_lock held)"""
+    held = held_frames.get(sid)
+    if held is None:
+        held = held_frames[sid] = {'eio_sid': eio_sid, 'frames': [], 'resync': False}
+    frames = held['frames']
     
-    def countdown(self):
-        """Handle game countdown"""
+    if event != 'game_delta':
+        # A full frame: nothing held before it matters any more
+        drop_frames(sid, frames)
+        held['frames'] = [(event, packets, encoding)]
+        held['resync'] = False
+    elif held['resync']:
+        drop_frames(sid, [(event, packets, encoding)])
+    elif len(frames) < MAX_HELD_FRAMES:
+        frames.append((event, packets, encoding))
+    else:
+        # Too far behind to catch up delta by delta
+        drop_frames(sid, frames + [(event, packets, encoding)])
+        held['frames'] = []
+        held['resync'] = True
+        link_stats.setdefault(sid, {'dropped': 0, 'resyncs': 0})['resyncs'] += 1
+        KEYFRAME_RESYNCS.inc()
+        if sid in players:
+            router.send(players[sid]['room'], 'request_keyframe', sid)
+
+def flush_held_frames():
+    """Background task: pass held frames on as their clients' queues drain"""
+    while True:
+        socketio.sleep(FLUSH_INTERVAL)
         try:
-            for i in range(3, 0, -1):
-                socketio.emit('countdown', {'count': i}, room=self.room_id)
-                time.sleep(1)
-            
-            socketio.emit('countdown', {'count': 0}, room=self.room_id)
-            time.sleep(0.5)
-            
-            # Actually start the game
-            self.game_running = True
-            self.countdown_active = False
-            self.last_update = time.time()            # Send immediate game state to show movement has started
-            game_state = {
-                'snakes': {pid: {
-                    'body': snake.body,
-                    'color': snake.color,
-                    'alive': snake.alive,
-                    'score': snake.score,
-                    'direction': snake.direction,
-                    'power_ups': snake.get_power_up_status()
-                } for pid, snake in self.snakes.items()},
-                'foods': [{'x': food.x, 'y': food.y, 'type': food.type, 'color': food.get_properties()['color']} for food in self.foods],
-                'running': True
-            }
-            socketio.emit('game_state', game_state, room=self.room_id)
-            
+            with link_lock:
+                for sid, held in list(held_frames.items()):
+                    frames = held['frames']
+                    while frames and queue_depth(held['eio_sid']) < SEND_QUEUE_FRAMES * len(frames[0][1]):
+                        event, packets, encoding = frames.pop(0)
+                        wire_stats[encoding]['bytes'] += send_packets([held['eio_sid']], packets, event)
+                    if not frames and not held['resync']:
+                        held_frames.pop(sid, None)
         except Exception as e:
-            self.game_running = False
-            self.countdown_active = False
-            self.game_started = False
+            SWALLOWED_EXCEPTIONS.inc('frame_flush')
+
+# Spectator fan-out
+#
+# Games hand over a game_state for their spectators every few ticks. It is
+# encoded right away, once whatever the audience, and a background task sends
+# it on, so a crowd of viewers never holds up a tick. Only the newest frame
+# per room is kept: a slow pass skips frames instead of queueing them.
+SPECTATOR_FANOUT_INTERVAL = 0.05  # Seconds between fan-out passes
 
-    def update(self):
-        if not self.game_running:
+pending_spectator_frames = {}  # room_id -> encoded packets of the newest frame
+spectator_lock = threading.Lock()
+
+def spectator_room(room_id):
+    """Socket.IO room holding the spectators of a game room"""
+    return room_id + '/spectators'
+
+def queue_spectator_frame(room_id, game_state):
+    packets = encode_state('game_state', game_state, 'json')
+    with spectator_lock:
+        pending_spectator_frames[room_id] = packets
+
+def fan_out_spectators():
+    """Background task: send each room's newest spectator frame to its spectators"""
+    global pending_spectator_frames
+    while True:
+        socketio.sleep(SPECTATOR_FANOUT_INTERVAL)
+        with spectator_lock:
+            frames = pending_spectator_frames
+            pending_spectator_frames = {}
+        
+        for room_id, packets in frames.items():
+            try:
+                send_frame(room_members(spectator_room(room_id)), 'game_state', packets, 'json')
+            except Exception as e:
+                SWALLOWED_EXCEPTIONS.inc('spectator_fanout')
+
+class SocketIOSink:
+    """Delivers shard output to the connected Socket.IO clients"""
+    
+    def emit(self, event, data, room, skip_sid=None):
+        emit_event(event, data, room, skip_sid)
+    
+    def broadcast_state(self, room_id, event, game_state):
+        broadcast_state(room_id, event, game_state)
+    
+    def send_state(self, sid, event, game_state):
+        send_state(sid, event, game_state)
+    
+    def enter_room(self, sid, room_id, player_name):
+        """A shard seated sid in room_id: join the Socket.IO rooms and route its events there"""
+        if joining.get(sid) == room_id:
+            del joining[sid]
+        if not socketio.server.manager.is_connected(sid, '/'):
+            return  # Gone already; its 'leave' follows the join on the shard
+        # Rooms on other shards were left before the join was routed (see
+        # leave_other_shard); this shard has already dropped sid from its own
+        if sid in players and players[sid]['room'] != room_id:
+            old_room = players[sid]['room']
+            socketio.server.leave_room(sid, old_room, namespace='/')
+            socketio.server.leave_room(sid, binary_room(old_room), namespace='/')
+        if sid in spectators:
+            socketio.server.leave_room(sid, spectator_room(spectators.pop(sid)), namespace='/')
+        socketio.server.enter_room(sid, room_id, namespace='/')
+        if client_encodings.get(sid) == 'binary':
+            socketio.server.enter_room(sid, binary_room(room_id), namespace='/')
+        players[sid] = {
+            'name': player_name,
+            'room': room_id
+        }
+    
+    def watch_room(self, sid, room_id):
+        """A shard accepted sid as a spectator of room_id"""
+        socketio.server.enter_room(sid, spectator_room(room_id), namespace='/')
+        spectators[sid] = room_id
+    
+    def broadcast_spectators(self, room_id, game_state):
+        queue_spectator_frame(room_id, game_state)
+    
+    def close_room(self, room_id):
+        """A shard closed room_id: forget its players and spectators"""
+        for sid in [sid for sid, player in list(players.items()) if player['room'] == room_id]:
+            del players[sid]
+        for sid in [sid for sid, watched in list(spectators.items()) if watched == room_id]:
+            del spectators[sid]
+        for room in (room_id, binary_room(room_id), spectator_room(room_id)):
+            socketio.server.close_room(room, namespace='/')
+    
+    def shard_stats(self, shard_id, stats):
+        shard_stats[shard_id] = stats
+    
+    def profile_result(self, profile_id, shard_id, result):
+        profile = profiles.get(profile_id)
+        if profile is None:
             return
-        
-        # Move all snakes first
-        for player_id, snake in self.snakes.items():
-            if snake.alive:
-                snake.move()
-        
-        # Check collisions
-        width = CANVAS_WIDTH // GRID_SIZE
-        height = CANVAS_HEIGHT // GRID_SIZE
-        
-        for snake in self.snakes.values():
-            snake.check_collision(width, height, list(self.snakes.values()))
-        
-        # Handle death events
-        for player_id, snake in self.snakes.items():
-            if snake.just_died:
-                snake.just_died = False  # Reset the flag
-                self.dead_players.add(player_id)
-                player_name = self.players[player_id]['name']
-                player_score = snake.score
-                
-                # Spawn foods based on the dead player's score (only if 3+ players)
-                if len(self.players) >= 3:
-                    foods_to_spawn = player_score  # Full score = number of foods
-                    width = CANVAS_WIDTH // GRID_SIZE
-                    height = CANVAS_HEIGHT // GRID_SIZE
-                    
-                    for _ in range(foods_to_spawn):
-                        new_food = Food(width, height)
-                        # Make sure new food doesn't spawn on snakes
-                        new_food.respawn(width, height, list(self.snakes.values()))
-                        self.foods.append(new_food)
-                else:
-                    foods_to_spawn = 0  # No food spawning with less than 3 players
-                
-                # Emit death event to the specific player
-                socketio.emit('player_died', {
-                    'player_name': player_name
-                }, room=player_id)
-                
-                # Emit to all players that foods were spawned
-                if foods_to_spawn > 0:
-                    socketio.emit('foods_spawned', {
-                        'player_name': player_name,
-                        'foods_count': foods_to_spawn,
-                        'total_foods': len(self.foods)
-                    }, room=self.room_id)        # Check food collision and handle snake growth
-        foods_to_remove = []
-        snake_growth = {}  # Track which snakes should grow
-        food_effects = {}  # Track power-up effects to apply
-        
-        for player_id, snake in self.snakes.items():
-            if snake.alive and len(snake.body) > 0:
-                head_pos = snake.body[0]
-                snake_growth[player_id] = 0  # Track how much to grow
-                
-                # Check collision with any food
-                for i, food in enumerate(self.foods):
-                    if head_pos == (food.x, food.y):
-                        food_props = food.get_properties()
-                        snake.score += 1  # 1 point per food
-                        snake_growth[player_id] = food_props['growth']  # Growth amount
-                        
-                        # Apply power-up effect if any
-                        if food_props['effect']:
-                            snake.apply_power_up(food_props['effect'])
-                            food_effects[player_id] = food_props['effect']
-                        
-                        foods_to_remove.append(i)
-                        break  # Only eat one food per update
-        
-        # Remove eaten foods (in reverse order to maintain indices)
-        for food_index in sorted(foods_to_remove, reverse=True):
-            del self.foods[food_index]
-        
-        # Send power-up activation notifications
-        for player_id, effect in food_effects.items():
-            player_name = self.players[player_id]['name']
-            socketio.emit('power_up_activated', {
-                'player_name': player_name,
-                'effect': effect
-            }, room=self.room_id)        # Handle snake movement and growth
-        for player_id, snake in self.snakes.items():
-            if snake.alive and len(snake.body) > 1:
-                # Handle growth based on food type
-                growth_amount = snake_growth.get(player_id, 0)
-                if growth_amount == 0:
-                    # Normal movement - remove tail
-                    snake.body.pop()
-                else:
-                    # Growth - don't remove tail for this update, and add extra segments
-                    for _ in range(growth_amount - 1):
-                        # Add extra segments at current tail position
-                        if len(snake.body) > 0:
-                            tail_pos = snake.body[-1]
-                            snake.body.append(tail_pos)
-        
-        # Ensure there's always at least one food on the field
-        if len(self.foods) == 0:
-            width = CANVAS_WIDTH // GRID_SIZE
-            height = CANVAS_HEIGHT // GRID_SIZE
-            new_food = Food(width, height)
-            new_food.respawn(width, height, list(self.snakes.values()))
-            self.foods.append(new_food)
-        
-        # Check if game should end
-        alive_snakes = [(pid, s) for pid, s in self.snakes.items() if s.alive]
-        if len(alive_snakes) <= 1 and len(self.snakes) > 1:
-            self.game_running = False
-            
-            # Determine winner
-            if len(alive_snakes) == 1:
-                winner_id, winner_snake = alive_snakes[0]
-                self.game_winner = {
-                    'player_id': winner_id,
-                    'player_name': self.players[winner_id]['name'],
-                    'score': winner_snake.score
-                }
-                
-                # Emit winner event to the winner
-                socketio.emit('player_won', {
-                    'player_name': self.game_winner['player_name'],
-                    'score': self.game_winner['score']
-                }, room=winner_id)
-            
-            # Reset flags to allow new game
-            self.game_started = False
-            self.countdown_active = False
+        if 'error' in result:
+            profile['errors'].append(result['error'])
+        else:
+            profile['dumps'].append(result['data'])
+        profile['pending'].discard(shard_id)
+
+def shard_count():
+    if SHARDS_SETTING == 'auto':
+        return multiprocessing.cpu_count()
+    return max(1, int(SHARDS_SETTING))
+
+router = ShardRouter(shard_count(), SocketIOSink(), processes=shard_count() > 1)
 
 # Socket events
 @socketio.on('connect')
@@ -504,101 +598,93 @@ def on_connect():
 @socketio.on('disconnect')
 def on_disconnect():
     player_id = request.sid
+    client_encodings.pop(player_id, None)
+    with link_lock:
+        held_frames.pop(player_id, None)
+        link_stats.pop(player_id, None)
     
+    # A join the shard has not applied yet gets a 'leave' too, queued behind it
+    rooms = set()
     if player_id in players:
-        room_id = players[player_id]['room']
-        if room_id in games:
-            games[room_id].remove_player(player_id)
-            if not games[room_id].players:
-                del games[room_id]
-            else:
-                # Send updated player list to remaining players
-                updated_players = [{'id': pid, 'name': pdata['name'], 'color': pdata['color']} 
-                                  for pid, pdata in games[room_id].players.items()]
-                emit('player_left', {
-                    'player_id': player_id,
-                    'players': updated_players
-                }, room=room_id)
-        del players[player_id]
+        rooms.add(players.pop(player_id)['room'])
+    if player_id in joining:
+        rooms.add(joining.pop(player_id))
+    for room_id in rooms:
+        router.send(room_id, 'leave', player_id)
+    if player_id in spectators:
+        router.send(spectators.pop(player_id), 'leave', player_id)
+
+def leave_other_shard(sid, room_id):
+    """Leave the room sid plays, watches or is joining if another shard than room_id's owns it.
+    
+    A shard gives up a player's old seat itself when it seats them again
+    (see RoomService._give_up_seat), but it only knows its own rooms.
+    """
+    shard_id = shard_for(room_id, router.shard_count)
+    if sid in players and shard_for(players[sid]['room'], router.shard_count) != shard_id:
+        old_room = players.pop(sid)['room']
+        leave_room(old_room)
+        leave_room(binary_room(old_room))
+        router.send(old_room, 'leave', sid)
+    if sid in spectators and shard_for(spectators[sid], router.shard_count) != shard_id:
+        old_room = spectators.pop(sid)
+        leave_room(spectator_room(old_room))
+        router.send(old_room, 'leave', sid)
+    if sid in joining and shard_for(joining[sid], router.shard_count) != shard_id:
+        router.send(joining.pop(sid), 'leave', sid)
 
 @socketio.on('create_room')
 def on_create_room(data):
+    room_id = str(uuid.uuid4())[:8]
     try:
-        player_name = data.get('playerName', 'Anonymous')
-        if not player_name or not player_name.strip():
-            emit('error', {'message': 'Player name is required'})
-            return
-            
-        room_id = str(uuid.uuid4())[:8]
-        
-        games[room_id] = Game(room_id)
-        games[room_id].add_player(request.sid, player_name.strip())
-        
-        players[request.sid] = {
-            'name': player_name.strip(),
-            'room': room_id
-        }
-        
-        join_room(room_id)
-        emit('room_created', {
-            'roomId': room_id, 
-            'playerName': player_name.strip(),
-            'players': [{'id': request.sid, 'name': player_name.strip(), 'color': games[room_id].players[request.sid]['color']}]
-        })
-        
+        data = dict(data, roomId=room_id)
     except Exception as e:
         emit('error', {'message': 'Failed to create room'})
+        return
+    leave_other_shard(request.sid, room_id)
+    joining[request.sid] = room_id
+    router.send(room_id, 'create_room', request.sid, data)
 
 @socketio.on('join_room')
 def on_join_room(data):
     try:
         room_id = data.get('roomId', '').strip()
-        player_name = data.get('playerName', 'Anonymous').strip()
-        
-        if not room_id:
-            emit('error', {'message': 'Room ID is required'})
-            return
-            
-        if not player_name:
-            emit('error', {'message': 'Player name is required'})
-            return
-        
-        if room_id not in games:
-            emit('error', {'message': 'Room not found'})
-            return
-        
-        if len(games[room_id].players) >= 4:
-            emit('error', {'message': 'Room is full (max 4 players)'})
-            return
-        
-        games[room_id].add_player(request.sid, player_name)
-        players[request.sid] = {
-            'name': player_name,
-            'room': room_id
-        }
-        
-        join_room(room_id)
-        
-        # Send room info to joining player
-        room_info = {
-            'roomId': room_id,
-            'players': [{'id': pid, 'name': pdata['name'], 'color': pdata['color']} 
-                       for pid, pdata in games[room_id].players.items()],
-            'isRoomCreator': False
-        }
-        emit('room_joined', room_info)
-        
-        # Notify other players and send updated player list
-        updated_players = [{'id': pid, 'name': pdata['name'], 'color': pdata['color']} 
-                          for pid, pdata in games[room_id].players.items()]
-        emit('player_joined', {
-            'player_id': request.sid, 
-            'player_name': player_name,
-            'players': updated_players
-        }, room=room_id, include_self=False)
-        
     except Exception as e:
         emit('error', {'message': 'Failed to join room'})
+        return
+    
+    if not room_id:
+        emit('error', {'message': 'Room ID is required'})
+        return
+    
+    leave_other_shard(request.sid, room_id)
+    joining[request.sid] = room_id
+    router.send(room_id, 'join_room', request.sid, data)
+
+@socketio.on('spectate_room')
+def on_spectate_room(data):
+    """Watch a room; any number of spectators can watch, full rooms included"""
+    try:
+        room_id = data.get('roomId', '').strip()
+    except Exception as e:
+        emit('error', {'message': 'Failed to watch room'})
+        return
+    
+    if not room_id:
+        emit('error', {'message': 'Room ID is required'})
+        return
+    
+    sid = request.sid
+    if sid in players:
+        emit('error', {'message': 'Players cannot spectate'})
+        return
+    if sid in spectators:
+        # Switching rooms
+        old_room = spectators.pop(sid)
+        leave_room(spectator_room(old_room))
+        router.send(old_room, 'leave', sid)
+    
+    router.send(room_id, 'spectate', sid, {'roomId': room_id})
 
 @socketio.on('start_game')
 def on_start_game():
@@ -608,112 +694,68 @@ def on_start_game():
         emit('error', {'message': 'Player not found'})
         return
     
-    room_id = players[player_id]['room']
-    if room_id not in games:
-        emit('error', {'message': 'Room not found'})
+    router.send(players[player_id]['room'], 'start_game', player_id)
+
+@socketio.on('set_encoding')
+def on_set_encoding(data):
+    """Negotiate the wire format for game_state/game_delta frames"""
+    encoding = data.get('encoding', 'json')
+    if encoding not in ('json', 'binary'):
+        emit('error', {'message': 'Unknown encoding'})
         return
     
-    # Try to start the game (will fail if already started)
-    if games[room_id].start_game():
-        emit('game_started', room=room_id)        # Send initial game state immediately
-        game = games[room_id]
-        initial_game_state = {
-            'snakes': {pid: {
-                'body': snake.body,
-                'color': snake.color,
-                'alive': snake.alive,
-                'score': snake.score,
-                'direction': snake.direction,
-                'power_ups': snake.get_power_up_status()
-            } for pid, snake in game.snakes.items()},
-            'foods': [{'x': food.x, 'y': food.y, 'type': food.type, 'color': food.get_properties()['color']} for food in game.foods],
-            'running': False
-        }
-        socketio.emit('game_state', initial_game_state, room=room_id)
+    sid = request.sid
+    room_id = players[sid]['room'] if sid in players else None
+    if encoding == 'binary':
+        client_encodings[sid] = 'binary'
+        if room_id:
+            join_room(binary_room(room_id))
+        emit('palette', get_palette())
     else:
-        emit('error', {'message': 'Game already in progress'})
+        client_encodings.pop(sid, None)
+        if room_id:
+            leave_room(binary_room(room_id))
+    emit('encoding_set', {'encoding': encoding})
+
+@socketio.on('request_keyframe')
+def on_request_keyframe():
+    """Resend the full game state to a client whose deltas went out of sync"""
+    player_id = request.sid
+    if player_id in players:
+        router.send(players[player_id]['room'], 'request_keyframe', player_id)
 
 @socketio.on('player_move')
 def on_player_move(data):
     player_id = request.sid
-    if player_id not in players:
-        return
-    
-    room_id = players[player_id]['room']
-    if room_id not in games or player_id not in games[room_id].snakes:
-        return
-    
-    if not games[room_id].game_running:
-        return
-    
-    direction = data['direction']
-    snake = games[room_id].snakes[player_id]
-    
-    # Prevent reverse direction
-    opposite = {'UP': 'DOWN', 'DOWN': 'UP', 'LEFT': 'RIGHT', 'RIGHT': 'LEFT'}
-    if direction != opposite.get(snake.direction):
-        snake.direction = direction
+    if player_id in players:
+        router.send(players[player_id]['room'], 'player_move', player_id, data)
 
-def send_mean_comments():
-    """Send periodic mean comments to dead players"""
-    while True:
-        try:
-            for room_id, game in list(games.items()):
-                if game.game_running and game.dead_players:
-                    # Send a random mean comment to a random dead player
-                    if game.dead_players:
-                        dead_player = random.choice(list(game.dead_players))
-                        comment = random.choice(MEAN_COMMENTS)
-                        socketio.emit('mean_comment', {
-                            'comment': comment
-                        }, room=dead_player)
-            
-            # Wait 3-8 seconds before sending another comment
-            time.sleep(random.uniform(3.0, 8.0))
-            
-        except Exception as e:
-            time.sleep(5)
+services_started = False
 
-def game_loop():
-    """Main game loop"""
-    while True:
-        try:
-            current_time = time.time()
-            
-            for room_id, game in list(games.items()):
-                # Only update if game is actually running (not in countdown)
-                if game.game_running and current_time - game.last_update > 0.2:  # 5 FPS
-                    game.update()
-                    game.last_update = current_time                    # Send game state to all players in room
-                    game_state = {
-                        'snakes': {pid: {
-                            'body': snake.body,
-                            'color': snake.color,
-                            'alive': snake.alive,
-                            'score': snake.score,
-                            'direction': snake.direction,
-                            'power_ups': snake.get_power_up_status()
-                        } for pid, snake in game.snakes.items()},
-                        'foods': [{'x': food.x, 'y': food.y, 'type': food.type, 'color': food.get_properties()['color']} for food in game.foods],
-                        'running': game.game_running
-                    }
-                    
-                    socketio.emit('game_state', game_state, room=room_id)
-            
-            time.sleep(0.05)  # 20 FPS check rate
-            
-        except Exception as e:
-            time.sleep(1)
-
-# Start the game loop and mean comments thread
-game_thread = threading.Thread(target=game_loop, daemon=True)
-game_thread.start()
+def start_services():
+    """Load the client and start the room shards and the background senders (once).
+    
+    Importing this module only sets up the routes and handlers, so shard
+    workers, replay tools and benchmarks can import it without starting
+    anything; only a process that serves calls this, through create_app.
+    """
+    global services_started
+    if services_started:
+        return
+    services_started = True
+    client_assets.update(assets.load())
+    router.start()
+    socketio.start_background_task(fan_out_spectators)
+    socketio.start_background_task(flush_held_frames)
 
-mean_comments_thread = threading.Thread(target=send_mean_comments, daemon=True)
-mean_comments_thread.start()
+def create_app():
+    """The Flask app and its SocketIO server, with the services running"""
+    start_services()
+    return app, socketio
 
 if __name__ == '__main__':
     try:
+        create_app()
         socketio.run(app, host='0.0.0.0', port=5000, debug=False, allow_unsafe_werkzeug=True)
     except Exception as e:
         input("Press Enter to exit...")
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""Versioned, precompressed build of the game client.
+
+The page's stylesheet and scripts live in static/. build() names each of
+them after a hash of its content (game.1a2b3c4d5e6f.js), renders
+templates/index.html with those names and writes everything to
+static/build/, next to gzip and (when the brotli module is installed)
+brotli copies and a manifest. The PyInstaller spec builds before packaging;
+a server running from source rebuilds whenever a source is newer than the
+manifest.
+
+load() reads a build into memory. app.py answers the page and the assets
+from there without touching the disk or compressing anything: the versioned
+files are cached by browsers for good, and the page is revalidated with its
+ETag, so a repeat visit costs one 304.
+
+    python assets.py        # build static/build/
+"""
+import gzip
+import hashlib
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, 'static')
+BUILD_DIR = os.path.join(STATIC_DIR, 'build')
+MANIFEST_PATH = os.path.join(BUILD_DIR, 'manifest.json')
+TEMPLATE_DIR = os.path.join(ROOT, 'templates')
+
+SOURCES = ('game.css', 'game.js', 'engine.js', 'socket.io.min.js')  # In static/
+ASSET_URL = '/assets/'
+CONTENT_TYPES = {
+    '.css': 'text/css; charset=utf-8',
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'text/javascript; charset=utf-8',
+}
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# Versioned files never change under the same URL; the page itself has a
+# fixed URL and is revalidated on every visit
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+class Asset:
+    """One file as served: its body per content encoding plus cache headers"""
+    
+    def __init__(self, content_type, etag, bodies, cache_control):
+        self.content_type = content_type
+        self.etag = etag
+        self.bodies = bodies  # encoding ('identity', 'gzip', 'br') -> bytes
+        self.cache_control = cache_control
+
+def content_version(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def compress(data):
+    """Compressed copies of data, by content encoding, where they are smaller"""
+    encodings = {'gzip': gzip.compress(data, 9, mtime=0)}
+    try:
+        import brotli  # Only needed to build, so the server does not import it
+    except ImportError:
+        pass
+    else:
+        encodings['br'] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in encodings.items() if len(body) < len(data)}
+
+def render_page(files):
+    from jinja2 import Environment, FileSystemLoader
+    
+    environment = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=True)
+    template = environment.get_template('index.html')
+    return template.render(asset=lambda name: ASSET_URL + files[name]).encode('utf-8')
+
+def build():
+    """Write the client to static/build/ and return the manifest"""
+    outputs = {}  # versioned file name -> bytes
+    files = {}  # source name -> versioned file name
+    for name in SOURCES:
+        with open(os.path.join(STATIC_DIR, name), 'rb') as f:
+            data = f.read()
+        stem, extension = os.path.splitext(name)
+        files[name] = '%s.%s%s' % (stem, content_version(data), extension)
+        outputs[files[name]] = data
+    
+    page = render_page(files)
+    files['index.html'] = 'index.%s.html' % content_version(page)
+    outputs[files['index.html']] = page
+    
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    for old in os.listdir(BUILD_DIR):
+        os.remove(os.path.join(BUILD_DIR, old))
+    
+    manifest = {}
+    for name, file_name in files.items():
+        data = outputs[file_name]
+        encodings = compress(data)
+        for encoding, body in [('identity', data)] + list(encodings.items()):
+            with open(os.path.join(BUILD_DIR, file_name + ENCODING_SUFFIXES.get(encoding, '')), 'wb') as f:
+                f.write(body)
+        manifest[name] = {'file': file_name, 'encodings': sorted(encodings)}
+    
+    with open(MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+def is_stale():
+    """Whether a source (or this builder) changed since the last build"""
+    try:
+        built = os.path.getmtime(MANIFEST_PATH)
+    except OSError:
+        return True
+    sources = [os.path.join(STATIC_DIR, name) for name in SOURCES]
+    sources += [os.path.join(TEMPLATE_DIR, 'index.html'), os.path.abspath(__file__)]
+    return any(os.path.getmtime(path) > built for path in sources)
+
+def load():
+    """The build as {URL path: Asset}, rebuilt first when running from source and out of date"""
+    if not getattr(sys, 'frozen', False) and is_stale():
+        build()
+    with open(MANIFEST_PATH) as f:
+        manifest = json.load(f)
+    
+    assets = {}
+    for name, entry in manifest.items():
+        file_name = entry['file']
+        bodies = {}
+        for encoding in ['identity'] + entry['encodings']:
+            with open(os.path.join(BUILD_DIR, file_name + ENCODING_SUFFIXES.get(encoding, '')), 'rb') as f:
+                bodies[encoding] = f.read()
+        
+        stem, version, extension = file_name.rsplit('.', 2)
+        content_type = CONTENT_TYPES.get('.' + extension, 'application/octet-stream')
+        if name == 'index.html':
+            assets['/'] = Asset(content_type, version, bodies, REVALIDATE)
+        else:
+            assets[ASSET_URL + file_name] = Asset(content_type, version, bodies, IMMUTABLE)
+    return assets
+
+if __name__ == '__main__':
+    manifest = build()
+    for name, entry in sorted(manifest.items()):
+        print('%-18s -> %s (%s)' % (name, entry['file'], ', '.join(['identity'] + entry['encodings'])))
+    if not any('br' in entry['encodings'] for entry in manifest.values()):
+        print('brotli is not installed: gzip copies only')
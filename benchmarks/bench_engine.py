@@ -0,0 +1,218 @@
+"""Headless benchmark for the game engine.
+
+Runs N rooms x M players for K ticks without Flask-SocketIO. Every snake
+starts long and follows a scripted loop through its own strip of the board,
+so collision checks, food handling and growth all see realistic work while
+results stay reproducible for a given seed.
+
+Reports room-ticks per second, time per Game.update phase, the cost of
+building the broadcast frame and allocations per tick, and compares them
+with the saved baseline for the same configuration.
+
+    python benchmarks/bench_engine.py
+    python benchmarks/bench_engine.py --rooms 200 --players 4 --ticks 1000
+    python benchmarks/bench_engine.py --rooms 4 --players 32 --width 300 --height 300
+    python benchmarks/bench_engine.py --tick-rate 5   # snakes move every tick
+    python benchmarks/bench_engine.py --save-baseline
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import CANVAS_HEIGHT, CANVAS_WIDTH, GRID_SIZE, TICK_RATE, Game, PhaseTimer
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'engine_baseline.json')
+ALLOC_TICKS = 200  # Ticks per room sampled with tracemalloc (it slows everything down)
+
+def loop_path(x0, width, height):
+    """Closed path through every cell of the strip [x0, x0 + width) x [0, height)"""
+    path = []
+    for y in range(height):
+        xs = range(1, width) if y % 2 == 0 else range(width - 1, 0, -1)
+        path.extend((x0 + x, y) for x in xs)
+    path.extend((x0, y) for y in range(height - 1, -1, -1))
+    return path
+
+def direction_to(cell, target):
+    dx = target[0] - cell[0]
+    dy = target[1] - cell[1]
+    if dx == 1:
+        return 'RIGHT'
+    if dx == -1:
+        return 'LEFT'
+    if dy == 1:
+        return 'DOWN'
+    return 'UP'
+
+class ScriptedRoom:
+    """A running Game whose snakes follow their loops"""
+    
+    def __init__(self, room_id, players, length, width, height, tick_rate):
+        strip = width // players
+        if strip < 2 or height % 2:
+            raise ValueError('Board too small for %d scripted players' % players)
+        
+        self.game = Game(room_id, width=width, height=height, tick_rate=tick_rate)
+        self.routes = {}
+        for i in range(players):
+            player_id = '%s-p%d' % (room_id, i)
+            self.game.add_player(player_id, 'Player %d' % (i + 1))
+            
+            path = loop_path(i * strip, strip, height)
+            if length >= len(path) - 1:
+                raise ValueError('Snake length %d does not fit a %d-cell loop' % (length, len(path)))
+            next_cell = {cell: path[(j + 1) % len(path)] for j, cell in enumerate(path)}
+            self.routes[player_id] = next_cell
+            
+            # Lay the body along the loop by moving without popping the tail
+            snake = self.game.snakes[player_id]
+            snake.reset(path[0][0], path[0][1])
+            for j in range(1, length):
+                snake.direction = direction_to(path[j - 1], path[j])
+                snake.move()
+        
+        self.game.game_running = True
+        self.game.get_keyframe()
+    
+    def steer(self):
+        for player_id, snake in self.game.snakes.items():
+            if snake.alive:
+                head = snake.body[0]
+                target = self.routes[player_id].get(head)
+                if target is not None:
+                    snake.direction = direction_to(head, target)
+
+def make_rooms(args):
+    random.seed(args.seed)
+    return [ScriptedRoom('room%d' % i, args.players, args.length, args.width, args.height, args.tick_rate)
+            for i in range(args.rooms)]
+
+def run_timed(args):
+    rooms = make_rooms(args)
+    timer = PhaseTimer()
+    for room in rooms:
+        room.game.phase_timer = timer
+    
+    broadcast_seconds = 0.0
+    start = time.perf_counter()
+    for _ in range(args.ticks):
+        for room in rooms:
+            room.steer()
+            room.game.update()
+            broadcast_start = time.perf_counter()
+            room.game.get_broadcast()
+            broadcast_seconds += time.perf_counter() - broadcast_start
+    elapsed = time.perf_counter() - start
+    
+    room_ticks = args.rooms * args.ticks
+    deaths = sum(1 for room in rooms for snake in room.game.snakes.values() if not snake.alive)
+    return {
+        'ticks_per_sec': room_ticks / elapsed,
+        'us_per_tick': elapsed / room_ticks * 1e6,
+        'phases_us': {phase: total / room_ticks * 1e6 for phase, total in timer.totals.items()},
+        'broadcast_us': broadcast_seconds / room_ticks * 1e6,
+        'deaths': deaths
+    }
+
+def run_allocations(args):
+    rooms = make_rooms(args)
+    ticks = min(args.ticks, ALLOC_TICKS)
+    allocated = 0
+    
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    for _ in range(ticks):
+        for room in rooms:
+            room.steer()
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            room.game.update()
+            room.game.get_broadcast()
+            allocated += tracemalloc.get_traced_memory()[1] - before
+    blocks_after = sys.getallocatedblocks()
+    tracemalloc.stop()
+    
+    room_ticks = args.rooms * ticks
+    return {
+        'alloc_kib_per_tick': allocated / room_ticks / 1024,
+        'retained_blocks_per_tick': (blocks_after - blocks_before) / room_ticks
+    }
+
+def flatten(results):
+    flat = {key: value for key, value in results.items() if not isinstance(value, dict)}
+    for phase, value in results['phases_us'].items():
+        flat['phase_%s_us' % phase] = value
+    return flat
+
+def config_key(args):
+    key = 'rooms=%d players=%d ticks=%d length=%d seed=%d' % (
+        args.rooms, args.players, args.ticks, args.length, args.seed)
+    if (args.width, args.height) != (CANVAS_WIDTH // GRID_SIZE, CANVAS_HEIGHT // GRID_SIZE):
+        key += ' board=%dx%d' % (args.width, args.height)
+    if args.tick_rate != TICK_RATE:
+        key += ' rate=%d' % args.tick_rate
+    return key
+
+def report(results, baseline):
+    flat = flatten(results)
+    base = flatten(baseline) if baseline else {}
+    print('%-26s %14s %14s %9s' % ('metric', 'current', 'baseline', 'change'))
+    for key, value in flat.items():
+        if key in base and base[key]:
+            change = '%+8.1f%%' % ((value - base[key]) / base[key] * 100)
+            print('%-26s %14.2f %14.2f %9s' % (key, value, base[key], change))
+        else:
+            print('%-26s %14.2f %14s %9s' % (key, value, '-', ''))
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless Snake engine benchmark')
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--ticks', type=int, default=500)
+    parser.add_argument('--length', type=int, default=120, help='starting snake length')
+    parser.add_argument('--width', type=int, default=CANVAS_WIDTH // GRID_SIZE, help='board width in cells')
+    parser.add_argument('--height', type=int, default=CANVAS_HEIGHT // GRID_SIZE, help='board height in cells')
+    parser.add_argument('--tick-rate', type=int, default=TICK_RATE, help='game ticks per second')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs; the fastest is kept')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--max-regression', type=float, default=None,
+                        help='exit with status 1 if us_per_tick is this many percent above the baseline')
+    parser.add_argument('--json', action='store_true', help='print the raw results as JSON')
+    args = parser.parse_args()
+    
+    results = min((run_timed(args) for _ in range(args.repeat)), key=lambda r: r['us_per_tick'])
+    results.update(run_allocations(args))
+    
+    baselines = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baselines = json.load(f)
+    key = config_key(args)
+    
+    print('Engine benchmark: %s' % key)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        report(results, baselines.get(key))
+    
+    if args.save_baseline:
+        baselines[key] = results
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print('Baseline saved to %s' % BASELINE_PATH)
+    elif args.max_regression is not None and key in baselines:
+        limit = baselines[key]['us_per_tick'] * (1 + args.max_regression / 100)
+        if results['us_per_tick'] > limit:
+            print('REGRESSION: %.2f us/tick exceeds %.2f us/tick' % (results['us_per_tick'], limit))
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Startup benchmark for the game server.
+
+Launches launcher.py (the script build) or a frozen build's executable with
+--no-browser on a free port, times how long it takes until /health answers,
+stops it and repeats. The first start is the cold one: the script build runs
+it with an empty bytecode cache (PYTHONPYCACHEPREFIX set to a new directory),
+and on Linux the frozen build's files are dropped from the page cache before
+it. The other starts are warm and reuse both. Results are compared with the
+saved baseline for the same build.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --frozen dist/SnakeBattleArena/SnakeBattleArena.exe
+    python benchmarks/bench_startup.py --runs 10 --save-baseline
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_baseline.json')
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def drop_page_cache(directory):
+    """Ask the kernel to forget the cached contents of every file under directory"""
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    for path, dirs, files in os.walk(directory):
+        for name in files:
+            try:
+                fd = os.open(os.path.join(path, name), os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+    return True
+
+def time_start(command, env, timeout):
+    """Seconds from launch until /health answers"""
+    port = free_port()
+    env = dict(env, SNAKE_PORT=str(port))
+    url = 'http://127.0.0.1:%d/health' % port
+    started = time.perf_counter()
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdin=subprocess.DEVNULL,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError('Server exited with status %d' % server.returncode)
+            try:
+                urllib.request.urlopen(url, timeout=1).read()
+                return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError('Server did not answer on port %d within %ds' % (port, timeout))
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+def run(args):
+    env = dict(os.environ)
+    if args.frozen:
+        command = [os.path.abspath(args.frozen), '--no-browser']
+        cache_dropped = drop_page_cache(os.path.dirname(os.path.abspath(args.frozen)))
+    else:
+        command = [sys.executable, os.path.join(ROOT, 'launcher.py'), '--no-browser']
+        env['PYTHONPYCACHEPREFIX'] = tempfile.mkdtemp(prefix='snake-pycache-')
+        env.pop('PYTHONDONTWRITEBYTECODE', None)  # Warm starts need the cache the cold one writes
+        cache_dropped = False
+    
+    cold = time_start(command, env, args.timeout)
+    warm = [time_start(command, env, args.timeout) for _ in range(args.runs)]
+    return {
+        'cold_ms': cold * 1000,
+        'warm_ms': statistics.median(warm) * 1000,
+        'warm_min_ms': min(warm) * 1000,
+        'page_cache_dropped': cache_dropped,
+    }
+
+def report(results, baseline):
+    print('%-26s %14s %14s %9s' % ('metric', 'current', 'baseline', 'change'))
+    for key in ('cold_ms', 'warm_ms', 'warm_min_ms'):
+        value = results[key]
+        if baseline and baseline.get(key):
+            change = '%+8.1f%%' % ((value - baseline[key]) / baseline[key] * 100)
+            print('%-26s %14.1f %14.1f %9s' % (key, value, baseline[key], change))
+        else:
+            print('%-26s %14.1f %14s %9s' % (key, value, '-', ''))
+
+def main():
+    parser = argparse.ArgumentParser(description='Snake server startup benchmark')
+    parser.add_argument('--frozen', metavar='EXE', help='time this PyInstaller executable instead of launcher.py')
+    parser.add_argument('--runs', type=int, default=5, help='warm starts after the cold one')
+    parser.add_argument('--timeout', type=int, default=60, help='seconds to wait for each start')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--max-regression', type=float, default=None,
+                        help='exit with status 1 if warm_ms is this many percent above the baseline')
+    parser.add_argument('--json', action='store_true', help='print the raw results as JSON')
+    args = parser.parse_args()
+    
+    results = run(args)
+    
+    baselines = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baselines = json.load(f)
+    key = 'frozen' if args.frozen else 'script'
+    
+    print('Startup benchmark: %s build, %d warm starts' % (key, args.runs))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        report(results, baselines.get(key))
+    
+    if args.save_baseline:
+        baselines[key] = results
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print('Baseline saved to %s' % BASELINE_PATH)
+    elif args.max_regression is not None and key in baselines:
+        limit = baselines[key]['warm_ms'] * (1 + args.max_regression / 100)
+        if results['warm_ms'] > limit:
+            print('REGRESSION: %.1f ms warm start exceeds %.1f ms' % (results['warm_ms'], limit))
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,355 @@
+"""Socket.IO load generator for Snake Battle Arena.
+
+Starts a swarm of python-socketio clients that play through the normal
+create_room / join_room / start_game / player_move events, and measures what
+they see: tick-to-receive latency (from the server's sent_at stamp, so run
+it on the server host or against a clock-synced one), input latency (from
+player_move to its input_ack), game_state/game_delta inter-arrival jitter,
+received bytes per second per client and server CPU (from /health). Games that end are restarted so every room keeps ticking.
+
+Each value of --rooms is one step of the saturation curve; the server is
+saturated once clients stop receiving every tick or latency approaches the
+tick interval. Against a remote server, set SNAKE_TICK_RATE as on the server.
+
+    pip install "python-socketio[client]" requests
+    python benchmarks/loadtest.py --rooms 5,10,25,50 --players 4
+    python benchmarks/loadtest.py --url http://gameserver:5000 --rooms 100 --binary
+"""
+import argparse
+import json
+import os
+import random
+import struct
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import socketio
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import CANVAS_HEIGHT, CANVAS_WIDTH, DIRECTIONS, GRID_SIZE, TICK_INTERVAL
+
+BOARD_WIDTH = CANVAS_WIDTH // GRID_SIZE
+BOARD_HEIGHT = CANVAS_HEIGHT // GRID_SIZE
+STEPS = {'UP': (0, -1), 'DOWN': (0, 1), 'LEFT': (-1, 0), 'RIGHT': (1, 0)}
+TURNS = {'UP': ('LEFT', 'RIGHT'), 'DOWN': ('LEFT', 'RIGHT'), 'LEFT': ('UP', 'DOWN'), 'RIGHT': ('UP', 'DOWN')}
+RESTART_DELAY = 1.0  # Seconds between a game ending and the room creator restarting it
+JOIN_TIMEOUT = 10.0
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(pct / 100.0 * len(values) + 0.5)) - 1))
+    return values[index]
+
+def payload_size(value):
+    """Approximate wire size of a received event payload"""
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(payload_size(key) + payload_size(item) for key, item in value.items()) + len(value) + 2
+    if isinstance(value, list):
+        return sum(payload_size(item) for item in value) + len(value) + 2
+    return len(json.dumps(value))
+
+def head_cell(snake):
+    """Current head of a snake from a keyframe or delta entry (JSON or binary), or None"""
+    if 'body' in snake:
+        body = snake['body']
+        if isinstance(body, bytes):
+            return struct.unpack_from('<hh', body, 0) if body else None
+        return tuple(body[0]) if body else None
+    if 'h' in snake:
+        heads = snake['h']
+        if isinstance(heads, bytes):
+            return struct.unpack_from('<hh', heads, len(heads) - 4)
+        return tuple(heads[-1])
+    return None
+
+class Bot:
+    """One simulated player: steers its snake and records what it receives"""
+    
+    def __init__(self, url, name, binary, move_rate):
+        self.url = url
+        self.name = name
+        self.binary = binary
+        self.move_rate = move_rate
+        self.client = socketio.Client(reconnection=False)
+        self.lock = threading.Lock()
+        self.joined = threading.Event()
+        self.room_id = None
+        self.is_creator = False
+        self.errors = 0
+        
+        self.head = None
+        self.direction = 'RIGHT'
+        self.running = False
+        self.next_turn = 0.0
+        self.move_seq = 0
+        self.moves_sent = {}  # seq -> time.monotonic() when sent
+        self.reset_metrics(False)
+        
+        self.client.on('room_created', self.on_room_created)
+        self.client.on('room_joined', self.on_room_joined)
+        self.client.on('game_state', self.on_frame)
+        self.client.on('game_delta', self.on_frame)
+        self.client.on('input_ack', self.on_input_ack)
+        self.client.on('error', self.on_error)
+    
+    def connect(self):
+        self.client.connect(self.url, transports=['websocket'])
+        self.sid = self.client.get_sid()
+        if self.binary:
+            self.client.emit('set_encoding', {'encoding': 'binary'})
+    
+    def disconnect(self):
+        try:
+            self.client.disconnect()
+        except Exception as e:
+            pass
+    
+    def reset_metrics(self, recording):
+        with self.lock:
+            self.recording = recording
+            self.latencies = []
+            self.input_latencies = []
+            self.gaps = []
+            self.frames = 0
+            self.bytes = 0
+            self.last_arrival = None
+    
+    def on_room_created(self, data):
+        self.room_id = data['roomId']
+        self.is_creator = True
+        self.joined.set()
+    
+    def on_room_joined(self, data):
+        self.room_id = data['roomId']
+        self.joined.set()
+    
+    def on_error(self, data):
+        self.errors += 1
+    
+    def on_input_ack(self, data):
+        now = time.monotonic()
+        with self.lock:
+            sent = self.moves_sent.pop(data['seq'], None)
+            if sent is not None and self.recording:
+                self.input_latencies.append(now - sent)
+    
+    def on_frame(self, data):
+        now = time.time()
+        with self.lock:
+            if self.recording:
+                if 'sent_at' in data:
+                    self.latencies.append(now - data['sent_at'])
+                if self.last_arrival is not None:
+                    self.gaps.append(now - self.last_arrival)
+                self.frames += 1
+                self.bytes += payload_size(data)
+            self.last_arrival = now
+        
+        snake = data['snakes'].get(self.sid)
+        if snake:
+            head = head_cell(snake)
+            if head is not None:
+                self.head = head
+            if 'direction' in snake:
+                direction = snake['direction']
+                self.direction = DIRECTIONS[direction] if isinstance(direction, int) else direction
+        
+        was_running = self.running
+        self.running = data['running']
+        if self.running:
+            self.steer(now)
+        elif was_running and self.is_creator:
+            # Game over: start the next one so the room keeps ticking
+            threading.Timer(RESTART_DELAY, self.start_game).start()
+    
+    def start_game(self):
+        try:
+            self.client.emit('start_game')
+        except Exception as e:
+            pass
+    
+    def steer(self, now):
+        """Turn at a human-like rate, and before running into a wall"""
+        if self.head is None:
+            return
+        
+        turn = now >= self.next_turn
+        dx, dy = STEPS[self.direction]
+        x, y = self.head[0] + dx, self.head[1] + dy
+        if not (0 <= x < BOARD_WIDTH and 0 <= y < BOARD_HEIGHT):
+            turn = True
+        if not turn:
+            return
+        
+        options = []
+        for direction in TURNS[self.direction]:
+            dx, dy = STEPS[direction]
+            if 0 <= self.head[0] + dx < BOARD_WIDTH and 0 <= self.head[1] + dy < BOARD_HEIGHT:
+                options.append(direction)
+        if options:
+            self.direction = random.choice(options)
+            with self.lock:
+                self.move_seq += 1
+                self.moves_sent[self.move_seq] = time.monotonic()
+            self.client.emit('player_move', {'direction': self.direction, 'seq': self.move_seq})
+        self.next_turn = now + random.expovariate(self.move_rate)
+
+def server_cpu(url):
+    try:
+        return requests.get(url + '/health', timeout=5).json().get('cpu_seconds')
+    except Exception as e:
+        return None
+
+def start_server(port):
+    """Run app.py's Socket.IO server in a child process and wait until it answers"""
+    code = ('import app; app.create_app(); app.socketio.run(app.app, host="127.0.0.1", port=%d, '
+            'allow_unsafe_werkzeug=True, log_output=False)' % port)
+    server = subprocess.Popen([sys.executable, '-c', code], cwd=ROOT)
+    url = 'http://127.0.0.1:%d' % port
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('Server exited with status %d' % server.returncode)
+        try:
+            requests.get(url + '/health', timeout=1)
+            return server, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('Server did not start on %s' % url)
+
+def setup_rooms(args, url, room_count):
+    """Connect room_count x players bots, seat them and start every game"""
+    bots = [Bot(url, 'Bot%d' % i, args.binary, args.move_rate) for i in range(room_count * args.players)]
+    with ThreadPoolExecutor(max_workers=args.connect_workers) as pool:
+        list(pool.map(lambda bot: bot.connect(), bots))
+    
+    rooms = [bots[i:i + args.players] for i in range(0, len(bots), args.players)]
+    for creator, *others in rooms:
+        creator.client.emit('create_room', {'playerName': creator.name})
+    for creator, *others in rooms:
+        if not creator.joined.wait(JOIN_TIMEOUT):
+            raise RuntimeError('Timed out creating a room')
+        for bot in others:
+            bot.client.emit('join_room', {'roomId': creator.room_id, 'playerName': bot.name})
+    for creator, *others in rooms:
+        for bot in others:
+            if not bot.joined.wait(JOIN_TIMEOUT):
+                raise RuntimeError('Timed out joining room %s' % creator.room_id)
+        creator.start_game()
+    return bots
+
+def run_step(args, url, room_count):
+    bots = setup_rooms(args, url, room_count)
+    try:
+        # Countdown plus warm-up before anything is recorded
+        time.sleep(3.5 + args.warmup)
+        cpu_start = server_cpu(url)
+        wall_start = time.monotonic()
+        for bot in bots:
+            bot.reset_metrics(True)
+        time.sleep(args.duration)
+        for bot in bots:
+            bot.recording = False
+        elapsed = time.monotonic() - wall_start
+        cpu_end = server_cpu(url)
+    finally:
+        for bot in bots:
+            bot.disconnect()
+    
+    latencies = sorted(value for bot in bots for value in bot.latencies)
+    input_latencies = sorted(value for bot in bots for value in bot.input_latencies)
+    jitter = sorted(abs(gap - TICK_INTERVAL) for bot in bots for gap in bot.gaps)
+    byte_rates = sorted(bot.bytes / elapsed for bot in bots)
+    frame_rates = sorted(bot.frames / elapsed for bot in bots)
+    cpu = None
+    if cpu_start is not None and cpu_end is not None:
+        cpu = (cpu_end - cpu_start) / elapsed * 100
+    return {
+        'rooms': room_count,
+        'clients': len(bots),
+        'latency_ms': {pct: percentile(latencies, pct) * 1000 for pct in (50, 95, 99)},
+        'input_ms': {pct: percentile(input_latencies, pct) * 1000 for pct in (50, 95, 99)},
+        'jitter_ms': {pct: percentile(jitter, pct) * 1000 for pct in (50, 95, 99)},
+        'bytes_per_sec': {pct: percentile(byte_rates, pct) for pct in (50, 95, 99)},
+        'frames_per_sec': sum(frame_rates) / len(frame_rates),
+        'frames_per_sec_p1': percentile(frame_rates, 1),
+        'server_cpu_pct': cpu,
+        'errors': sum(bot.errors for bot in bots)
+    }
+
+def print_step(result):
+    print('\n%d rooms, %d clients' % (result['rooms'], result['clients']))
+    print('  %-22s %10s %10s %10s' % ('', 'p50', 'p95', 'p99'))
+    for key, label in (('latency_ms', 'tick->receive (ms)'), ('input_ms', 'move->ack (ms)'),
+                       ('jitter_ms', 'arrival jitter (ms)'),
+                       ('bytes_per_sec', 'bytes/s per client')):
+        values = result[key]
+        print('  %-22s %10.1f %10.1f %10.1f' % (label, values[50], values[95], values[99]))
+    cpu = result['server_cpu_pct']
+    print('  frames/s per client: %.2f (worst 1%%: %.2f, expected %.2f)   server CPU: %s   errors: %d' % (
+        result['frames_per_sec'], result['frames_per_sec_p1'], 1 / TICK_INTERVAL,
+        '%.0f%%' % cpu if cpu is not None else 'n/a', result['errors']))
+
+def saturated(result):
+    return (result['frames_per_sec_p1'] < 0.9 / TICK_INTERVAL
+            or result['latency_ms'][99] > TICK_INTERVAL * 1000)
+
+def print_curve(results):
+    print('\nSaturation curve (p99 tick->receive latency)')
+    scale = max(result['latency_ms'][99] for result in results) or 1
+    for result in results:
+        bar = '#' * max(1, int(40 * result['latency_ms'][99] / scale))
+        print('  %5d rooms %7.1f ms  %-40s %s' % (
+            result['rooms'], result['latency_ms'][99], bar, 'SATURATED' if saturated(result) else ''))
+
+def main():
+    parser = argparse.ArgumentParser(description='Socket.IO load generator for Snake Battle Arena')
+    parser.add_argument('--url', help='server to test; by default app.py is started locally')
+    parser.add_argument('--port', type=int, default=5055, help='port for the locally started server')
+    parser.add_argument('--rooms', default='1,5,10,25', help='comma-separated room counts, one step each')
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds measured per step')
+    parser.add_argument('--warmup', type=float, default=2.0, help='seconds after the countdown before measuring')
+    parser.add_argument('--move-rate', type=float, default=2.0, help='average direction changes per second')
+    parser.add_argument('--binary', action='store_true', help='negotiate the binary wire format')
+    parser.add_argument('--connect-workers', type=int, default=16)
+    parser.add_argument('--json', metavar='PATH', help='also write the results to PATH')
+    args = parser.parse_args()
+    
+    server = None
+    url = args.url
+    if not url:
+        server, url = start_server(args.port)
+    
+    results = []
+    try:
+        for room_count in (int(value) for value in args.rooms.split(',')):
+            result = run_step(args, url, room_count)
+            results.append(result)
+            print_step(result)
+            # Let the server drop the previous step's rooms
+            time.sleep(1.0)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    
+    if results:
+        print_curve(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1684 @@
+"""Game rules for Snake Battle Arena.
+
+Nothing in here knows about Flask or Socket.IO: games report events through
+a sink object (see NullSink) so the same engine runs behind the web server,
+inside shard worker processes or headless.
+
+static/engine.js is a line-by-line port of the simulation (Snake,
+FoodStore, Game.update, PortableRandom) that lockstep clients run; keep the
+two in step when changing the rules.
+"""
+import colorsys
+import heapq
+import os
+import random
+import threading
+import time
+from collections import deque
+from functools import partial
+from itertools import count
+
+from metrics import LAG_BUCKETS, PHASE_BUCKETS, REGISTRY
+
+# Game settings
+GRID_SIZE = 20
+CANVAS_WIDTH = 800
+CANVAS_HEIGHT = 600
+# Simulation rate; snake speeds and power-up durations are per second and do
+# not depend on it. Clients and benchmarks read the same variable.
+TICK_RATE = max(1, int(os.getenv('SNAKE_TICK_RATE', 20)))  # Game ticks per second
+TICK_INTERVAL = 1.0 / TICK_RATE  # Seconds per game tick
+SNAKE_SPEED = 5  # Cells per second at normal speed (the boosted speed is in POWER_UP_CONFIG)
+TURN_QUEUE_SIZE = 3  # Turns a snake keeps for its next moves, one taken per cell moved
+KEYFRAME_INTERVAL = 10.0  # Seconds between full game_states, game_delta in between
+MAX_CATCH_UP_TICKS = 3  # Ticks a late room may run back-to-back before skipping
+TIMER_RESOLUTION = 0.01  # Seconds per step of the timer wheel (countdowns, taunts, housekeeping)
+HASH_INTERVAL = 2.0  # Seconds between the state hashes of lockstep rooms
+SPECTATOR_INTERVAL = 1.0  # Seconds between the full game_states sent to spectators
+PLAYER_COLORS = ['#ff4444', '#44ff44', '#4444ff', '#ffff44']
+SPAWN_MARGIN = 5  # Cells between the walls and the nearest start position
+MAX_FOODS = 200  # Foods a room holds at most; deaths only spawn foods up to it
+DIRECTIONS = ['UP', 'DOWN', 'LEFT', 'RIGHT']
+OPPOSITE_DIRECTIONS = {'UP': 'DOWN', 'DOWN': 'UP', 'LEFT': 'RIGHT', 'RIGHT': 'LEFT'}
+STEPS = {'UP': (0, -1), 'DOWN': (0, 1), 'LEFT': (-1, 0), 'RIGHT': (1, 0)}  # Head offset per direction
+
+# Metrics, see metrics.py
+TICK_PHASE_SECONDS = REGISTRY.histogram('snake_tick_phase_seconds', 'Time spent per phase of Game.update',
+                                        ('phase',), PHASE_BUCKETS)
+TICK_SECONDS = REGISTRY.histogram('snake_tick_seconds', 'Duration of a room tick: commands, update and broadcast')
+SCHEDULER_LAG_SECONDS = REGISTRY.histogram('snake_scheduler_lag_seconds', 'How late ticks started after their deadline',
+                                           buckets=LAG_BUCKETS)
+SWALLOWED_EXCEPTIONS = REGISTRY.counter('snake_swallowed_exceptions_total', 'Exceptions caught and dropped, by place',
+                                        ('where',))
+
+def seconds_to_ticks(seconds, tick_rate):
+    """Whole ticks closest to seconds (rounded the same way by engine.js)"""
+    return int(seconds * tick_rate + 0.5)
+
+def player_color(index):
+    """Colour of the index-th player: the classic four, then spread around the hue circle"""
+    if index < len(PLAYER_COLORS):
+        return PLAYER_COLORS[index]
+    hue = (index * 0.381966) % 1.0  # Golden-angle steps keep neighbours apart
+    r, g, b = colorsys.hls_to_rgb(hue, 0.55, 0.8)
+    return '#%02x%02x%02x' % (int(r * 255), int(g * 255), int(b * 255))
+
+def radical_inverse(index, base):
+    """index-th element of the van der Corput sequence in base, in [0, 1)"""
+    result = 0.0
+    fraction = 1.0
+    while index > 0:
+        fraction /= base
+        result += fraction * (index % base)
+        index //= base
+    return result
+
+def spawn_point(index, width, height):
+    """Start cell of the index-th snake on a width x height board.
+    
+    The first four are the corners of the playing field; later ones follow a
+    Halton sequence, which spreads any number of snakes evenly without
+    knowing the count up front. static/engine.js has the same function.
+    """
+    left, top = SPAWN_MARGIN, SPAWN_MARGIN
+    right, bottom = width - SPAWN_MARGIN, height - SPAWN_MARGIN
+    if index < 4:
+        return [(left, top), (right, top), (left, bottom), (right, bottom)][index]
+    x = left + int(radical_inverse(index - 3, 2) * (right - left))
+    y = top + int(radical_inverse(index - 3, 3) * (bottom - top))
+    return (x, y)
+
+class NullSink:
+    """Event sink that drops everything, for headless runs.
+    
+    Sinks receive plain events with emit(), room-wide state frames with
+    broadcast_state() and single-client state frames with send_state().
+    Frames for a room's spectators go to broadcast_spectators(), which
+    should only hand them off: fanning out to many viewers must not hold up
+    the tick. RoomService also calls enter_room() once a player is placed
+    in a room, watch_room() for spectators and shard_stats() with periodic
+    statistics.
+    """
+    
+    def emit(self, event, data, room, skip_sid=None):
+        pass
+    
+    def broadcast_state(self, room_id, event, game_state):
+        pass
+    
+    def send_state(self, sid, event, game_state):
+        pass
+    
+    def enter_room(self, sid, room_id, player_name):
+        pass
+    
+    def watch_room(self, sid, room_id):
+        pass
+    
+    def broadcast_spectators(self, room_id, game_state):
+        pass
+    
+    def close_room(self, room_id):
+        pass
+    
+    def shard_stats(self, shard_id, stats):
+        pass
+    
+    def profile_result(self, profile_id, shard_id, result):
+        pass
+
+class PortableRandom:
+    """Seeded 32-bit PRNG (mulberry32) that static/engine.js reproduces exactly.
+    
+    Provides the subset of random.Random the simulation uses.
+    """
+    MASK = 0xFFFFFFFF
+    
+    def __init__(self, seed=0):
+        self.seed(seed)
+    
+    def seed(self, seed):
+        self.state = seed & self.MASK
+    
+    def next_uint32(self):
+        mask = self.MASK
+        self.state = state = (self.state + 0x6D2B79F5) & mask
+        t = ((state ^ (state >> 15)) * (state | 1)) & mask
+        t = ((t + (((t ^ (t >> 7)) * (t | 61)) & mask)) & mask) ^ t
+        return t ^ (t >> 14)
+    
+    def random(self):
+        return self.next_uint32() / 4294967296.0
+    
+    def randrange(self, n):
+        return int(self.random() * n)
+    
+    def randint(self, a, b):
+        return a + self.randrange(b - a + 1)
+    
+    def sample(self, population, k):
+        """k distinct items via a partial Fisher-Yates shuffle"""
+        pool = list(population)
+        for i in range(k):
+            j = i + self.randrange(len(pool) - i)
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:k]
+
+class LockstepInputs:
+    """Inputs applied since the last tick broadcast, for lockstep rooms.
+    
+    Attached to a game's recorders like a replay recorder; clients apply the
+    same inputs to their own copy of the simulation.
+    """
+    
+    def __init__(self):
+        self.inputs = []
+    
+    def start(self, game):
+        self.inputs = []
+    
+    def join(self, game, player_id):
+        player = game.players[player_id]
+        self.inputs.append(['join', player_id, player['name'], player['color']])
+    
+    def leave(self, game, player_id):
+        self.inputs.append(['leave', player_id])
+    
+    def move(self, game, player_id, direction):
+        self.inputs.append(['move', player_id, direction])
+    
+    def finish(self, game):
+        pass
+    
+    def close(self):
+        pass
+    
+    def take(self):
+        inputs = self.inputs
+        self.inputs = []
+        return inputs
+
+class PhaseTimer:
+    """Accumulates wall time per phase of Game.update.
+    
+    Attach one to game.phase_timer to enable timing; with None (the default)
+    update() only pays for a few falsy checks. With sample_every = N only
+    ticks whose number is a multiple of N are timed, the others skip the
+    clock reads entirely. With a histogram (labelled by phase) the phases
+    that ran in each timed tick are also observed into it. Quiet ticks (see
+    Game.step_quiet) are charged to 'move' as a whole.
+    """
+    
+    PHASES = ('move', 'collision', 'deaths', 'food', 'growth', 'end')
+    
+    def __init__(self, histogram=None, sample_every=1):
+        self.totals = dict.fromkeys(self.PHASES, 0.0)
+        self.ticks = 0  # Timed ticks
+        self.histogram = histogram
+        self.sample_every = sample_every
+        self.current = {}  # Phases that ran this tick, for the histogram
+    
+    def lap(self, phase, start):
+        """Charge the time since start to phase and return the new start"""
+        now = time.perf_counter()
+        self.totals[phase] += now - start
+        self.current[phase] = self.current.get(phase, 0.0) + now - start
+        return now
+    
+    def tick_done(self):
+        self.ticks += 1
+        if self.histogram:
+            for phase, seconds in self.current.items():
+                self.histogram.observe(seconds, phase)
+        self.current.clear()
+
+# Game classes
+class Snake:
+    def __init__(self, x, y, color, occupancy=None, tick_rate=TICK_RATE):
+        self.body = [(x, y)]
+        self.direction = 'RIGHT'
+        self.turns = deque()  # Directions queued for the next moves, see queue_turn
+        self.color = color
+        self.alive = True
+        self.score = 0
+        self.just_died = False  # New field to track fresh deaths
+        
+        # Power-up effects
+        self.speed_boost_time = 0  # Remaining ticks of speed boost
+        self.invincible_time = 0   # Remaining ticks of invincibility
+        self.shield_active = False # One-time shield protection
+        
+        # Movement: each tick adds the speed (cells per second) to
+        # move_progress, and every tick_rate of it is one cell moved
+        self.tick_rate = tick_rate
+        self.move_progress = 0
+        
+        # Occupancy tracking: per-snake segment counts plus the room-wide grid
+        # of live segments shared by every snake in the same Game
+        self.occupancy = occupancy if occupancy is not None else {}
+        self.cells = {}
+        self._occupy((x, y))
+        
+        # Body changes since the last broadcast, see Game.get_delta
+        self.pushed_heads = []
+        self.popped_tail = 0
+        self.appended_tail = []
+        self.body_rewritten = True  # New snakes are always sent in full
+        
+        # Client-facing state, rebuilt only when a field changes
+        self.power_up_key = None
+        self.power_up_status = None
+        self.state = None
+    
+    def _occupy(self, cell):
+        """Register one body segment at cell"""
+        self.cells[cell] = self.cells.get(cell, 0) + 1
+        if self.alive:
+            self.occupancy[cell] = self.occupancy.get(cell, 0) + 1
+    
+    def _vacate(self, cell):
+        """Unregister one body segment at cell"""
+        segments = self.cells[cell] - 1
+        if segments:
+            self.cells[cell] = segments
+        else:
+            del self.cells[cell]
+        if self.alive:
+            segments = self.occupancy[cell] - 1
+            if segments:
+                self.occupancy[cell] = segments
+            else:
+                del self.occupancy[cell]
+    
+    def release(self):
+        """Remove all of this snake's segments from the shared occupancy grid"""
+        if not self.alive:
+            return
+        for cell, segments in self.cells.items():
+            remaining = self.occupancy[cell] - segments
+            if remaining:
+                self.occupancy[cell] = remaining
+            else:
+                del self.occupancy[cell]
+    
+    def reset(self, x, y):
+        """Put the snake back to a single segment at (x, y), alive"""
+        self.release()
+        self.body = [(x, y)]
+        self.cells = {}
+        self.alive = True
+        self._occupy((x, y))
+        self.body_rewritten = True
+    
+    def die(self):
+        self.release()
+        self.alive = False
+        self.just_died = True
+    
+    def set_head(self, cell):
+        """Replace the head segment in place"""
+        self._vacate(self.body[0])
+        self.body[0] = cell
+        self._occupy(cell)
+        self.body_rewritten = True
+    
+    def pop_tail(self):
+        self._vacate(self.body.pop())
+        if self.appended_tail:
+            self.appended_tail.pop()
+        else:
+            self.popped_tail += 1
+    
+    def grow(self, segments):
+        """Add extra segments at the current tail position"""
+        tail_pos = self.body[-1]
+        for _ in range(segments):
+            self.body.append(tail_pos)
+            self._occupy(tail_pos)
+            self.appended_tail.append(tail_pos)
+    
+    def truncate(self, length):
+        """Cut the body down to its first length segments"""
+        for cell in self.body[length:]:
+            self._vacate(cell)
+        del self.body[length:]
+        self.body_rewritten = True
+    
+    def take_body_changes(self):
+        """Return the body changes since the last call and start a new journal.
+        
+        The result is either {'body': [...]} after a rewrite, or any of
+        'h' (heads pushed to the front, oldest first), 'p' (segments popped
+        from the tail) and 'g' (segments appended at the tail), applied to
+        the previous body in that order.
+        """
+        if self.body_rewritten:
+            changes = {'body': list(self.body)}
+        else:
+            changes = {}
+            if self.pushed_heads:
+                changes['h'] = self.pushed_heads
+            if self.popped_tail:
+                changes['p'] = self.popped_tail
+            if self.appended_tail:
+                changes['g'] = self.appended_tail
+        
+        self.pushed_heads = []
+        self.popped_tail = 0
+        self.appended_tail = []
+        self.body_rewritten = False
+        return changes
+    
+    def speed(self):
+        """Cells per second"""
+        if self.speed_boost_time > 0:
+            return POWER_UP_CONFIG['speed']['speed']
+        return SNAKE_SPEED
+    
+    def advance(self):
+        """Count down the power-up timers and return how many cells to move this tick"""
+        if self.speed_boost_time > 0:
+            self.speed_boost_time -= 1
+        if self.invincible_time > 0:
+            self.invincible_time -= 1
+        
+        progress = self.move_progress + self.speed()
+        moves = progress // self.tick_rate
+        self.move_progress = progress - moves * self.tick_rate
+        return moves
+    
+    def queue_turn(self, direction, limit):
+        """Queue direction for the snake's next move; False if it repeats or reverses the last one or the queue is full.
+        
+        With limit 0 the snake turns right away instead (replays recorded
+        before the queue).
+        """
+        last = self.turns[-1] if self.turns else self.direction
+        if direction == last or direction == OPPOSITE_DIRECTIONS[last] or len(self.turns) >= max(limit, 1):
+            return False
+        if limit:
+            self.turns.append(direction)
+        else:
+            self.direction = direction
+        return True
+    
+    def move(self):
+        if not self.alive or not self.body:
+            return
+        
+        if self.turns:
+            self.direction = self.turns.popleft()
+        head = self.body[0]
+        
+        if self.direction == 'UP':
+            new_head = (head[0], head[1] - 1)
+        elif self.direction == 'DOWN':
+            new_head = (head[0], head[1] + 1)
+        elif self.direction == 'LEFT':
+            new_head = (head[0] - 1, head[1])
+        elif self.direction == 'RIGHT':
+            new_head = (head[0] + 1, head[1])        
+        else:
+            return
+        
+        self.body.insert(0, new_head)
+        self._occupy(new_head)
+        self.pushed_heads.append(new_head)
+    
+    def check_collision(self, width, height):
+        if not self.alive or not self.body:
+            return
+        
+        head = self.body[0]
+        
+        # Check wall collision (only if not invincible)
+        if not self.invincible_time > 0:
+            if head[0] < 0 or head[0] >= width or head[1] < 0 or head[1] >= height:
+                if self.shield_active:
+                    # Shield protects once, then deactivates
+                    self.shield_active = False
+                    # Move snake away from wall
+                    if head[0] < 0:
+                        self.set_head((0, head[1]))
+                    elif head[0] >= width:
+                        self.set_head((width - 1, head[1]))
+                    elif head[1] < 0:
+                        self.set_head((head[0], 0))
+                    elif head[1] >= height:
+                        self.set_head((head[0], height - 1))
+                    return
+                else:
+                    self.die()
+                    return
+        
+        # Check self collision (only if not invincible)
+        own_segments = self.cells[head]
+        if not self.invincible_time > 0 and own_segments > 1:
+            if self.shield_active:
+                # Shield protects once, then deactivates
+                self.shield_active = False
+                # Remove the colliding segment
+                collision_index = self.body.index(head, 1)
+                self.truncate(collision_index)
+                return
+            else:
+                self.die()
+                return
+        
+        # Check collision with other snakes (only if not invincible)
+        if not self.invincible_time > 0 and self.occupancy.get(head, 0) > own_segments:
+            if self.shield_active:
+                # Shield protects once, then deactivates
+                self.shield_active = False
+                return
+            else:
+                self.die()
+                return
+    
+    def apply_power_up(self, effect):
+        """Apply power-up effect to snake with configurable duration"""
+        config = POWER_UP_CONFIG
+        
+        if effect == 'speed_boost':
+            self.speed_boost_time = seconds_to_ticks(config['speed']['duration'], self.tick_rate)
+        elif effect == 'invincibility':
+            self.invincible_time = seconds_to_ticks(config['invincible']['duration'], self.tick_rate)
+        elif effect == 'shield':
+            self.shield_active = True
+    
+    def get_state(self):
+        """Snake as sent in keyframes; the same dict is returned while it is up to date"""
+        power_ups = self.get_power_up_status()
+        state = self.state
+        if (state is None or state['body'] is not self.body or state['alive'] != self.alive
+                or state['score'] != self.score or state['direction'] != self.direction
+                or state['power_ups'] is not power_ups):
+            self.state = state = {
+                'body': self.body,
+                'color': self.color,
+                'alive': self.alive,
+                'score': self.score,
+                'direction': self.direction,
+                'power_ups': power_ups
+            }
+        return state
+    
+    def get_power_up_status(self):
+        """Get current power-up status for client rendering (reused while the seconds left are unchanged)"""
+        # Whole seconds left, rounded up, so the status changes once a second
+        key = (-(-self.speed_boost_time // self.tick_rate), -(-self.invincible_time // self.tick_rate),
+               self.shield_active)
+        if key != self.power_up_key:
+            self.power_up_key = key
+            self.power_up_status = self._build_power_up_status(*key)
+        return self.power_up_status
+    
+    def _build_power_up_status(self, speed_boost_left, invincible_left, shield_active):
+        status = {}
+        
+        # time_left is in seconds; power-ups about to expire blink
+        if speed_boost_left > 0:
+            status['speed_boost'] = {
+                'active': True,
+                'time_left': speed_boost_left,
+                'blinking': speed_boost_left <= 3  # Blink in last 3 seconds
+            }
+        
+        if invincible_left > 0:
+            status['invincible'] = {
+                'active': True,
+                'time_left': invincible_left,
+                'blinking': invincible_left <= 3  # Blink in last 3 seconds
+            }
+        
+        if shield_active:
+            status['shield'] = {
+                'active': True,
+                'time_left': -1,  # Shield doesn't expire with time
+                'blinking': False
+            }
+        
+        return status
+
+# Power-up configuration - Easy to modify drop rates and durations (in seconds)
+POWER_UP_CONFIG = {
+    'normal': {'color': '#ff4444', 'weight': 70, 'growth': 1, 'effect': None, 'duration': 0},
+    'speed': {'color': '#ffff44', 'weight': 12, 'growth': 1, 'effect': 'speed_boost', 'duration': 10,
+              'speed': 2 * SNAKE_SPEED},  # Cells per second while boosted
+    'invincible': {'color': '#4444ff', 'weight': 8, 'growth': 1, 'effect': 'invincibility', 'duration': 10},
+    'super': {'color': '#ff44ff', 'weight': 8, 'growth': 3, 'effect': None, 'duration': 0},
+    'shield': {'color': '#44ff44', 'weight': 2, 'growth': 1, 'effect': 'shield', 'duration': 0}  # Shield is one-time use
+}
+
+def build_alias_table(weights):
+    """Build a Vose alias table for O(1) weighted sampling"""
+    n = len(weights)
+    total = sum(weights)
+    prob = [weight * n / total for weight in weights]
+    alias = [0] * n
+    
+    small = [i for i, p in enumerate(prob) if p < 1.0]
+    large = [i for i, p in enumerate(prob) if p >= 1.0]
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+        alias[less] = more
+        prob[more] -= 1.0 - prob[less]
+        if prob[more] < 1.0:
+            small.append(more)
+        else:
+            large.append(more)
+    
+    # Whatever is left over is (up to rounding) exactly 1
+    for i in small + large:
+        prob[i] = 1.0
+    
+    return prob, alias
+
+class Food:
+    # Food types with their properties - Now using configurable system
+    FOOD_TYPES = POWER_UP_CONFIG
+    
+    def __init__(self, x, y, food_type=None, rng=random):
+        self.x = x
+        self.y = y
+        self.type = food_type or self._choose_food_type(rng)
+        self.state = None
+    
+    @classmethod
+    def build_type_table(cls):
+        """Precompute the alias table used by _choose_food_type.
+        
+        Call again after changing weights in POWER_UP_CONFIG at runtime.
+        """
+        cls._type_names = list(cls.FOOD_TYPES)
+        cls._type_prob, cls._type_alias = build_alias_table(
+            [food_data['weight'] for food_data in cls.FOOD_TYPES.values()])
+        
+    def _choose_food_type(self, rng):
+        """Choose food type based on weighted probabilities (alias method)"""
+        i = rng.randrange(len(self._type_names))
+        if rng.random() >= self._type_prob[i]:
+            i = self._type_alias[i]
+        return self._type_names[i]
+    
+    def get_properties(self):
+        """Get the properties of this food type"""
+        return self.FOOD_TYPES[self.type]
+    
+    def get_state(self):
+        """Get the food as sent to clients (foods never change, so this is built once)"""
+        if self.state is None:
+            self.state = {'x': self.x, 'y': self.y, 'type': self.type, 'color': self.FOOD_TYPES[self.type]['color']}
+        return self.state
+
+Food.build_type_table()
+
+class FoodStore:
+    """Foods on the field, indexed by grid position"""
+    
+    # Random probes per food before falling back to enumerating free cells
+    SPAWN_ATTEMPTS = 8
+    
+    def __init__(self, width, height, rng=random):
+        self.width = width
+        self.height = height
+        self.rng = rng  # The owning game's RNG, so spawns replay exactly
+        self.by_pos = {}
+        
+        # Changes since the last broadcast, see take_changes
+        self.added = {}
+        self.removed = set()
+    
+    def __len__(self):
+        return len(self.by_pos)
+    
+    def __iter__(self):
+        return iter(self.by_pos.values())
+    
+    def at(self, pos):
+        """Return the food at pos, or None"""
+        return self.by_pos.get(pos)
+    
+    def _add(self, pos):
+        food = Food(pos[0], pos[1], rng=self.rng)
+        self.by_pos[pos] = food
+        self.added[pos] = food
+    
+    def remove(self, pos):
+        if self.by_pos.pop(pos, None) is None:
+            return
+        if self.added.pop(pos, None) is None:
+            self.removed.add(pos)
+    
+    def clear(self):
+        for pos in list(self.by_pos):
+            self.remove(pos)
+    
+    def take_changes(self):
+        """Return (added foods, removed positions) since the last call"""
+        if not self.added and not self.removed:
+            return (), ()
+        changes = (list(self.added.values()), list(self.removed))
+        self.added = {}
+        self.removed = set()
+        return changes
+    
+    def spawn(self, n, blocked=()):
+        """Place up to n new foods on free cells.
+        
+        blocked is a sequence of containers of occupied cells (e.g. the
+        game's occupancy grid). Returns the number of foods placed, which is
+        lower than n only when the board runs out of free cells.
+        """
+        def is_free(cell):
+            if cell in self.by_pos:
+                return False
+            for cells in blocked:
+                if cell in cells:
+                    return False
+            return True
+        
+        placed = 0
+        
+        # Cheap path: on a mostly empty board a few random probes find a cell
+        attempts = self.SPAWN_ATTEMPTS * n
+        while placed < n and attempts > 0:
+            attempts -= 1
+            cell = (self.rng.randint(0, self.width - 1), self.rng.randint(0, self.height - 1))
+            if is_free(cell):
+                self._add(cell)
+                placed += 1
+        
+        if placed < n:
+            # Crowded board: sample directly from the remaining free cells
+            free_cells = [(x, y) for x in range(self.width) for y in range(self.height)
+                          if is_free((x, y))]
+            for cell in self.rng.sample(free_cells, min(n - placed, len(free_cells))):
+                self._add(cell)
+                placed += 1
+        
+        return placed
+
+class Game:
+    # Netcode modes: 'state' broadcasts keyframes and deltas, 'lockstep' only
+    # the inputs of each tick for clients that simulate the game themselves
+    NETCODES = ('state', 'lockstep')
+    # Room states reported by status()
+    STATUSES = ('lobby', 'countdown', 'running', 'finished')
+    
+    def __init__(self, room_id, sink=None, scheduler=None, seed=None, netcode='state',
+                 width=CANVAS_WIDTH // GRID_SIZE, height=CANVAS_HEIGHT // GRID_SIZE, min_foods=1,
+                 max_foods=MAX_FOODS, tick_rate=TICK_RATE):
+        self.room_id = room_id
+        self.sink = sink or NullSink()
+        self.scheduler = scheduler
+        self.players = {}
+        self.snakes = {}
+        # Board size in cells and how many foods are kept on it at least and
+        # at most
+        self.width = width
+        self.height = height
+        self.min_foods = min_foods
+        self.max_foods = max(max_foods, min_foods)
+        self.max_players = len(PLAYER_COLORS)  # Seats, enforced by RoomService
+        # Ticks per second; the intervals below are converted to ticks of it
+        self.tick_rate = tick_rate
+        self.keyframe_interval = max(1, seconds_to_ticks(KEYFRAME_INTERVAL, tick_rate))
+        self.hash_interval = max(1, seconds_to_ticks(HASH_INTERVAL, tick_rate))
+        # Spectator sids; they are not players and get a game_state only
+        # every spectator_interval ticks
+        self.spectators = set()
+        self.spectator_interval = max(1, seconds_to_ticks(SPECTATOR_INTERVAL, tick_rate))
+        self.turn_queue_size = TURN_QUEUE_SIZE
+        
+        # Every random choice of the simulation comes from this RNG; each
+        # match reseeds it (see start_game) so replays and lockstep clients
+        # can reproduce it
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.rng = PortableRandom(self.seed)
+        
+        # Input recorders (replay.ReplayRecorder, LockstepInputs): start(),
+        # join(), leave(), move() and finish() are called as the match goes
+        self.recorders = []
+        self.netcode = netcode
+        self.lockstep = None
+        if netcode == 'lockstep':
+            self.lockstep = LockstepInputs()
+            self.recorders.append(self.lockstep)
+        
+        self.occupancy = {}  # Cell -> number of live snake segments on it
+        self.foods = FoodStore(width, height, self.rng)
+        self.foods.spawn(min_foods)
+        self.game_running = False
+        self.countdown_active = False
+        self.game_started = False
+        self.last_update = time.monotonic()
+        self.last_activity = time.monotonic()  # Last command from a client, see drain_mailbox
+        self.dead_players = set()  # Track players who have died
+        self.game_winner = None  # Track the winner
+        
+        # Broadcast bookkeeping for keyframes and deltas
+        self.tick = 0
+        
+        # Optional per-phase timing of update(), see PhaseTimer
+        self.phase_timer = None
+        
+        # Tick scheduling, see TickScheduler
+        self.schedule_token = 0
+        self.wake_pending = False
+        self.timers = {}  # Name -> pending Timer of this room, see set_timer
+        # Commands from other threads, applied by the room itself (see post())
+        self.mailbox = deque()
+        self.tick_jitter = {'ticks': 0, 'total': 0.0, 'max': 0.0, 'skipped': 0}
+        self.sent_snakes = {}  # player_id -> (alive, score, direction, power_ups) last sent
+        self.removed_snakes = []
+        self.snapshot = None  # Cached get_state() result, dropped whenever the game changes
+    
+    def post(self, command, *args):
+        """Queue command(*args) to run on the room's own thread.
+        
+        Only the tick scheduler thread changes a scheduled game: running
+        rooms drain the mailbox at the start of each tick, idle rooms as soon
+        as the scheduler is woken. Without a scheduler (headless) the command
+        runs right away.
+        """
+        self.mailbox.append((command, args))
+        if self.scheduler:
+            self.scheduler.wake(self)
+        else:
+            self.drain_mailbox()
+    
+    def drain_mailbox(self):
+        """Apply every queued command in arrival order"""
+        mailbox = self.mailbox
+        if mailbox:
+            self.last_activity = time.monotonic()
+        while mailbox:
+            command, args = mailbox.popleft()
+            self.snapshot = None
+            try:
+                command(*args)
+            except Exception as e:
+                SWALLOWED_EXCEPTIONS.inc('mailbox')
+    
+    def add_player(self, player_id, player_name):
+        self.snapshot = None
+        color = player_color(len(self.players))
+        start_pos = spawn_point(len(self.players), self.width, self.height)
+        
+        self.players[player_id] = {
+            'name': player_name,
+            'color': color,
+            'ready': False
+        }
+        
+        self.snakes[player_id] = Snake(start_pos[0], start_pos[1], color, self.occupancy, self.tick_rate)
+        if self.game_started:
+            for recorder in self.recorders:
+                recorder.join(self, player_id)
+    
+    def remove_player(self, player_id):
+        self.snapshot = None
+        if self.game_started and player_id in self.players:
+            for recorder in self.recorders:
+                recorder.leave(self, player_id)
+        if player_id in self.players:
+            del self.players[player_id]
+        if player_id in self.snakes:
+            self.snakes[player_id].release()
+            del self.snakes[player_id]
+            self.sent_snakes.pop(player_id, None)
+            self.removed_snakes.append(player_id)
+    
+    def set_direction(self, player_id, direction, seq=None):
+        """Queue a turn for a player's snake; repeats, reversals and turns past a full queue are ignored.
+        
+        With a seq the player gets an input_ack with the tick that took the
+        input in, so clients can measure their input latency.
+        """
+        snake = self.snakes.get(player_id)
+        accepted = (snake is not None and self.game_running and direction in OPPOSITE_DIRECTIONS
+                    and snake.queue_turn(direction, self.turn_queue_size))
+        if accepted:
+            for recorder in self.recorders:
+                recorder.move(self, player_id, direction)
+        if seq is not None:
+            self.sink.emit('input_ack', {'seq': seq, 'tick': self.tick + 1, 'accepted': accepted}, player_id)
+    
+    def blocked_cells(self):
+        """Cell containers that new food must avoid: live and dead snake bodies"""
+        blocked = [self.occupancy]
+        blocked.extend(snake.cells for snake in self.snakes.values() if not snake.alive)
+        return blocked
+    
+    def start_game(self, seed=None):
+        if self.game_started or self.countdown_active:
+            return False
+        
+        self.countdown_active = True
+        self.reset_match(seed)
+        self.countdown(3)
+        return True
+    
+    def reset_match(self, seed=None):
+        """Put every snake back on its start cell and reseed for a new match"""
+        self.game_started = True
+        self.snapshot = None
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.rng.seed(self.seed)
+        
+        # Reset all snakes to starting positions
+        for i, (player_id, snake) in enumerate(self.snakes.items()):
+            start_pos = spawn_point(i, self.width, self.height)
+            snake.reset(start_pos[0], start_pos[1])
+            snake.direction = 'RIGHT'
+            snake.turns.clear()
+            snake.score = 0
+            snake.just_died = False
+            # Reset power-up effects
+            snake.speed_boost_time = 0
+            snake.invincible_time = 0
+            snake.shield_active = False
+            snake.move_progress = 0
+        
+        # Reset death tracking
+        self.dead_players.clear()
+        self.game_winner = None
+        self.tick = 0
+        self.tick_jitter = {'ticks': 0, 'total': 0.0, 'max': 0.0, 'skipped': 0}
+        
+        # Reset foods to the minimum
+        self.foods.clear()
+        self.foods.spawn(self.min_foods, self.blocked_cells())
+        
+        for recorder in self.recorders:
+            recorder.start(self)
+    
+    def countdown(self, seconds_left):
+        """Announce seconds_left, then the next step a second later; the game begins half a second after 0"""
+        try:
+            self.sink.emit('countdown', {'count': seconds_left}, self.room_id)
+            if seconds_left:
+                self.set_timer('countdown', 1.0, self.countdown, seconds_left - 1)
+            else:
+                self.set_timer('countdown', 0.5, self.begin)
+        
+        except Exception as e:
+            SWALLOWED_EXCEPTIONS.inc('countdown')
+            self.cancel_start()
+    
+    def set_timer(self, name, delay, callback, *args):
+        """Run callback(*args) on the room's thread in delay seconds, replacing the timer called name.
+        
+        Timers go on the scheduler's TimerWheel; headless games without a
+        scheduler use a short-lived thread instead.
+        """
+        self.cancel_timer(name)
+        if self.scheduler:
+            timer = self.scheduler.call_at(time.monotonic() + delay, callback, *args)
+        else:
+            timer = threading.Timer(delay, self.post, (callback,) + args)
+            timer.daemon = True
+            timer.start()
+        self.timers[name] = timer
+        return timer
+    
+    def cancel_timer(self, name):
+        timer = self.timers.pop(name, None)
+        if timer is not None:
+            timer.cancel()
+    
+    def cancel_timers(self):
+        """Cancel every pending timer of the room, e.g. when it closes"""
+        for timer in self.timers.values():
+            timer.cancel()
+        self.timers.clear()
+    
+    def begin(self):
+        """Actually start the game"""
+        if not self.countdown_active:
+            return
+        
+        self.game_running = True
+        self.countdown_active = False
+        self.last_update = time.monotonic()
+        if self.scheduler:
+            self.scheduler.schedule(self)
+        # Send immediate game state to show movement has started
+        event, game_state = self.get_broadcast(keyframe=True)
+        self.sink.broadcast_state(self.room_id, event, game_state)
+        self.broadcast_spectators()
+    
+    def cancel_start(self):
+        self.cancel_timer('countdown')
+        self.game_running = False
+        self.countdown_active = False
+        self.game_started = False
+    
+    def status(self):
+        """Which of STATUSES the room is in"""
+        if self.game_running:
+            return 'running'
+        if self.countdown_active:
+            return 'countdown'
+        # A match ran and nobody has started the next one yet
+        return 'finished' if self.tick else 'lobby'
+
+    def get_state(self):
+        """Full game state as sent in keyframes (does not touch the delta journals).
+        
+        Built at most once per tick: until the game changes every caller
+        (keyframe broadcast, late joiners, keyframe requests) gets the same
+        snapshot, so sinks can reuse its encoding.
+        """
+        if self.snapshot is None:
+            self.snapshot = {
+                'snakes': {pid: snake.get_state() for pid, snake in self.snakes.items()},
+                'foods': [food.get_state() for food in self.foods],
+                'running': self.game_running,
+                'tick': self.tick,
+                'board': [self.width, self.height],
+                'keyframe': True
+            }
+        return self.snapshot
+    
+    def get_keyframe(self):
+        """Full state for the whole room; deltas continue from here"""
+        game_state = self.get_state()
+        
+        self.sent_snakes = {}
+        for pid, snake in self.snakes.items():
+            snake.take_body_changes()
+            self.sent_snakes[pid] = (snake.alive, snake.score, snake.direction, snake.get_power_up_status())
+        self.foods.take_changes()
+        self.removed_snakes = []
+        
+        return game_state
+    
+    def get_delta(self):
+        """Changes since the last keyframe or delta sent to the room"""
+        snakes = {}
+        for pid, snake in self.snakes.items():
+            power_ups = snake.get_power_up_status()
+            current = (snake.alive, snake.score, snake.direction, power_ups)
+            sent = self.sent_snakes.get(pid)
+            if current == sent and not (snake.body_rewritten or snake.pushed_heads or snake.popped_tail
+                                        or snake.appended_tail):
+                continue  # Unchanged, e.g. a snake that did not move this tick
+            
+            snake_delta = snake.take_body_changes()
+            if sent is None:
+                # Joined since the last broadcast
+                snake_delta['color'] = snake.color
+                sent = (None, None, None, None)
+            for key, value, old_value in zip(('alive', 'score', 'direction', 'power_ups'), current, sent):
+                if value != old_value:
+                    snake_delta[key] = value
+            
+            self.sent_snakes[pid] = current
+            if snake_delta:
+                snakes[pid] = snake_delta
+        
+        added, removed = self.foods.take_changes()
+        delta = {
+            'tick': self.tick,
+            'base': self.tick - 1,
+            'running': self.game_running,
+            'snakes': snakes
+        }
+        if self.removed_snakes:
+            delta['removed_snakes'] = self.removed_snakes
+            self.removed_snakes = []
+        if added:
+            delta['foods_add'] = [food.get_state() for food in added]
+        if removed:
+            delta['foods_remove'] = removed
+        
+        return delta
+    
+    def get_sync_state(self):
+        """Everything a lockstep client needs to simulate on from the current tick"""
+        return {
+            'tick': self.tick,
+            'running': self.game_running,
+            'seed': self.seed,
+            'rng': self.rng.state,
+            'board': [self.width, self.height],
+            'min_foods': self.min_foods,
+            'max_foods': self.max_foods,
+            'tick_interval': 1.0 / self.tick_rate,
+            'tick_rate': self.tick_rate,
+            'snake_speed': SNAKE_SPEED,
+            'power_ups': POWER_UP_CONFIG,
+            'hash_interval': self.hash_interval,
+            'turn_queue_size': self.turn_queue_size,
+            # A list, not a dict: clients must rebuild the snakes in this order
+            'players': [{
+                'id': pid,
+                'name': self.players[pid]['name'],
+                'color': snake.color,
+                'body': snake.body,
+                'direction': snake.direction,
+                'turns': list(snake.turns),
+                'alive': snake.alive,
+                'score': snake.score,
+                'speed_boost_time': snake.speed_boost_time,
+                'invincible_time': snake.invincible_time,
+                'shield_active': snake.shield_active,
+                'move_progress': snake.move_progress
+            } for pid, snake in self.snakes.items()],
+            'foods': [[food.x, food.y, food.type] for food in self.foods],
+            'dead_players': list(self.dead_players),
+            # Inputs of the next lockstep_tick that this state already includes
+            'inputs_applied': len(self.lockstep.inputs)
+        }
+    
+    def state_hash(self):
+        """32-bit FNV-1a over the simulation state, computed the same way by engine.js"""
+        values = [self.tick]
+        for snake in self.snakes.values():
+            values.extend((int(snake.alive), snake.score, DIRECTIONS.index(snake.direction),
+                           snake.speed_boost_time, snake.invincible_time, int(snake.shield_active),
+                           snake.move_progress, len(snake.turns)))
+            values.extend(DIRECTIONS.index(direction) for direction in snake.turns)
+            values.append(len(snake.body))
+            for x, y in snake.body:
+                values.append(x)
+                values.append(y)
+        food_types = list(POWER_UP_CONFIG)
+        for x, y, food_type in sorted((food.x, food.y, food.type) for food in self.foods):
+            values.extend((x, y, food_types.index(food_type)))
+        
+        h = 0x811C9DC5
+        for value in values:
+            h = ((h ^ (value & 0xFFFFFFFF)) * 0x01000193) & 0xFFFFFFFF
+        return h
+    
+    def get_lockstep_tick(self):
+        """Inputs applied before this tick, plus a state hash every hash_interval ticks"""
+        frame = {
+            'tick': self.tick,
+            'running': self.game_running,
+            'inputs': self.lockstep.take()
+        }
+        if self.tick % self.hash_interval == 0 or not self.game_running:
+            frame['hash'] = self.state_hash()
+        return frame
+    
+    def get_full_state(self):
+        """(event, payload) that brings one client up to date, e.g. a late joiner"""
+        if self.lockstep:
+            return 'lockstep_sync', self.get_sync_state()
+        return 'game_state', self.get_state()
+    
+    def get_broadcast(self, keyframe=False):
+        """Return (event, payload) for this tick: a periodic keyframe or a delta.
+        
+        Lockstep rooms send the tick's inputs instead. keyframe=True forces a
+        full state (lockstep_sync in lockstep rooms).
+        """
+        if self.lockstep:
+            if keyframe:
+                return 'lockstep_sync', self.get_sync_state()
+            return 'lockstep_tick', self.get_lockstep_tick()
+        if keyframe or self.tick % self.keyframe_interval == 0:
+            return 'game_state', self.get_keyframe()
+        return 'game_delta', self.get_delta()
+    
+    def broadcast_spectators(self):
+        """Hand the current full state to the sink for the room's spectators"""
+        if self.spectators:
+            self.sink.broadcast_spectators(self.room_id, self.get_state())
+    
+    def record_jitter(self, lateness):
+        """Record how late (in seconds) a tick started relative to its deadline"""
+        jitter = self.tick_jitter
+        jitter['ticks'] += 1
+        jitter['total'] += lateness
+        if lateness > jitter['max']:
+            jitter['max'] = lateness
+    
+    def run_tick(self):
+        """Apply queued commands, advance by one tick and broadcast the result to the room"""
+        start = time.perf_counter()
+        self.drain_mailbox()
+        self.update()
+        self.last_update = time.monotonic()
+        # Send a keyframe or delta to all players in room
+        event, game_state = self.get_broadcast()
+        # Server wall clock at send time, for tick-to-receive latency measurements
+        game_state['sent_at'] = time.time()
+        self.sink.broadcast_state(self.room_id, event, game_state)
+        
+        # Spectators lag behind at a lower rate, but always see the end
+        if self.spectators and (self.tick % self.spectator_interval == 0 or not self.game_running):
+            self.broadcast_spectators()
+        TICK_SECONDS.observe(time.perf_counter() - start)
+    
+    def step_quiet(self):
+        """Advance every snake if that is all this tick does.
+        
+        Most ticks nobody dies, eats, grows or is invincible, and then the
+        phases of update() come down to counting down the speed boost,
+        adding to each snake's move_progress and pushing the head and
+        popping the tail of the snakes due to move one cell. This checks
+        for that up front and does it in one pass, with the same result as
+        the full update. Returns False, without changing anything, when the
+        tick needs the full update.
+        """
+        occupancy = self.occupancy
+        foods = self.foods.by_pos
+        width = self.width
+        height = self.height
+        tick_rate = self.tick_rate
+        boost_speed = POWER_UP_CONFIG['speed']['speed']
+        advances = []
+        new_heads = set()
+        alive = 0
+        for snake in self.snakes.values():
+            if snake.just_died:
+                return False
+            if not snake.alive:
+                continue
+            if snake.invincible_time > 0:
+                return False
+            alive += 1
+            # As Snake.advance(), which counts the boost down before it picks the speed
+            progress = snake.move_progress + (boost_speed if snake.speed_boost_time > 1 else SNAKE_SPEED)
+            if progress < tick_rate:
+                advances.append((snake, progress, None))
+                continue
+            if progress >= 2 * tick_rate:
+                return False  # More than one cell this tick
+            step = STEPS.get(snake.turns[0] if snake.turns else snake.direction)
+            if step is None:
+                return False
+            head = snake.body[0]
+            new_head = (head[0] + step[0], head[1] + step[1])
+            # Walls, any live segment (tails included, as they move last),
+            # another head or a food all need the full update
+            if (not (0 <= new_head[0] < width and 0 <= new_head[1] < height) or new_head in occupancy
+                    or new_head in new_heads or new_head in foods):
+                return False
+            new_heads.add(new_head)
+            advances.append((snake, progress - tick_rate, new_head))
+        
+        if (alive <= 1 and len(self.snakes) > 1) or len(self.foods) < self.min_foods:
+            return False  # The match ends or foods are topped up
+        
+        for snake, progress, new_head in advances:
+            if snake.speed_boost_time > 0:
+                snake.speed_boost_time -= 1
+            snake.move_progress = progress
+            if new_head is None:
+                continue
+            # Same bookkeeping as Snake.move() then Snake.pop_tail(); the new
+            # head was on no live segment, so its counts start at one
+            if snake.turns:
+                snake.direction = snake.turns.popleft()
+            body = snake.body
+            body.insert(0, new_head)
+            snake.cells[new_head] = 1
+            occupancy[new_head] = 1
+            snake.pushed_heads.append(new_head)
+            snake._vacate(body.pop())
+            if snake.appended_tail:
+                snake.appended_tail.pop()
+            else:
+                snake.popped_tail += 1
+        return True
+    
+    def step_snakes(self, movers, timer, start):
+        """Move each (player_id, snake) in movers one cell and settle the collisions, deaths, food and growth.
+        
+        Returns the new start time for the phase timer, if there is one.
+        """
+        # Move all movers first
+        for player_id, snake in movers:
+            snake.move()
+        
+        if timer:
+            start = timer.lap('move', start)
+        
+        # Check collisions (heads against the occupancy grid, not against bodies)
+        width = self.width
+        height = self.height
+        
+        for player_id, snake in movers:
+            snake.check_collision(width, height)
+        
+        if timer:
+            start = timer.lap('collision', start)
+        
+        # Handle death events
+        for player_id, snake in movers:
+            if snake.just_died:
+                snake.just_died = False  # Reset the flag
+                self.dead_players.add(player_id)
+                player_name = self.players[player_id]['name']
+                player_score = snake.score
+                
+                # Spawn foods based on the dead player's score (only if 3+ players)
+                if len(self.players) >= 3:
+                    # Full score = number of foods, placed on free cells only, up to max_foods
+                    n = min(player_score, self.max_foods - len(self.foods))
+                    foods_to_spawn = self.foods.spawn(n, self.blocked_cells())
+                else:
+                    foods_to_spawn = 0  # No food spawning with less than 3 players
+                
+                # Emit death event to the specific player
+                self.sink.emit('player_died', {
+                    'player_name': player_name
+                }, player_id)
+                
+                # Emit to all players that foods were spawned
+                if foods_to_spawn > 0:
+                    self.sink.emit('foods_spawned', {
+                        'player_name': player_name,
+                        'foods_count': foods_to_spawn,
+                        'total_foods': len(self.foods)
+                    }, self.room_id)
+        
+        if timer:
+            start = timer.lap('deaths', start)
+        
+        # Check food collision and handle snake growth
+        foods_to_remove = []
+        snake_growth = {}  # Track which snakes should grow
+        food_effects = {}  # Track power-up effects to apply
+        
+        for player_id, snake in movers:
+            if snake.alive and len(snake.body) > 0:
+                head_pos = snake.body[0]
+                snake_growth[player_id] = 0  # Track how much to grow
+                
+                # Check collision with the food on this cell (at most one)
+                food = self.foods.at(head_pos)
+                if food is not None:
+                    food_props = food.get_properties()
+                    snake.score += 1  # 1 point per food
+                    snake_growth[player_id] = food_props['growth']  # Growth amount
+                    
+                    # Apply power-up effect if any
+                    if food_props['effect']:
+                        snake.apply_power_up(food_props['effect'])
+                        food_effects[player_id] = food_props['effect']
+                    
+                    foods_to_remove.append(head_pos)
+        
+        # Remove eaten foods (heads sharing a cell share the same food)
+        for food_pos in foods_to_remove:
+            self.foods.remove(food_pos)
+        
+        # Send power-up activation notifications
+        for player_id, effect in food_effects.items():
+            player_name = self.players[player_id]['name']
+            self.sink.emit('power_up_activated', {
+                'player_name': player_name,
+                'effect': effect
+            }, self.room_id)
+        
+        if timer:
+            start = timer.lap('food', start)
+        
+        # Handle snake movement and growth
+        for player_id, snake in movers:
+            if snake.alive and len(snake.body) > 1:
+                # Handle growth based on food type
+                growth_amount = snake_growth.get(player_id, 0)
+                if growth_amount == 0:
+                    # Normal movement - remove tail
+                    snake.pop_tail()
+                else:
+                    # Growth - don't remove tail for this update, and add extra segments
+                    snake.grow(growth_amount - 1)
+        
+        if timer:
+            start = timer.lap('growth', start)
+        return start
+    
+    def update(self):
+        if not self.game_running:
+            return
+        
+        self.tick += 1
+        self.snapshot = None
+        timer = self.phase_timer
+        if timer and self.tick % timer.sample_every:
+            timer = None
+        start = time.perf_counter() if timer else None
+        
+        if self.step_quiet():
+            if timer:
+                timer.lap('move', start)
+                timer.tick_done()
+            return
+        
+        # Count down power-ups and work out how far each snake moves; a
+        # snake faster than the tick rate moves one cell per step
+        moves = {}
+        for player_id, snake in self.snakes.items():
+            if snake.alive:
+                moves[player_id] = snake.advance()
+        
+        for step in range(max(moves.values(), default=0)):
+            movers = [(player_id, snake) for player_id, snake in self.snakes.items()
+                      if moves.get(player_id, 0) > step and snake.alive]
+            start = self.step_snakes(movers, timer, start)
+        
+        # Keep at least min_foods foods on the field
+        if len(self.foods) < self.min_foods:
+            self.foods.spawn(self.min_foods - len(self.foods), self.blocked_cells())
+        
+        if timer:
+            start = timer.lap('food', start)
+        
+        # Check if game should end
+        alive_snakes = [(pid, s) for pid, s in self.snakes.items() if s.alive]
+        if len(alive_snakes) <= 1 and len(self.snakes) > 1:
+            self.game_running = False
+            
+            # Determine winner
+            if len(alive_snakes) == 1:
+                winner_id, winner_snake = alive_snakes[0]
+                self.game_winner = {
+                    'player_id': winner_id,
+                    'player_name': self.players[winner_id]['name'],
+                    'score': winner_snake.score
+                }
+                
+                # Emit winner event to the winner
+                self.sink.emit('player_won', {
+                    'player_name': self.game_winner['player_name'],
+                    'score': self.game_winner['score']
+                }, winner_id)
+            
+            # Reset flags to allow new game
+            self.game_started = False
+            self.countdown_active = False
+            
+            for recorder in self.recorders:
+                recorder.finish(self)
+        
+        if timer:
+            timer.lap('end', start)
+            timer.tick_done()
+
+class Timer:
+    """Handle of a callback scheduled on a TimerWheel"""
+    
+    def __init__(self, wheel, tick, callback, args):
+        self.wheel = wheel
+        self.tick = tick  # Wheel step at which it is due
+        self.callback = callback
+        self.args = args
+        self.level = None  # Where the wheel holds it, until it fires or is cancelled
+        self.slot = None
+    
+    def cancel(self):
+        """Drop the callback; harmless once it has run"""
+        self.wheel.cancel(self)
+    
+    def fire(self):
+        callback, args = self.callback, self.args
+        if callback is None:
+            return  # Cancelled after it fell due
+        self.callback = self.args = None
+        callback(*args)
+
+class TimerWheel:
+    """Hierarchical timing wheel for one-shot callbacks.
+    
+    Time advances in steps of resolution seconds. Level 0 has one slot per
+    step for the next SLOTS steps; each level above covers SLOTS times the
+    span of the one below, and its slots are moved down a level as time
+    reaches them. Adding and cancelling a timer cost O(1) however many are
+    pending; advancing jumps straight to the next step at which a slot comes
+    up. Timers never fire early, and late only by the step they fall in.
+    
+    Safe to use from any thread; callbacks are run by whoever calls
+    advance() and then fire() on the returned timers.
+    """
+    
+    SLOTS = 64
+    LEVELS = 4  # 64 ** 4 steps of 10 ms: about 19 days; later timers wait at the top level
+    
+    def __init__(self, resolution=TIMER_RESOLUTION, now=None):
+        self.resolution = resolution
+        self.origin = time.monotonic() if now is None else now
+        self.step = 0  # Steps since origin that have been processed
+        self.levels = [[{} for _ in range(self.SLOTS)] for _ in range(self.LEVELS)]  # Slot: Timer -> None
+        self.counts = [0] * self.LEVELS  # Timers held per level
+        self.lock = threading.Lock()
+    
+    def __len__(self):
+        return sum(self.counts)
+    
+    def add(self, deadline, callback, *args):
+        """Run callback(*args) once the monotonic deadline passes; returns a Timer"""
+        steps = (deadline - self.origin) / self.resolution
+        tick = int(steps)
+        if tick < steps:
+            tick += 1  # Round up so timers never fire early
+        with self.lock:
+            timer = Timer(self, max(tick, self.step + 1), callback, args)
+            self._place(timer)
+        return timer
+    
+    def cancel(self, timer):
+        with self.lock:
+            timer.callback = timer.args = None
+            if timer.slot is not None:
+                del timer.slot[timer]
+                self.counts[timer.level] -= 1
+                timer.slot = None
+    
+    def _place(self, timer):
+        delay = timer.tick - self.step
+        slots = self.SLOTS
+        level = 0
+        span = slots
+        while delay >= span and level < self.LEVELS - 1:
+            level += 1
+            span *= slots
+        tick = min(timer.tick, self.step + span - 1)  # Beyond the top level: wait in its last slot
+        timer.level = level
+        timer.slot = self.levels[level][(tick // (span // slots)) % slots]
+        timer.slot[timer] = None
+        self.counts[level] += 1
+    
+    def _next_event(self):
+        """First step after the current one at which a non-empty slot comes up, or None"""
+        slots = self.SLOTS
+        best = None
+        span = 1  # Steps per slot on this level
+        for level, pending in zip(self.levels, self.counts):
+            if pending:
+                base = self.step // span
+                for offset in range(1, slots + 1):
+                    if level[(base + offset) % slots]:
+                        step = (base + offset) * span
+                        if best is None or step < best:
+                            best = step
+                        break
+            span *= slots
+        return best
+    
+    def advance(self, now):
+        """Move time forward to now and return the timers that fell due, by step"""
+        target = int((now - self.origin) / self.resolution)
+        due = []
+        with self.lock:
+            slots = self.SLOTS
+            levels = self.levels
+            counts = self.counts
+            while self.step < target:
+                step = self._next_event()
+                if step is None or step > target:
+                    self.step = target
+                    break
+                self.step = step
+                
+                # Move the timers of higher levels whose slot came up down a level
+                span = slots ** (self.LEVELS - 1)
+                for level in range(self.LEVELS - 1, 0, -1):
+                    index = (step // span) % slots
+                    if step % span == 0 and levels[level][index]:
+                        cascading = levels[level][index]
+                        levels[level][index] = {}
+                        counts[level] -= len(cascading)
+                        for timer in cascading:
+                            self._place(timer)
+                    span //= slots
+                
+                expired = levels[0][step % slots]
+                if expired:
+                    levels[0][step % slots] = {}
+                    counts[0] -= len(expired)
+                    for timer in expired:
+                        timer.slot = None
+                    due.extend(expired)
+        return due
+    
+    def next_deadline(self):
+        """Monotonic time at which advance() next has something to do, or None"""
+        with self.lock:
+            step = self._next_event()
+        return None if step is None else self.origin + step * self.resolution
+
+class TickScheduler:
+    """Runs every running room at fixed tick deadlines kept in a min-heap.
+    
+    Only rooms that are running have an entry, so idle rooms cost nothing.
+    A room that falls behind runs up to max_catch_up ticks back-to-back and
+    then skips the rest instead of spiralling.
+    
+    Callbacks that need to run on the scheduler thread (countdown steps,
+    taunts, idle room sweeps, profiling windows; see call_at) wait on a
+    TimerWheel instead, so thousands of them cost no threads and no heap
+    churn. post() runs a callback on the thread as soon as possible, in
+    the order posted. While profile is set, the ticks of the rooms it covers
+    run through it.
+    """
+    
+    def __init__(self, games, interval=TICK_INTERVAL, max_catch_up=MAX_CATCH_UP_TICKS):
+        self.games = games  # room_id -> Game, looked up again at every deadline
+        self.interval = interval
+        self.max_catch_up = max_catch_up
+        self.heap = []  # (deadline, sequence, room_id, schedule_token or None for a wake-up)
+        self.sequence = count()
+        self.timers = TimerWheel()
+        self.condition = threading.Condition()
+        self.profile = None  # Active profiling.Profile, if any
+    
+    def schedule(self, game):
+        """Start ticking game one interval from now, replacing any earlier schedule"""
+        with self.condition:
+            game.schedule_token += 1
+            self._push(time.monotonic() + self.interval, game)
+            self.condition.notify()
+    
+    def wake(self, game):
+        """Have the scheduler thread look at game's mailbox as soon as possible"""
+        with self.condition:
+            if game.wake_pending:
+                return
+            game.wake_pending = True
+            heapq.heappush(self.heap, (time.monotonic(), next(self.sequence), game.room_id, None))
+            self.condition.notify()
+    
+    def post(self, callback, *args):
+        """Run callback(*args) on the scheduler thread right away, after everything posted before"""
+        with self.condition:
+            heapq.heappush(self.heap, (time.monotonic(), next(self.sequence), None, partial(callback, *args)))
+            self.condition.notify()
+    
+    def call_at(self, deadline, callback, *args):
+        """Run callback(*args) on the scheduler thread once the monotonic deadline passes.
+        
+        Returns a Timer; cancel() it when whatever it was for goes away.
+        """
+        with self.condition:
+            timer = self.timers.add(deadline, callback, *args)
+            self.condition.notify()
+        return timer
+    
+    def _push(self, deadline, game):
+        heapq.heappush(self.heap, (deadline, next(self.sequence), game.room_id, game.schedule_token))
+    
+    def next_due(self):
+        """Block until the earliest deadline passes, then pop every entry that is due.
+        
+        With thousands of rooms many deadlines pass together; taking them in
+        one go saves a lock round trip per room. Timers that fell due come
+        first, as entries without a room; then the heap entries in deadline
+        order, as if popped one by one.
+        """
+        with self.condition:
+            heap = self.heap
+            timers = self.timers
+            while True:
+                now = time.monotonic()
+                due = [(now, 0, None, timer.fire) for timer in timers.advance(now)]
+                while heap and heap[0][0] <= now:
+                    due.append(heapq.heappop(heap))
+                if due:
+                    return due
+                
+                deadline = timers.next_deadline()
+                if heap and (deadline is None or heap[0][0] < deadline):
+                    deadline = heap[0][0]
+                self.condition.wait(None if deadline is None else deadline - now)
+    
+    def run_due(self, deadline, room_id, token):
+        """Run the ticks owed by one room and queue its next deadline"""
+        if room_id is None:
+            token()  # A call_at() timer firing or a post()ed callback
+            return
+        
+        game = self.games.get(room_id)
+        if game is not None and token is None:
+            # Wake-up for posted commands; a running room drains them at its next tick
+            with self.condition:
+                game.wake_pending = False
+            if not game.game_running:
+                game.drain_mailbox()
+            return
+        
+        if game is None or game.schedule_token != token or not game.game_running:
+            return  # Room closed, restarted or finished: drop the entry
+        
+        now = time.monotonic()
+        ticks = 0
+        try:
+            while deadline <= now and ticks < self.max_catch_up and game.game_running:
+                game.record_jitter(now - deadline)
+                SCHEDULER_LAG_SECONDS.observe(now - deadline)
+                profile = self.profile
+                if profile is not None and profile.covers(room_id):
+                    profile.run_tick(game)
+                else:
+                    game.run_tick()
+                ticks += 1
+                deadline += self.interval
+                now = time.monotonic()
+        finally:
+            if deadline <= now:
+                # Still behind after catching up: skip the missed ticks
+                skipped = int((now - deadline) // self.interval) + 1
+                deadline += skipped * self.interval
+                game.tick_jitter['skipped'] += skipped
+            
+            if game.game_running:
+                with self.condition:
+                    if game.schedule_token == token:
+                        self._push(deadline, game)
+    
+    def run_forever(self):
+        while True:
+            for deadline, _, room_id, token in self.next_due():
+                try:
+                    self.run_due(deadline, room_id, token)
+                except Exception as e:
+                    SWALLOWED_EXCEPTIONS.inc('game_loop')
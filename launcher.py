@@ -1,33 +1,81 @@
 import sys
 import os
+import multiprocessing
 import webbrowser
 import threading
 import time
 import socket
 import traceback
+import ipaddress
+
+PORT = int(os.getenv('SNAKE_PORT', '5000'))
+
+# Where friends on the same network are most likely to find the host: home and
+# office LANs first; 172.16/12 is mostly container and VM bridges
+LAN_NETWORKS = [ipaddress.ip_network(network) for network in ('192.168.0.0/16', '10.0.0.0/8', '172.16.0.0/12')]
+
+def interface_addresses():
+    """IPv4 addresses of this computer's network interfaces.
+    
+    Only asks the operating system: on Linux and Windows nothing is sent
+    over the network, so this is instant on offline hosts too.
+    """
+    if sys.platform.startswith('linux'):
+        import fcntl
+        import struct
+        addresses = []
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            for index, name in socket.if_nameindex():
+                try:
+                    # SIOCGIFADDR; the address is at bytes 20-24 of the returned struct ifreq
+                    ifreq = fcntl.ioctl(s.fileno(), 0x8915, struct.pack('256s', name.encode()[:15]))
+                except OSError:
+                    continue  # No IPv4 address on this interface
+                addresses.append(socket.inet_ntoa(ifreq[20:24]))
+        return addresses
+    # Windows answers for its own host name with every interface's address
+    return [info[4][0] for info in socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET)]
 
 def get_local_ip():
     """Get the local IP address"""
     try:
-        # Connect to a remote address to get local IP
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
+        candidates = []
+        for address in interface_addresses():
+            ip = ipaddress.ip_address(address)
+            if not (ip.is_loopback or ip.is_link_local or ip.is_unspecified):
+                candidates.append(ip)
+        if not candidates:
+            raise OSError("no network interface has an address")
+        ranks = {ip: next((rank for rank, network in enumerate(LAN_NETWORKS) if ip in network), len(LAN_NETWORKS))
+                 for ip in candidates}
+        return str(min(candidates, key=ranks.get))
     except Exception as e:
         print(f"Warning: Could not detect local IP: {e}")
         return "localhost"
 
-def open_browser():
-    """Open browser after a short delay"""
-    time.sleep(3)
+def wait_for_port(port, timeout=60):
+    """Wait until something accepts connections on port; False on timeout"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+def open_browser(port):
+    """Open browser as soon as the server accepts connections"""
+    url = f'http://localhost:{port}'
+    if not wait_for_port(port):
+        print(f"Server is not answering yet; please open {url} manually")
+        return
     try:
-        webbrowser.open('http://localhost:5000')
+        webbrowser.open(url)
         print("✓ Browser opened automatically")
     except Exception as e:
         print(f"Could not open browser automatically: {e}")
-        print("Please manually open: http://localhost:5000")
+        print(f"Please manually open: {url}")
 
 def main():
     try:
@@ -44,13 +92,16 @@ def main():
         
         # Import app here to catch import errors
         try:
-            from app import app, socketio
+            from app import create_app
         except ImportError as e:
             print(f"ERROR: Could not import Flask app: {e}")
             print("Make sure all required files are present.")
             input("Press Enter to exit...")
             return
         
+        # Start the room shards and background tasks
+        app, socketio = create_app()
+        
         # Get the local IP
         local_ip = get_local_ip()
         
@@ -59,8 +110,8 @@ def main():
         if dev_mode:
             print("              (DEVELOPMENT MODE)")
         print("=" * 60)
-        print(f"Local access: http://localhost:5000")
-        print(f"Network access: http://{local_ip}:5000")
+        print(f"Local access: http://localhost:{PORT}")
+        print(f"Network access: http://{local_ip}:{PORT}")
         print("=" * 60)
         print("Share the network URL with friends to play together!")
         if dev_mode:
@@ -72,14 +123,14 @@ def main():
         
         # Start browser in a separate thread (unless in dev mode with --no-browser)
         if '--no-browser' not in sys.argv:
-            browser_thread = threading.Thread(target=open_browser)
+            browser_thread = threading.Thread(target=open_browser, args=(PORT,))
             browser_thread.daemon = True
             browser_thread.start()
         
         # Start the Flask-SocketIO server
         print("Starting server...")
         debug_mode = dev_mode and '--debug' in sys.argv
-        socketio.run(app, host='0.0.0.0', port=5000, debug=debug_mode, allow_unsafe_werkzeug=True)
+        socketio.run(app, host='0.0.0.0', port=PORT, debug=debug_mode, allow_unsafe_werkzeug=True)
         
     except KeyboardInterrupt:
         print("\nServer stopped by user. Thanks for playing!")
@@ -92,4 +143,6 @@ def main():
         print("\nServer shutdown complete.")
 
 if __name__ == '__main__':
+    # Needed by the frozen build when SNAKE_SHARDS starts worker processes
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,181 @@
+"""Process-wide metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms keep their values in plain dicts keyed by
+label values, so recording costs a dict update (plus a bisect for
+histograms) and they can stay on in production. Every module declares its
+metrics on REGISTRY at import time.
+
+Shard worker processes ship REGISTRY.snapshot() with their statistics
+reports; the front end adds those to its own values when /metrics is
+scraped (see app.py).
+"""
+import bisect
+import os
+import sys
+import threading
+
+# Histogram bucket bounds in seconds
+PHASE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001,
+                 0.0025, 0.005, 0.01, 0.025, 0.05)
+TICK_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                0.05, 0.1, 0.25)
+LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+def format_labels(names, values, extra=''):
+    pairs = ['%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+             for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+def format_value(value):
+    if isinstance(value, float) and value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+class Metric:
+    kind = 'untyped'
+    
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}  # label values -> value
+        self.lock = threading.Lock()
+        if not self.labels:
+            self.values[()] = self.zero()
+    
+    def zero(self):
+        return 0
+    
+    def copy(self, value):
+        return value
+    
+    def add(self, value, other):
+        """Combine the values of the same series from two processes"""
+        return value + other
+    
+    def snapshot(self):
+        with self.lock:
+            return {key: self.copy(value) for key, value in self.values.items()}
+    
+    def samples(self, key, value):
+        yield self.name + format_labels(self.labels, key), value
+
+class Counter(Metric):
+    kind = 'counter'
+    
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+    
+    def set(self, value, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+class Histogram(Metric):
+    """Fixed-bucket histogram; values are [per-bucket counts, sum]"""
+    kind = 'histogram'
+    
+    def __init__(self, name, help, labels=(), buckets=TICK_BUCKETS):
+        self.buckets = tuple(buckets)
+        Metric.__init__(self, name, help, labels)
+    
+    def zero(self):
+        return [[0] * (len(self.buckets) + 1), 0.0]
+    
+    def copy(self, value):
+        return [list(value[0]), value[1]]
+    
+    def add(self, value, other):
+        return [[a + b for a, b in zip(value[0], other[0])], value[1] + other[1]]
+    
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = self.zero()
+            entry[0][index] += 1
+            entry[1] += value
+    
+    def samples(self, key, value):
+        counts, total = value
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (None,), counts):
+            cumulative += bucket_count
+            le = 'le="%s"' % ('+Inf' if bound is None else repr(bound))
+            yield self.name + '_bucket' + format_labels(self.labels, key, le), cumulative
+        yield self.name + '_sum' + format_labels(self.labels, key), total
+        yield self.name + '_count' + format_labels(self.labels, key), cumulative
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+    
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+    
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+    
+    def gauge(self, name, help, labels=()):
+        return self._register(Gauge(name, help, labels))
+    
+    def histogram(self, name, help, labels=(), buckets=TICK_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+    
+    def snapshot(self):
+        """Picklable copy of every value, for reporting to another process"""
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+    
+    def render(self, snapshots=()):
+        """Prometheus text format of this process's values plus snapshots from others"""
+        lines = []
+        for metric in self.metrics:
+            values = metric.snapshot()
+            for snapshot in snapshots:
+                for key, value in snapshot.get(metric.name, {}).items():
+                    values[key] = metric.add(values[key], value) if key in values else value
+            
+            lines.append('# HELP %s %s' % (metric.name, metric.help))
+            lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+            for key in sorted(values):
+                for series, value in metric.samples(key, values[key]):
+                    lines.append('%s %s' % (series, format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+def memory_in_use():
+    """Resident memory of this process in bytes, or None where it is unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+        
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+        
+        get_current_process = ctypes.windll.kernel32.GetCurrentProcess
+        get_current_process.restype = wintypes.HANDLE
+        get_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+        get_memory_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+        
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if get_memory_info(get_current_process(), ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+    return None
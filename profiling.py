@@ -0,0 +1,205 @@
+"""On-demand profiling of the tick loop of a running server.
+
+An admin asks for a profile of one room, or of every room, for a bounded
+number of seconds (POST /admin/profile, see app.py). Each shard involved
+hands a Profile to its TickScheduler on the scheduler thread; while it is
+set, the ticks it covers run through Profile.run_tick, and when the window
+closes the dump goes back to the front end through the sink. With no
+profile set the scheduler only checks one attribute per tick.
+
+Modes:
+    phases    time per phase of Game.update plus the rest of the tick
+              (commands, serialisation, sending), in microseconds
+    sample    stacks of the covered ticks, sampled every 100 us of tick time
+    cprofile  deterministic function-level profile
+
+phases and sample produce collapsed stacks ('frame;frame;frame count' per
+line) for flamegraph.pl, speedscope and friends; cprofile produces a pstats
+dump for python -m pstats or snakeviz.
+"""
+import cProfile
+import marshal
+import os
+import pstats
+import sys
+import time
+
+from engine import Game, PhaseTimer
+
+MAX_SECONDS = 120  # Longest profiling window an admin can ask for
+SAMPLE_INTERVAL = 0.0001  # Seconds of tick time per stack sample
+RUN_TICK_CODE = Game.run_tick.__code__
+
+def frame_name(code):
+    return '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+def tick_stack(frame):
+    """Frame names from Game.run_tick down to frame, or None outside a tick"""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame.f_code))
+        if frame.f_code is RUN_TICK_CODE:
+            names.reverse()
+            return names
+        frame = frame.f_back
+    return None
+
+def format_collapsed(stacks):
+    lines = ['%s %d' % (stack, weight) for stack, weight in sorted(stacks.items()) if weight > 0]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+class Profile:
+    """One profiling window; start() and finish() run on the scheduler thread"""
+    
+    format = 'collapsed'
+    
+    def __init__(self, room_id=None):
+        self.room_id = room_id  # None: every room of the shard
+    
+    def covers(self, room_id):
+        return self.room_id is None or room_id == self.room_id
+    
+    def start(self):
+        pass
+    
+    def run_tick(self, game):
+        game.run_tick()
+    
+    def finish(self):
+        """Stop profiling and return the dump as bytes"""
+        raise NotImplementedError
+
+class PhaseProfile(Profile):
+    """Per-phase wall time of each covered room.
+    
+    Covered rooms time every tick with a timer of their own, which feeds no
+    histogram: snake_tick_phase_seconds only sees the other rooms' sampled
+    ticks until the window closes.
+    """
+    
+    def __init__(self, room_id=None):
+        Profile.__init__(self, room_id)
+        self.timers = {}  # room_id -> PhaseTimer
+        self.tick_seconds = {}  # room_id -> time in run_tick
+    
+    def run_tick(self, game):
+        room_id = game.room_id
+        timer = self.timers.get(room_id)
+        if timer is None:
+            timer = self.timers[room_id] = PhaseTimer()
+            self.tick_seconds[room_id] = 0.0
+        
+        shared_timer = game.phase_timer
+        game.phase_timer = timer
+        start = time.perf_counter()
+        try:
+            game.run_tick()
+        finally:
+            self.tick_seconds[room_id] += time.perf_counter() - start
+            game.phase_timer = shared_timer
+    
+    def finish(self):
+        stacks = {}
+        for room_id, timer in self.timers.items():
+            root = 'room %s;run_tick' % room_id
+            for phase, seconds in timer.totals.items():
+                stacks[root + ';update;' + phase] = round(seconds * 1e6)
+            other = self.tick_seconds[room_id] - sum(timer.totals.values())
+            stacks[root + ';other'] = round(max(other, 0.0) * 1e6)
+        return format_collapsed(stacks)
+
+class SampleProfile(Profile):
+    """Statistical profile of the covered ticks.
+    
+    A profile hook installed around each covered tick reads the clock on
+    every call and return and records the current stack for each interval
+    of tick time that passed. A sampler thread would rarely get the GIL in
+    the middle of a tick, which is usually shorter than the switch interval.
+    Ticks run a few times slower while sampled.
+    """
+    
+    def __init__(self, room_id=None, interval=SAMPLE_INTERVAL):
+        Profile.__init__(self, room_id)
+        self.interval = interval
+        self.stacks = {}
+        self.current_room = None
+        self.last = 0.0
+        self.pending = 0.0  # Tick time not yet charged to a sample
+    
+    def run_tick(self, game):
+        self.current_room = game.room_id
+        previous = sys.getprofile()
+        self.last = time.perf_counter()
+        sys.setprofile(self.hook)
+        try:
+            game.run_tick()
+        finally:
+            sys.setprofile(previous)
+    
+    def hook(self, frame, event, arg):
+        now = time.perf_counter()
+        self.pending += now - self.last
+        self.last = now
+        if self.pending < self.interval:
+            return
+        samples = int(self.pending // self.interval)
+        self.pending -= samples * self.interval
+        stack = tick_stack(frame)
+        if stack:
+            key = 'room %s;%s' % (self.current_room, ';'.join(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + samples
+    
+    def finish(self):
+        return format_collapsed(self.stacks)
+
+class FunctionProfile(Profile):
+    """cProfile enabled around each covered tick"""
+    
+    format = 'pstats'
+    
+    def start(self):
+        self.profiler = cProfile.Profile()
+    
+    def run_tick(self, game):
+        self.profiler.enable()
+        try:
+            game.run_tick()
+        finally:
+            self.profiler.disable()
+    
+    def finish(self):
+        self.profiler.create_stats()
+        return marshal.dumps(self.profiler.stats)
+
+PROFILES = {'phases': PhaseProfile, 'sample': SampleProfile, 'cprofile': FunctionProfile}
+
+class LoadedStats:
+    """Stand-in profiler that hands an unmarshalled stats dict to pstats.Stats"""
+    
+    def __init__(self, stats):
+        self.stats = stats
+    
+    def create_stats(self):
+        pass
+
+def merge_dumps(format, dumps):
+    """Combine the dumps of several shards into one file of the same format"""
+    if format == 'pstats':
+        merged = None
+        for dump in dumps:
+            stats = marshal.loads(dump)
+            if not stats:
+                continue
+            if merged is None:
+                merged = pstats.Stats(LoadedStats(stats))
+            else:
+                merged.add(pstats.Stats(LoadedStats(stats)))
+        return marshal.dumps(merged.stats if merged else {})
+    
+    stacks = {}
+    for dump in dumps:
+        for line in dump.decode('utf-8').splitlines():
+            stack, _, weight = line.rpartition(' ')
+            if stack:
+                stacks[stack] = stacks.get(stack, 0) + int(weight)
+    return format_collapsed(stacks)
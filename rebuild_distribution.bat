@@ -17,7 +17,7 @@ echo.
 echo Building new executable...
 pyinstaller SnakeBattleArena.spec --clean --noconfirm
 
-if not exist "dist\SnakeBattleArena.exe" (
+if not exist "dist\SnakeBattleArena\SnakeBattleArena.exe" (
     echo ERROR: Build failed!
     pause
     exit /b 1
@@ -26,7 +26,7 @@ if not exist "dist\SnakeBattleArena.exe" (
 echo.
 echo Creating distribution package...
 mkdir "SnakeBattleArena_Distribution"
-copy "dist\SnakeBattleArena.exe" "SnakeBattleArena_Distribution\"
+xcopy "dist\SnakeBattleArena" "SnakeBattleArena_Distribution\SnakeBattleArena\" /e /i /q
 
 echo.
 echo Creating START_GAME.bat...
@@ -58,7 +58,7 @@ echo echo Check the console window for your network IP address
 echo echo Share that IP with friends to play multiplayer!
 echo echo.
 echo.
-echo "SnakeBattleArena.exe"
+echo "SnakeBattleArena\SnakeBattleArena.exe"
 echo.
 echo echo.
 echo echo Game server stopped.
@@ -0,0 +1,268 @@
+"""Match replays for Snake Battle Arena.
+
+A replay holds just enough to re-run one match: a header with the match seed
+and settings, then the inputs (direction changes, players joining and
+leaving) in the order the room applied them, each tagged with the tick they
+were applied before. The engine is deterministic for a given seed and input
+sequence, so re-simulating the log reproduces every tick; the last record
+carries a digest of the final state to prove it.
+
+File layout, little-endian:
+    header  b'SNKREPL2', u64 seed, u32 length, settings as UTF-8 JSON
+    record  u32 tick, u8 kind, u16 player index, u16 length, payload
+MOVE payloads are one direction index byte, JOIN and END payloads are UTF-8
+JSON and LEAVE has none. Players are indexed in roster order, then in the
+order they joined.
+
+Record every match with SNAKE_REPLAY_DIR=replays python launcher.py, then:
+
+    python replay.py replays/ab12cd34-20261018-201500-5f3a9c0e12d4b7a1.snkr
+    python replay.py --dump-tick 120 replays/ab12cd34-*.snkr
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+
+from engine import DIRECTIONS, POWER_UP_CONFIG, SNAKE_SPEED, Food, Game
+
+MAGIC = b'SNKREPL2'
+LEGACY_TICK_RATE = 5  # Replays without a tick_rate ran at 5 FPS with durations in ticks
+HEADER = struct.Struct('<8sQI')
+RECORD = struct.Struct('<IBHH')
+
+# Record kinds
+MOVE = 1
+JOIN = 2
+LEAVE = 3
+END = 4
+
+DIRECTION_INDEX = {direction: i for i, direction in enumerate(DIRECTIONS)}
+
+def state_digest(game):
+    """CRC32 over everything that decides how a match continues"""
+    snakes = [(pid, snake.body, snake.alive, snake.score, snake.direction,
+               snake.speed_boost_time, snake.invincible_time, snake.shield_active)
+              for pid, snake in game.snakes.items()]
+    foods = sorted((food.x, food.y, food.type) for food in game.foods)
+    return zlib.crc32(repr((game.tick, snakes, foods)).encode('utf-8'))
+
+def player_entry(game, player_id):
+    player = game.players[player_id]
+    return {'id': player_id, 'name': player['name'], 'color': player['color']}
+
+class ReplayRecorder:
+    """Writes a replay file per match of one game into directory.
+    
+    The game calls start() when a match is set up, join()/leave()/move()
+    for every input and finish() when the match ends.
+    """
+    
+    def __init__(self, directory):
+        self.directory = directory
+        self.file = None
+        self.path = None
+        self.player_index = {}
+    
+    def start(self, game):
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        name = '%s-%s-%016x.snkr' % (game.room_id, time.strftime('%Y%m%d-%H%M%S'), game.seed)
+        self.path = os.path.join(self.directory, name)
+        self.file = open(self.path, 'wb')
+        
+        players = [player_entry(game, pid) for pid in game.players]
+        self.player_index = {player['id']: i for i, player in enumerate(players)}
+        settings = json.dumps({
+            'room_id': game.room_id,
+            'started_at': time.time(),
+            'board': [game.width, game.height],
+            'min_foods': game.min_foods,
+            'max_foods': game.max_foods,
+            'tick_interval': 1.0 / game.tick_rate,
+            'tick_rate': game.tick_rate,
+            'turn_queue_size': game.turn_queue_size,
+            'power_ups': POWER_UP_CONFIG,
+            'players': players
+        }).encode('utf-8')
+        self.file.write(HEADER.pack(MAGIC, game.seed, len(settings)) + settings)
+    
+    def _record(self, game, kind, player_id, payload=b''):
+        if self.file is None:
+            return
+        index = self.player_index.get(player_id, 0)
+        self.file.write(RECORD.pack(game.tick + 1, kind, index, len(payload)) + payload)
+    
+    def join(self, game, player_id):
+        self.player_index[player_id] = len(self.player_index)
+        self._record(game, JOIN, player_id, json.dumps(player_entry(game, player_id)).encode('utf-8'))
+    
+    def leave(self, game, player_id):
+        self._record(game, LEAVE, player_id)
+    
+    def move(self, game, player_id, direction):
+        self._record(game, MOVE, player_id, bytes((DIRECTION_INDEX[direction],)))
+    
+    def finish(self, game):
+        summary = {
+            'tick': game.tick,
+            'digest': state_digest(game),
+            'winner': game.game_winner,
+            'scores': {pid: snake.score for pid, snake in game.snakes.items()}
+        }
+        # END is recorded after the tick it describes, not before the next one
+        if self.file is not None:
+            payload = json.dumps(summary).encode('utf-8')
+            self.file.write(RECORD.pack(game.tick, END, 0, len(payload)) + payload)
+        self.close()
+    
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class ReplayReader:
+    """Memory-mapped view of a replay file"""
+    
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise ValueError('%s is not a replay file' % path)
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, self.seed, length = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError('%s is not a replay file' % path)
+        self.settings = json.loads(self.data[HEADER.size:HEADER.size + length].decode('utf-8'))
+        self.records_start = HEADER.size + length
+    
+    def __iter__(self):
+        """Yield (tick, kind, player_index, payload); a torn final record is dropped"""
+        data = self.data
+        offset = self.records_start
+        end = len(data)
+        while offset + RECORD.size <= end:
+            tick, kind, player, length = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            if offset + length > end:
+                return
+            yield tick, kind, player, data[offset:offset + length]
+            offset += length
+    
+    def close(self):
+        self.data.close()
+
+def legacy_power_ups(config):
+    """Power-up settings of a replay from before per-second speeds.
+    
+    Durations were in ticks and the speed boost did not change the speed.
+    """
+    config = {name: dict(props) for name, props in config.items()}
+    for props in config.values():
+        props['duration'] = props['duration'] / LEGACY_TICK_RATE
+    config['speed'].setdefault('speed', SNAKE_SPEED)
+    return config
+
+def use_power_ups(config):
+    """Switch to the power-up settings a replay was recorded with"""
+    if config != POWER_UP_CONFIG:
+        POWER_UP_CONFIG.clear()
+        POWER_UP_CONFIG.update(config)
+        Food.build_type_table()
+
+def add_player(game, player):
+    game.add_player(player['id'], player['name'])
+    game.players[player['id']]['color'] = player['color']
+    game.snakes[player['id']].color = player['color']
+
+def replay(reader, until=None):
+    """Re-simulate a recorded match, up to tick until if given.
+    
+    Returns (game, summary) where summary is the recorded END payload, or
+    None for a match that did not finish (or was stopped early).
+    """
+    settings = reader.settings
+    tick_rate = settings.get('tick_rate')
+    if tick_rate is None:
+        tick_rate = LEGACY_TICK_RATE
+        use_power_ups(legacy_power_ups(settings['power_ups']))
+    else:
+        use_power_ups(settings['power_ups'])
+    
+    width, height = settings['board']
+    # Replays from before the food cap have no max_foods: no cap
+    game = Game(settings['room_id'], width=width, height=height, min_foods=settings.get('min_foods', 1),
+                max_foods=settings.get('max_foods', sys.maxsize), tick_rate=tick_rate)
+    # Replays from before the turn queue turned snakes right away
+    game.turn_queue_size = settings.get('turn_queue_size', 0)
+    players = list(settings['players'])
+    for player in players:
+        add_player(game, player)
+    game.reset_match(reader.seed)
+    game.game_running = True
+    
+    def run_until(tick):
+        while game.game_running and game.tick < tick:
+            game.update()
+    
+    summary = None
+    for tick, kind, index, payload in reader:
+        if until is not None and tick > until:
+            break
+        if kind == END:
+            run_until(tick)
+            summary = json.loads(payload.decode('utf-8'))
+            break
+        
+        # Inputs tagged with tick t were applied just before update t
+        run_until(tick - 1)
+        if kind == MOVE:
+            game.set_direction(players[index]['id'], DIRECTIONS[payload[0]])
+        elif kind == JOIN:
+            player = json.loads(payload.decode('utf-8'))
+            players.append(player)
+            add_player(game, player)
+        elif kind == LEAVE:
+            game.remove_player(players[index]['id'])
+    
+    if until is not None:
+        run_until(until)
+    return game, summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-simulate recorded Snake Battle Arena matches')
+    parser.add_argument('paths', nargs='+', help='replay files')
+    parser.add_argument('--dump-tick', type=int, help='print the game state at this tick as JSON')
+    args = parser.parse_args()
+    
+    mismatches = 0
+    for path in args.paths:
+        reader = ReplayReader(path)
+        start = time.perf_counter()
+        game, summary = replay(reader, args.dump_tick)
+        elapsed = time.perf_counter() - start
+        
+        speed = game.tick / game.tick_rate / elapsed if elapsed > 0 else float('inf')
+        print('%s: %d ticks in %.3f s (%.0fx real time)' % (path, game.tick, elapsed, speed))
+        if args.dump_tick is not None:
+            print(json.dumps(game.get_state()))
+        elif summary is None:
+            print('  match did not finish; state digest %08x' % state_digest(game))
+        elif summary['digest'] == state_digest(game) and summary['tick'] == game.tick:
+            winner = summary['winner']['player_name'] if summary['winner'] else 'nobody'
+            print('  OK: winner %s, scores %s' % (winner, summary['scores']))
+        else:
+            mismatches += 1
+            print('  MISMATCH: recorded tick %d digest %08x, replayed tick %d digest %08x' % (
+                summary['tick'], summary['digest'], game.tick, state_digest(game)))
+        reader.close()
+    
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,533 @@
+"""Room and player bookkeeping behind the Socket.IO events.
+
+A RoomService owns a set of games and applies the commands the front end
+forwards to it (create_room, join_room, start_game, ...). Everything it says
+to clients goes through its sink, so one service can run inside the web
+server process or inside a shard worker (see shards.py).
+
+handle() runs every command on the tick scheduler thread (see
+TickScheduler.post), where the games tick and the timers and the idle room
+sweep run too; commands that touch an existing game go on through that
+game's mailbox (see Game.post). So the service's maps and every game have a
+single writer and no locks are needed; stats() only reads them, from the
+shard thread.
+"""
+import os
+import random
+import threading
+import time
+
+from engine import (CANVAS_HEIGHT, CANVAS_WIDTH, GRID_SIZE, MAX_FOODS, SPECTATOR_INTERVAL, SWALLOWED_EXCEPTIONS,
+                    TICK_PHASE_SECONDS, TICK_RATE, Game, PhaseTimer, TickScheduler, seconds_to_ticks,
+                    spawn_point)
+from metrics import REGISTRY, memory_in_use
+from profiling import PROFILES
+from replay import ReplayRecorder
+
+# Funny mean comments for dead players
+MEAN_COMMENTS = [
+    "You suck! 😂",
+    "Haha you died! 💀",
+    "Better luck next time, loser! 🐍",
+    "That was embarrassing! 😆",
+    "You call that snake skills? 🙄",
+    "Even a turtle could play better! 🐢",
+    "Your snake died of shame! 😂",
+    "Did you forget how to use arrow keys? ⌨️",
+    "That was painful to watch! 😬",
+    "Maybe try checkers instead? 🔴",
+    "RIP your dignity! ⚰️",
+    "Your snake had commitment issues! 💔",
+    "I've seen rocks move faster! 🪨",
+    "That crash was epic! 💥",
+    "Snake.exe has stopped working! 🖥️",
+    "You got outplayed by a wall! 🧱",
+    "Press F to pay respects... to your skills! F",
+    "Your snake just rage quit! 😤",
+    "That's what we call a 'tactical disaster'! 🎯",
+    "Next time, try not dying! 💡",
+    "Skill issue detected! 🚨",
+    "Your snake went to the graveyard! 🪦",
+    "That was a masterclass in how NOT to play! 📚",
+    "Game over, man! Game over! 🎮",
+    "You made that look so easy... to lose! 🤣"
+]
+
+MAX_PLAYERS = 4
+
+# Arena presets a room can be created with: board width and height in cells,
+# player cap and the number of foods kept on the board
+ARENAS = {
+    'classic': {'width': CANVAS_WIDTH // GRID_SIZE, 'height': CANVAS_HEIGHT // GRID_SIZE,
+                'max_players': MAX_PLAYERS, 'min_foods': 1},
+    'large': {'width': 120, 'height': 90, 'max_players': 16, 'min_foods': 12},
+    'huge': {'width': 300, 'height': 300, 'max_players': 32, 'min_foods': 60}
+}
+ARENA_SIZE_RANGE = (20, 500)  # Smallest and largest board side for custom arenas
+ARENA_MAX_PLAYERS = 64
+
+def arena_settings(arena):
+    """Resolve the 'arena' of a create_room request: a preset name or a dict.
+    
+    A dict may set width, height, max_players and min_foods; anything left
+    out comes from the classic arena. Raises ValueError for bad values.
+    """
+    if arena is None:
+        arena = 'classic'
+    if isinstance(arena, str):
+        if arena not in ARENAS:
+            raise ValueError('Unknown arena')
+        return dict(ARENAS[arena])
+    if not isinstance(arena, dict):
+        raise ValueError('Invalid arena')
+    
+    settings = dict(ARENAS['classic'])
+    for key in settings:
+        if key in arena:
+            try:
+                settings[key] = int(arena[key])
+            except (TypeError, ValueError):
+                raise ValueError('Invalid arena %s' % key)
+    low, high = ARENA_SIZE_RANGE
+    if not (low <= settings['width'] <= high and low <= settings['height'] <= high):
+        raise ValueError('Arena sides must be %d to %d cells' % (low, high))
+    if not 2 <= settings['max_players'] <= ARENA_MAX_PLAYERS:
+        raise ValueError('Arenas hold 2 to %d players' % ARENA_MAX_PLAYERS)
+    # Every player needs a start cell of their own; on a small board the
+    # spawn sequence comes back to cells it already gave out
+    cells = set()
+    for index in range(settings['max_players']):
+        cell = spawn_point(index, settings['width'], settings['height'])
+        if cell in cells:
+            raise ValueError('This arena fits at most %d players' % index)
+        cells.add(cell)
+    if not 1 <= settings['min_foods'] <= settings['width'] * settings['height'] // 10:
+        raise ValueError('Too many foods for this arena')
+    return settings
+
+# Directory to record a replay of every match into (unset: no recording)
+REPLAY_DIR = os.getenv('SNAKE_REPLAY_DIR')
+
+# Ticks between the game_state frames sent to spectators (default: about a second)
+SPECTATOR_TICKS = max(1, int(os.getenv('SNAKE_SPECTATOR_TICKS', seconds_to_ticks(SPECTATOR_INTERVAL, TICK_RATE))))
+
+# Rooms nobody has sent a command to for this many seconds are closed, by
+# state. Running rooms count player input only; the others also their last
+# tick. Countdowns are short and never closed.
+ROOM_TTLS = {
+    'lobby': float(os.getenv('SNAKE_LOBBY_TTL', 1800)),
+    'running': float(os.getenv('SNAKE_RUNNING_TTL', 600)),
+    'finished': float(os.getenv('SNAKE_FINISHED_TTL', 600))
+}
+ROOM_GC_INTERVAL = 15.0  # Seconds between idle room sweeps
+TAUNT_DELAY = (3.0, 8.0)  # Seconds between mean comments in a room, drawn uniformly
+
+# Foods a room holds at most
+ROOM_MAX_FOODS = int(os.getenv('SNAKE_MAX_FOODS', MAX_FOODS))
+
+# Time the phases of every Nth tick of each room for snake_tick_phase_seconds
+PHASE_SAMPLE_TICKS = max(1, int(os.getenv('SNAKE_PHASE_SAMPLE_TICKS', 10)))
+
+# Resident memory (MiB) past which this process refuses new rooms; 0: no limit
+MEMORY_BUDGET_MB = float(os.getenv('SNAKE_MEMORY_BUDGET_MB', 0))
+
+ROOMS = REGISTRY.gauge('snake_rooms', 'Rooms by state, as of the last stats report', ('state',))
+MEAN_COMMENTS_SENT = REGISTRY.counter('snake_mean_comments_total', 'Mean comments sent to dead players')
+ROOM_EVICTIONS = REGISTRY.counter('snake_room_evictions_total', 'Idle rooms closed, by state', ('state',))
+ROOMS_REFUSED = REGISTRY.counter('snake_rooms_refused_total', 'Rooms refused for lack of memory')
+
+class RoomService:
+    # Commands the front end may forward, see handle()
+    COMMANDS = ('create_room', 'join_room', 'spectate', 'leave', 'start_game', 'player_move', 'request_keyframe',
+                'profile')
+    
+    def __init__(self, sink, shard_id=0):
+        self.sink = sink
+        self.shard_id = shard_id
+        self.games = {}
+        self.players = {}
+        self.spectators = {}  # sid -> room_id
+        self.joining = {}  # sid -> Game a join_room was posted to that has not run yet
+        self.scheduler = TickScheduler(self.games)
+        self.evictions = dict.fromkeys(Game.STATUSES, 0)
+        self.rooms_refused = 0
+        # Shared by all games: they all tick on the scheduler thread
+        self.phase_timer = PhaseTimer(TICK_PHASE_SECONDS, PHASE_SAMPLE_TICKS)
+    
+    def start(self):
+        """Start the tick scheduler thread; timers such as the idle room sweep run on it"""
+        game_thread = threading.Thread(target=self.scheduler.run_forever, daemon=True)
+        game_thread.start()
+        self.scheduler.call_at(time.monotonic() + ROOM_GC_INTERVAL, self.collect_idle_rooms)
+    
+    def handle(self, command, sid, data):
+        """Apply one forwarded command, on the scheduler thread"""
+        if command in self.COMMANDS:
+            self.scheduler.post(self._apply, command, sid, data)
+    
+    def _apply(self, command, sid, data):
+        try:
+            getattr(self, command)(sid, data)
+        except Exception as e:
+            SWALLOWED_EXCEPTIONS.inc('shard_command')
+    
+    def stats(self):
+        """Summary reported to the front end for /health"""
+        games = list(self.games.values())
+        running = [game for game in games if game.game_running]
+        states = dict.fromkeys(Game.STATUSES, 0)
+        for game in games:
+            states[game.status()] += 1
+        for state, rooms in states.items():
+            ROOMS.set(rooms, state)
+        return {
+            'games': len(self.games),
+            'players': len(self.players),
+            'spectators': len(self.spectators),
+            'running_games': len(running),
+            'max_tick_jitter': max((game.tick_jitter['max'] for game in running), default=0.0),
+            'evictions': dict(self.evictions),
+            'rooms_refused': self.rooms_refused
+        }
+    
+    def _player_list(self, game):
+        return [{'id': pid, 'name': pdata['name'], 'color': pdata['color']}
+                for pid, pdata in game.players.items()]
+    
+    def _room_of(self, sid):
+        """Game the player sid is seated in, or None"""
+        if sid not in self.players:
+            return None
+        return self.games.get(self.players[sid]['room'])
+    
+    def _is_open(self, game):
+        """False once game's room has been closed (its last player left)"""
+        return self.games.get(game.room_id) is game
+    
+    def leave(self, sid, data=None):
+        """Drop a disconnected player or spectator from their room"""
+        self._give_up_seat(sid)
+        # A join still waiting in a room's mailbox runs before this, so the seat it gives goes too
+        game = self.joining.pop(sid, None)
+        if game:
+            game.post(self._leave, game, sid)
+    
+    def _give_up_seat(self, sid):
+        """Take sid out of the room it plays or watches in"""
+        if sid in self.spectators:
+            game = self.games.get(self.spectators.pop(sid))
+            if game:
+                game.post(game.spectators.discard, sid)
+            return
+        
+        game = self._room_of(sid)
+        self.players.pop(sid, None)
+        if game:
+            game.post(self._leave, game, sid)
+    
+    def _leave(self, game, sid):
+        if sid not in game.players:
+            return  # Its join was turned down, or it left already
+        game.remove_player(sid)
+        if not game.players:
+            game.cancel_timers()
+            for recorder in game.recorders:
+                recorder.close()
+            if self._is_open(game):
+                del self.games[game.room_id]
+            for spectator in game.spectators:
+                self.spectators.pop(spectator, None)
+                self.sink.emit('room_closed', {'roomId': game.room_id}, spectator)
+            game.spectators.clear()
+            self.sink.close_room(game.room_id)
+        else:
+            # Send updated player list to remaining players
+            self.sink.emit('player_left', {
+                'player_id': sid,
+                'players': self._player_list(game)
+            }, game.room_id)
+    
+    def collect_idle_rooms(self):
+        """Close rooms idle for longer than their state's TTL (runs on the scheduler thread)"""
+        now = time.monotonic()
+        try:
+            for game in list(self.games.values()):
+                state = game.status()
+                if state not in ROOM_TTLS:
+                    continue
+                last_seen = game.last_activity
+                if state != 'running':
+                    last_seen = max(last_seen, game.last_update)
+                if now - last_seen > ROOM_TTLS[state]:
+                    self._evict(game, state)
+        finally:
+            self.scheduler.call_at(now + ROOM_GC_INTERVAL, self.collect_idle_rooms)
+    
+    def _evict(self, game, state):
+        room_id = game.room_id
+        game.game_running = False
+        game.countdown_active = False
+        game.cancel_timers()
+        for recorder in game.recorders:
+            recorder.close()
+        if self._is_open(game):
+            del self.games[room_id]
+        
+        for sid in game.players:
+            if self.players.get(sid, {}).get('room') == room_id:
+                del self.players[sid]
+        for sid in game.spectators:
+            self.spectators.pop(sid, None)
+            self.sink.emit('room_closed', {'roomId': room_id, 'reason': 'idle'}, sid)
+        game.spectators.clear()
+        self.sink.emit('room_closed', {'roomId': room_id, 'reason': 'idle'}, room_id)
+        self.sink.close_room(room_id)
+        
+        self.evictions[state] += 1
+        ROOM_EVICTIONS.inc(state)
+    
+    def _over_memory_budget(self):
+        if not MEMORY_BUDGET_MB:
+            return False
+        in_use = memory_in_use()
+        return in_use is not None and in_use > MEMORY_BUDGET_MB * 2 ** 20
+    
+    def create_room(self, sid, data):
+        """Create the room data['roomId'] (picked by the front end) and seat its creator"""
+        try:
+            player_name = data.get('playerName', 'Anonymous')
+            if not player_name or not player_name.strip():
+                self.sink.emit('error', {'message': 'Player name is required'}, sid)
+                return
+            
+            if self._over_memory_budget():
+                self.rooms_refused += 1
+                ROOMS_REFUSED.inc()
+                self.sink.emit('error', {'message': 'The server is full, please try again later'}, sid)
+                return
+            
+            room_id = data['roomId']
+            player_name = player_name.strip()
+            
+            # Nobody else can see the game yet, so it is set up right here
+            netcode = data.get('netcode', 'state')
+            if netcode not in Game.NETCODES:
+                self.sink.emit('error', {'message': 'Unknown netcode mode'}, sid)
+                return
+            
+            try:
+                arena = arena_settings(data.get('arena'))
+            except ValueError as e:
+                self.sink.emit('error', {'message': str(e)}, sid)
+                return
+            
+            # A player creating another room gives up their seat in the old one
+            self._give_up_seat(sid)
+            
+            game = Game(room_id, self.sink, self.scheduler, netcode=netcode, width=arena['width'],
+                        height=arena['height'], min_foods=arena['min_foods'], max_foods=ROOM_MAX_FOODS)
+            game.max_players = arena['max_players']
+            game.phase_timer = self.phase_timer
+            game.spectator_interval = SPECTATOR_TICKS
+            if REPLAY_DIR:
+                game.recorders.append(ReplayRecorder(REPLAY_DIR))
+            game.add_player(sid, player_name)
+            self.games[room_id] = game
+            
+            self.players[sid] = {
+                'name': player_name,
+                'room': room_id
+            }
+            
+            self.sink.enter_room(sid, room_id, player_name)
+            self.sink.emit('room_created', {
+                'roomId': room_id,
+                'netcode': netcode,
+                'arena': arena,
+                'playerName': player_name,
+                'players': [{'id': sid, 'name': player_name, 'color': game.players[sid]['color']}]
+            }, sid)
+        
+        except Exception as e:
+            self.sink.emit('error', {'message': 'Failed to create room'}, sid)
+    
+    def join_room(self, sid, data):
+        try:
+            room_id = data.get('roomId', '').strip()
+            player_name = data.get('playerName', 'Anonymous').strip()
+            
+            if not room_id:
+                self.sink.emit('error', {'message': 'Room ID is required'}, sid)
+                return
+            
+            if not player_name:
+                self.sink.emit('error', {'message': 'Player name is required'}, sid)
+                return
+            
+            if room_id not in self.games:
+                self.sink.emit('error', {'message': 'Room not found'}, sid)
+                return
+            
+            game = self.games[room_id]
+            self.joining[sid] = game
+            game.post(self._join, game, sid, player_name)
+        
+        except Exception as e:
+            self.sink.emit('error', {'message': 'Failed to join room'}, sid)
+    
+    def _join(self, game, sid, player_name):
+        room_id = game.room_id
+        if self.joining.get(sid) is game:
+            del self.joining[sid]
+        if not self._is_open(game):
+            self.sink.emit('error', {'message': 'Room not found'}, sid)
+            return
+        
+        if sid in game.players:
+            self.sink.emit('error', {'message': 'Already in this room'}, sid)
+            return
+        
+        if len(game.players) >= game.max_players:
+            self.sink.emit('error', {'message': 'Room is full (max %d players)' % game.max_players}, sid)
+            return
+        
+        # Joining another room gives up the seat in the old one
+        self._give_up_seat(sid)
+        game.add_player(sid, player_name)
+        self.players[sid] = {
+            'name': player_name,
+            'room': room_id
+        }
+        
+        self.sink.enter_room(sid, room_id, player_name)
+        
+        # Send room info to joining player
+        room_info = {
+            'roomId': room_id,
+            'players': self._player_list(game),
+            'netcode': game.netcode,
+            'isRoomCreator': False
+        }
+        self.sink.emit('room_joined', room_info, sid)
+        
+        # Late joiners get a full state so they can apply the following deltas
+        if game.game_started:
+            self.sink.send_state(sid, *game.get_full_state())
+        
+        # Notify other players and send updated player list
+        self.sink.emit('player_joined', {
+            'player_id': sid,
+            'player_name': player_name,
+            'players': self._player_list(game)
+        }, room_id, skip_sid=sid)
+    
+    def spectate(self, sid, data):
+        """Watch a room without taking a seat; spectators don't count toward MAX_PLAYERS"""
+        room_id = data.get('roomId', '').strip()
+        if room_id not in self.games:
+            self.sink.emit('error', {'message': 'Room not found'}, sid)
+            return
+        
+        game = self.games[room_id]
+        game.post(self._spectate, game, sid)
+    
+    def _spectate(self, game, sid):
+        if not self._is_open(game):
+            self.sink.emit('error', {'message': 'Room not found'}, sid)
+            return
+        
+        game.spectators.add(sid)
+        self.spectators[sid] = game.room_id
+        self.sink.watch_room(sid, game.room_id)
+        self.sink.emit('spectating', {
+            'roomId': game.room_id,
+            'players': self._player_list(game)
+        }, sid)
+        # Snapshot right away; the regular spectator frames follow
+        self.sink.send_state(sid, 'game_state', game.get_state())
+    
+    def start_game(self, sid, data=None):
+        if sid not in self.players:
+            self.sink.emit('error', {'message': 'Player not found'}, sid)
+            return
+        
+        game = self._room_of(sid)
+        if game is None:
+            self.sink.emit('error', {'message': 'Room not found'}, sid)
+            return
+        
+        game.post(self._start_game, game, sid)
+    
+    def _start_game(self, game, sid):
+        # Try to start the game (will fail if already started)
+        if game.start_game():
+            game.set_timer('taunt', random.uniform(*TAUNT_DELAY), self._taunt, game)
+            self.sink.emit('game_started', None, game.room_id)
+            # Send initial game state immediately
+            event, game_state = game.get_broadcast(keyframe=True)
+            self.sink.broadcast_state(game.room_id, event, game_state)
+            game.broadcast_spectators()
+        else:
+            self.sink.emit('error', {'message': 'Game already in progress'}, sid)
+    
+    def request_keyframe(self, sid, data=None):
+        """Resend the full game state to a client whose deltas went out of sync"""
+        game = self._room_of(sid)
+        if game:
+            game.post(self._send_keyframe, game, sid)
+    
+    def _send_keyframe(self, game, sid):
+        self.sink.send_state(sid, *game.get_full_state())
+    
+    def player_move(self, sid, data):
+        game = self._room_of(sid)
+        if game:
+            # Clients that number their moves get each one acknowledged
+            seq = data.get('seq')
+            game.post(game.set_direction, sid, data['direction'], seq if isinstance(seq, int) else None)
+    
+    def profile(self, sid, data):
+        """Profile data['roomId'] (None: every room here) for data['seconds'], see profiling.py"""
+        profile_id = data['id']
+        room_id = data.get('roomId')
+        if room_id is not None and room_id not in self.games:
+            self.sink.profile_result(profile_id, self.shard_id, {'error': 'Room not found'})
+            return
+        
+        profile = PROFILES[data['mode']](room_id)
+        scheduler = self.scheduler
+        
+        def start():
+            if scheduler.profile is not None:
+                self.sink.profile_result(profile_id, self.shard_id, {'error': 'Another profile is running'})
+                return
+            profile.start()
+            scheduler.profile = profile
+            scheduler.call_at(time.monotonic() + data['seconds'], finish)
+        
+        def finish():
+            scheduler.profile = None
+            try:
+                result = {'format': profile.format, 'data': profile.finish()}
+            except Exception as e:
+                result = {'error': 'Profiling failed: %s' % e}
+            self.sink.profile_result(profile_id, self.shard_id, result)
+        
+        scheduler.call_at(time.monotonic(), start)
+    
+    def _taunt(self, game):
+        """Send a mean comment to a dead player of game, then again every few seconds until the match ends"""
+        if not (game.game_running or game.countdown_active):
+            return
+        try:
+            # Players who left the room are spared
+            dead_players = [player_id for player_id in game.dead_players if player_id in game.players]
+            if game.game_running and dead_players:
+                comment = random.choice(MEAN_COMMENTS)
+                self.sink.emit('mean_comment', {
+                    'comment': comment
+                }, random.choice(dead_players))
+                MEAN_COMMENTS_SENT.inc()
+        except Exception as e:
+            SWALLOWED_EXCEPTIONS.inc('mean_comments')
+        game.set_timer('taunt', random.uniform(*TAUNT_DELAY), self._taunt, game)
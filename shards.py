@@ -0,0 +1,209 @@
+"""Room sharding for Snake Battle Arena.
+
+Rooms are spread over shards by room_id. Each shard runs a RoomService with
+its own tick scheduler; the Socket.IO front end forwards client commands to
+the owning shard and relays whatever the shard wants to send back.
+
+Shards talk to the front end through a MessageBus. LocalBus keeps a single
+shard in the web server process (the default, and what the PyInstaller build
+uses). MultiprocessingBus runs one worker process per shard so rooms use all
+cores of the host. A networked bus spanning several nodes only has to
+provide the same publish/receive pair.
+"""
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+
+from engine import SWALLOWED_EXCEPTIONS
+from metrics import REGISTRY, memory_in_use
+from rooms import RoomService
+
+FRONTEND_TOPIC = 'frontend'
+STATS_INTERVAL = 1.0  # Seconds between shard statistics reports
+
+def shard_topic(shard_id):
+    return 'shard.%d' % shard_id
+
+def shard_for(room_id, shard_count):
+    """Stable room_id -> shard mapping shared by every front end"""
+    return zlib.crc32(room_id.encode('utf-8')) % shard_count
+
+class MessageBus:
+    """Topic-addressed, ordered message passing between front end and shards"""
+    
+    def publish(self, topic, message):
+        raise NotImplementedError
+    
+    def receive(self, topic, timeout=None):
+        """Return the next message on topic, or None after timeout seconds"""
+        raise NotImplementedError
+
+class LocalBus(MessageBus):
+    """In-process bus backed by one queue per topic"""
+    
+    def __init__(self):
+        self.queues = {}
+        self.lock = threading.Lock()
+    
+    def _queue(self, topic):
+        with self.lock:
+            if topic not in self.queues:
+                self.queues[topic] = queue.Queue()
+            return self.queues[topic]
+    
+    def publish(self, topic, message):
+        self._queue(topic).put(message)
+    
+    def receive(self, topic, timeout=None):
+        try:
+            return self._queue(topic).get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class MultiprocessingBus(MessageBus):
+    """Single-host bus between processes; all topics are created up front"""
+    
+    def __init__(self, topics):
+        self.queues = {topic: multiprocessing.Queue() for topic in topics}
+    
+    def publish(self, topic, message):
+        self.queues[topic].put(message)
+    
+    def receive(self, topic, timeout=None):
+        try:
+            return self.queues[topic].get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+def detach_bodies(game_state):
+    """Copy of a state frame whose snake bodies are not the games' live lists.
+    
+    A bus may serialize a message after publish() returns (multiprocessing
+    queues pickle on a feeder thread), by which time the next tick can have
+    moved the snakes. Keyframes (snakes) and lockstep syncs (players) hold
+    live bodies; deltas only carry copies and are passed through.
+    """
+    if game_state.get('keyframe'):
+        game_state = dict(game_state, snakes={pid: dict(snake, body=list(snake['body']))
+                                              for pid, snake in game_state['snakes'].items()})
+    if 'players' in game_state:
+        game_state = dict(game_state, players=[dict(player, body=list(player['body']))
+                                               for player in game_state['players']])
+    return game_state
+
+class BusSink:
+    """Sink that ships every call back to the front end over the bus"""
+    
+    def __init__(self, bus, topic=FRONTEND_TOPIC):
+        self.bus = bus
+        self.topic = topic
+    
+    def emit(self, event, data, room, skip_sid=None):
+        self.bus.publish(self.topic, ('emit', (event, data, room, skip_sid)))
+    
+    def broadcast_state(self, room_id, event, game_state):
+        self.bus.publish(self.topic, ('broadcast_state', (room_id, event, detach_bodies(game_state))))
+    
+    def send_state(self, sid, event, game_state):
+        self.bus.publish(self.topic, ('send_state', (sid, event, detach_bodies(game_state))))
+    
+    def enter_room(self, sid, room_id, player_name):
+        self.bus.publish(self.topic, ('enter_room', (sid, room_id, player_name)))
+    
+    def watch_room(self, sid, room_id):
+        self.bus.publish(self.topic, ('watch_room', (sid, room_id)))
+    
+    def broadcast_spectators(self, room_id, game_state):
+        self.bus.publish(self.topic, ('broadcast_spectators', (room_id, detach_bodies(game_state))))
+    
+    def close_room(self, room_id):
+        self.bus.publish(self.topic, ('close_room', (room_id,)))
+    
+    def shard_stats(self, shard_id, stats):
+        self.bus.publish(self.topic, ('shard_stats', (shard_id, stats)))
+    
+    def profile_result(self, profile_id, shard_id, result):
+        self.bus.publish(self.topic, ('profile_result', (profile_id, shard_id, result)))
+
+def run_shard(bus, shard_id, sink=None):
+    """Shard main loop: apply forwarded commands until a 'stop' message arrives"""
+    service = RoomService(sink or BusSink(bus), shard_id)
+    service.start()
+    topic = shard_topic(shard_id)
+    next_stats = 0.0
+    
+    while True:
+        now = time.monotonic()
+        if now >= next_stats:
+            stats = service.stats()
+            if sink is None:
+                # Worker process: report its CPU time, memory and metrics, the front end only sees its own
+                stats['cpu_seconds'] = time.process_time()
+                stats['memory_bytes'] = memory_in_use() or 0
+                stats['metrics'] = REGISTRY.snapshot()
+            service.sink.shard_stats(shard_id, stats)
+            next_stats = now + STATS_INTERVAL
+        
+        message = bus.receive(topic, timeout=STATS_INTERVAL)
+        if message is None:
+            continue
+        if message == 'stop':
+            return
+        
+        command, sid, data = message
+        try:
+            service.handle(command, sid, data)
+        except Exception as e:
+            SWALLOWED_EXCEPTIONS.inc('shard_command')
+
+class ShardRouter:
+    """Front-end side: forwards commands to shards and relays their output to sink"""
+    
+    def __init__(self, shard_count, sink, processes=False):
+        self.shard_count = shard_count
+        self.sink = sink
+        self.processes = processes
+        self.workers = []
+        
+        if processes:
+            topics = [shard_topic(i) for i in range(shard_count)] + [FRONTEND_TOPIC]
+            self.bus = MultiprocessingBus(topics)
+        else:
+            self.bus = LocalBus()
+    
+    def start(self):
+        for shard_id in range(self.shard_count):
+            if self.processes:
+                worker = multiprocessing.Process(target=run_shard, args=(self.bus, shard_id), daemon=True)
+            else:
+                # Same process: the shard can call the front-end sink directly
+                worker = threading.Thread(target=run_shard, args=(self.bus, shard_id, self.sink), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        
+        if self.processes:
+            relay_thread = threading.Thread(target=self.relay, daemon=True)
+            relay_thread.start()
+    
+    def send(self, room_id, command, sid, data=None):
+        """Forward a command to the shard that owns room_id"""
+        self.send_shard(shard_for(room_id, self.shard_count), command, sid, data)
+    
+    def send_shard(self, shard_id, command, sid, data=None):
+        self.bus.publish(shard_topic(shard_id), (command, sid, data))
+    
+    def relay(self):
+        """Replay shard output on the front-end sink"""
+        while True:
+            message = self.bus.receive(FRONTEND_TOPIC)
+            try:
+                method, args = message
+                getattr(self.sink, method)(*args)
+            except Exception as e:
+                SWALLOWED_EXCEPTIONS.inc('relay')
+    
+    def stop(self):
+        for shard_id in range(self.shard_count):
+            self.bus.publish(shard_topic(shard_id), 'stop')
@@ -0,0 +1,665 @@
+// Client-side copy of the simulation in engine.py, used by lockstep rooms.
+//
+// Every step mirrors the Python code (same phase order, same random draws) so
+// a client that applies the inputs broadcast with each lockstep_tick reaches
+// exactly the server's state; Game.stateHash() lets it check that. Change both
+// files together.
+const SnakeEngine = (() => {
+    const DIRECTIONS = ['UP', 'DOWN', 'LEFT', 'RIGHT'];
+    const OPPOSITE_DIRECTIONS = { UP: 'DOWN', DOWN: 'UP', LEFT: 'RIGHT', RIGHT: 'LEFT' };
+    const SPAWN_MARGIN = 5;
+    const SPAWN_ATTEMPTS = 8;
+
+    const cellKey = (cell) => cell[0] + ',' + cell[1];
+
+    // As engine.seconds_to_ticks
+    const secondsToTicks = (seconds, tickRate) => Math.floor(seconds * tickRate + 0.5);
+
+    function radicalInverse(index, base) {
+        let result = 0.0;
+        let fraction = 1.0;
+        while (index > 0) {
+            fraction /= base;
+            result += fraction * (index % base);
+            index = Math.floor(index / base);
+        }
+        return result;
+    }
+
+    // Start cell of the index-th snake, as engine.spawn_point
+    function spawnPoint(index, width, height) {
+        const left = SPAWN_MARGIN;
+        const top = SPAWN_MARGIN;
+        const right = width - SPAWN_MARGIN;
+        const bottom = height - SPAWN_MARGIN;
+        if (index < 4) {
+            return [[left, top], [right, top], [left, bottom], [right, bottom]][index];
+        }
+        return [left + Math.floor(radicalInverse(index - 3, 2) * (right - left)),
+                top + Math.floor(radicalInverse(index - 3, 3) * (bottom - top))];
+    }
+
+    // mulberry32, as engine.PortableRandom
+    class PortableRandom {
+        constructor(seed) {
+            this.state = seed >>> 0;
+        }
+
+        nextUint32() {
+            const state = this.state = (this.state + 0x6D2B79F5) >>> 0;
+            let t = Math.imul(state ^ (state >>> 15), state | 1) >>> 0;
+            t = ((t + (Math.imul(t ^ (t >>> 7), t | 61) >>> 0)) >>> 0) ^ t;
+            return (t ^ (t >>> 14)) >>> 0;
+        }
+
+        random() {
+            return this.nextUint32() / 4294967296;
+        }
+
+        randrange(n) {
+            return Math.floor(this.random() * n);
+        }
+
+        randint(a, b) {
+            return a + this.randrange(b - a + 1);
+        }
+
+        sample(population, k) {
+            const pool = population.slice();
+            for (let i = 0; i < k; i++) {
+                const j = i + this.randrange(pool.length - i);
+                const swap = pool[i];
+                pool[i] = pool[j];
+                pool[j] = swap;
+            }
+            return pool.slice(0, k);
+        }
+    }
+
+    // Vose alias table, as engine.build_alias_table
+    function buildAliasTable(weights) {
+        const n = weights.length;
+        const total = weights.reduce((sum, weight) => sum + weight, 0);
+        const prob = weights.map((weight) => weight * n / total);
+        const alias = new Array(n).fill(0);
+
+        const small = [];
+        const large = [];
+        prob.forEach((p, i) => (p < 1.0 ? small : large).push(i));
+        while (small.length && large.length) {
+            const less = small.pop();
+            const more = large.pop();
+            alias[less] = more;
+            prob[more] -= 1.0 - prob[less];
+            if (prob[more] < 1.0) {
+                small.push(more);
+            } else {
+                large.push(more);
+            }
+        }
+        for (const i of small.concat(large)) {
+            prob[i] = 1.0;
+        }
+        return { prob, alias };
+    }
+
+    class Snake {
+        constructor(x, y, color, occupancy, tickRate) {
+            this.body = [[x, y]];
+            this.direction = 'RIGHT';
+            this.turns = [];
+            this.color = color;
+            this.alive = true;
+            this.score = 0;
+            this.justDied = false;
+            this.speedBoostTime = 0;
+            this.invincibleTime = 0;
+            this.shieldActive = false;
+            this.tickRate = tickRate;
+            this.moveProgress = 0;
+            this.occupancy = occupancy;
+            this.cells = new Map();
+            this.occupy([x, y]);
+        }
+
+        occupy(cell) {
+            const key = cellKey(cell);
+            this.cells.set(key, (this.cells.get(key) || 0) + 1);
+            if (this.alive) {
+                this.occupancy.set(key, (this.occupancy.get(key) || 0) + 1);
+            }
+        }
+
+        vacate(cell) {
+            const key = cellKey(cell);
+            const count = this.cells.get(key) - 1;
+            if (count) {
+                this.cells.set(key, count);
+            } else {
+                this.cells.delete(key);
+            }
+            if (this.alive) {
+                const remaining = this.occupancy.get(key) - 1;
+                if (remaining) {
+                    this.occupancy.set(key, remaining);
+                } else {
+                    this.occupancy.delete(key);
+                }
+            }
+        }
+
+        release() {
+            if (!this.alive) {
+                return;
+            }
+            for (const [key, count] of this.cells) {
+                const remaining = this.occupancy.get(key) - count;
+                if (remaining) {
+                    this.occupancy.set(key, remaining);
+                } else {
+                    this.occupancy.delete(key);
+                }
+            }
+        }
+
+        die() {
+            this.release();
+            this.alive = false;
+            this.justDied = true;
+        }
+
+        setHead(cell) {
+            this.vacate(this.body[0]);
+            this.body[0] = cell;
+            this.occupy(cell);
+        }
+
+        popTail() {
+            this.vacate(this.body.pop());
+        }
+
+        grow(segments) {
+            const tail = this.body[this.body.length - 1];
+            for (let i = 0; i < segments; i++) {
+                this.body.push(tail);
+                this.occupy(tail);
+            }
+        }
+
+        truncate(length) {
+            for (const cell of this.body.slice(length)) {
+                this.vacate(cell);
+            }
+            this.body.length = length;
+        }
+
+        speed(powerUps, snakeSpeed) {
+            return this.speedBoostTime > 0 ? powerUps.speed.speed : snakeSpeed;
+        }
+
+        // Count down the power-up timers and return how many cells to move this tick
+        advance(powerUps, snakeSpeed) {
+            if (this.speedBoostTime > 0) {
+                this.speedBoostTime -= 1;
+            }
+            if (this.invincibleTime > 0) {
+                this.invincibleTime -= 1;
+            }
+            const progress = this.moveProgress + this.speed(powerUps, snakeSpeed);
+            const moves = Math.floor(progress / this.tickRate);
+            this.moveProgress = progress - moves * this.tickRate;
+            return moves;
+        }
+
+        // Snake.queue_turn
+        queueTurn(direction, limit) {
+            const last = this.turns.length ? this.turns[this.turns.length - 1] : this.direction;
+            if (direction === last || direction === OPPOSITE_DIRECTIONS[last] || this.turns.length >= Math.max(limit, 1)) {
+                return false;
+            }
+            if (limit) {
+                this.turns.push(direction);
+            } else {
+                this.direction = direction;
+            }
+            return true;
+        }
+
+        move() {
+            if (!this.alive || !this.body.length) {
+                return;
+            }
+            if (this.turns.length) {
+                this.direction = this.turns.shift();
+            }
+
+            const head = this.body[0];
+            let newHead;
+            if (this.direction === 'UP') {
+                newHead = [head[0], head[1] - 1];
+            } else if (this.direction === 'DOWN') {
+                newHead = [head[0], head[1] + 1];
+            } else if (this.direction === 'LEFT') {
+                newHead = [head[0] - 1, head[1]];
+            } else if (this.direction === 'RIGHT') {
+                newHead = [head[0] + 1, head[1]];
+            } else {
+                return;
+            }
+            this.body.unshift(newHead);
+            this.occupy(newHead);
+        }
+
+        checkCollision(width, height) {
+            if (!this.alive || !this.body.length) {
+                return;
+            }
+            const invincible = this.invincibleTime > 0;
+            const head = this.body[0];
+
+            // Walls
+            if (!invincible && (head[0] < 0 || head[0] >= width || head[1] < 0 || head[1] >= height)) {
+                if (this.shieldActive) {
+                    this.shieldActive = false;
+                    if (head[0] < 0) {
+                        this.setHead([0, head[1]]);
+                    } else if (head[0] >= width) {
+                        this.setHead([width - 1, head[1]]);
+                    } else if (head[1] < 0) {
+                        this.setHead([head[0], 0]);
+                    } else {
+                        this.setHead([head[0], height - 1]);
+                    }
+                } else {
+                    this.die();
+                }
+                return;
+            }
+
+            // Itself
+            const key = cellKey(head);
+            const ownSegments = this.cells.get(key);
+            if (!invincible && ownSegments > 1) {
+                if (this.shieldActive) {
+                    this.shieldActive = false;
+                    let index = 1;
+                    while (cellKey(this.body[index]) !== key) {
+                        index++;
+                    }
+                    this.truncate(index);
+                } else {
+                    this.die();
+                }
+                return;
+            }
+
+            // Other snakes
+            if (!invincible && (this.occupancy.get(key) || 0) > ownSegments) {
+                if (this.shieldActive) {
+                    this.shieldActive = false;
+                } else {
+                    this.die();
+                }
+            }
+        }
+
+        applyPowerUp(effect, powerUps) {
+            if (effect === 'speed_boost') {
+                this.speedBoostTime = secondsToTicks(powerUps.speed.duration, this.tickRate);
+            } else if (effect === 'invincibility') {
+                this.invincibleTime = secondsToTicks(powerUps.invincible.duration, this.tickRate);
+            } else if (effect === 'shield') {
+                this.shieldActive = true;
+            }
+        }
+
+        // time_left in whole seconds, rounded up
+        powerUpStatus() {
+            const status = {};
+            const speedBoostLeft = Math.ceil(this.speedBoostTime / this.tickRate);
+            const invincibleLeft = Math.ceil(this.invincibleTime / this.tickRate);
+            if (speedBoostLeft > 0) {
+                status.speed_boost = { active: true, time_left: speedBoostLeft, blinking: speedBoostLeft <= 3 };
+            }
+            if (invincibleLeft > 0) {
+                status.invincible = { active: true, time_left: invincibleLeft, blinking: invincibleLeft <= 3 };
+            }
+            if (this.shieldActive) {
+                status.shield = { active: true, time_left: -1, blinking: false };
+            }
+            return status;
+        }
+    }
+
+    class Game {
+        // Built from a lockstep_sync payload (Game.get_sync_state on the server)
+        constructor(sync) {
+            this.sync = sync;
+            this.tick = sync.tick;
+            this.running = sync.running;
+            this.width = sync.board[0];
+            this.height = sync.board[1];
+            this.minFoods = sync.min_foods;
+            this.maxFoods = sync.max_foods;
+            this.tickRate = sync.tick_rate;
+            this.snakeSpeed = sync.snake_speed;
+            this.turnQueueSize = sync.turn_queue_size;
+            this.powerUps = sync.power_ups;
+            this.foodTypes = Object.keys(sync.power_ups);
+            this.foodTable = buildAliasTable(this.foodTypes.map((type) => sync.power_ups[type].weight));
+            this.rng = new PortableRandom(0);
+            this.rng.state = sync.rng;
+
+            this.players = new Map();
+            this.snakes = new Map();  // Same insertion order as the server's dict
+            this.occupancy = new Map();
+            for (const player of sync.players) {
+                this.players.set(player.id, { name: player.name, color: player.color });
+                const snake = new Snake(player.body[0][0], player.body[0][1], player.color, this.occupancy, this.tickRate);
+                if (!player.alive) {
+                    // Dead bodies stay on the board but out of the occupancy grid
+                    snake.release();
+                    snake.alive = false;
+                }
+                for (const cell of player.body.slice(1)) {
+                    snake.body.push(cell);
+                    snake.occupy(cell);
+                }
+                snake.direction = player.direction;
+                snake.turns = player.turns.slice();
+                snake.score = player.score;
+                snake.speedBoostTime = player.speed_boost_time;
+                snake.invincibleTime = player.invincible_time;
+                snake.shieldActive = player.shield_active;
+                snake.moveProgress = player.move_progress;
+                this.snakes.set(player.id, snake);
+            }
+
+            this.foods = new Map();
+            for (const [x, y, type] of sync.foods) {
+                this.foods.set(cellKey([x, y]), { x, y, type });
+            }
+        }
+
+        toSync() {
+            const players = [];
+            for (const [id, snake] of this.snakes) {
+                players.push({
+                    id,
+                    name: this.players.get(id).name,
+                    color: snake.color,
+                    body: snake.body.slice(),
+                    direction: snake.direction,
+                    turns: snake.turns.slice(),
+                    alive: snake.alive,
+                    score: snake.score,
+                    speed_boost_time: snake.speedBoostTime,
+                    invincible_time: snake.invincibleTime,
+                    shield_active: snake.shieldActive,
+                    move_progress: snake.moveProgress
+                });
+            }
+            return Object.assign({}, this.sync, {
+                tick: this.tick,
+                running: this.running,
+                rng: this.rng.state,
+                players,
+                foods: Array.from(this.foods.values(), (food) => [food.x, food.y, food.type])
+            });
+        }
+
+        clone() {
+            return new Game(this.toSync());
+        }
+
+        addPlayer(id, name, color) {
+            const start = spawnPoint(this.players.size, this.width, this.height);
+            this.players.set(id, { name, color });
+            this.snakes.set(id, new Snake(start[0], start[1], color, this.occupancy, this.tickRate));
+        }
+
+        removePlayer(id) {
+            this.players.delete(id);
+            const snake = this.snakes.get(id);
+            if (snake) {
+                snake.release();
+                this.snakes.delete(id);
+            }
+        }
+
+        // Local steering for prediction, with the server's checks
+        setDirection(id, direction) {
+            const snake = this.snakes.get(id);
+            if (!snake || !this.running || !(direction in OPPOSITE_DIRECTIONS)) {
+                return;
+            }
+            snake.queueTurn(direction, this.turnQueueSize);
+        }
+
+        // One entry of lockstep_tick.inputs; the server only sends accepted inputs
+        applyInput(input) {
+            if (input[0] === 'join') {
+                if (!this.players.has(input[1])) {
+                    this.addPlayer(input[1], input[2], input[3]);
+                }
+            } else if (input[0] === 'leave') {
+                this.removePlayer(input[1]);
+            } else if (input[0] === 'move') {
+                const snake = this.snakes.get(input[1]);
+                if (snake) {
+                    snake.queueTurn(input[2], this.turnQueueSize);
+                }
+            }
+        }
+
+        chooseFoodType() {
+            let i = this.rng.randrange(this.foodTypes.length);
+            if (this.rng.random() >= this.foodTable.prob[i]) {
+                i = this.foodTable.alias[i];
+            }
+            return this.foodTypes[i];
+        }
+
+        addFood(cell) {
+            this.foods.set(cellKey(cell), { x: cell[0], y: cell[1], type: this.chooseFoodType() });
+        }
+
+        blockedCells() {
+            const blocked = [this.occupancy];
+            for (const snake of this.snakes.values()) {
+                if (!snake.alive) {
+                    blocked.push(snake.cells);
+                }
+            }
+            return blocked;
+        }
+
+        // FoodStore.spawn
+        spawnFoods(count) {
+            const blocked = this.blockedCells();
+            const isFree = (cell) => {
+                const key = cellKey(cell);
+                return !this.foods.has(key) && blocked.every((cells) => !cells.has(key));
+            };
+
+            let placed = 0;
+            let attempts = SPAWN_ATTEMPTS * count;
+            while (placed < count && attempts > 0) {
+                attempts--;
+                const x = this.rng.randint(0, this.width - 1);
+                const y = this.rng.randint(0, this.height - 1);
+                if (isFree([x, y])) {
+                    this.addFood([x, y]);
+                    placed++;
+                }
+            }
+
+            if (placed < count) {
+                const freeCells = [];
+                for (let x = 0; x < this.width; x++) {
+                    for (let y = 0; y < this.height; y++) {
+                        if (isFree([x, y])) {
+                            freeCells.push([x, y]);
+                        }
+                    }
+                }
+                for (const cell of this.rng.sample(freeCells, Math.min(count - placed, freeCells.length))) {
+                    this.addFood(cell);
+                    placed++;
+                }
+            }
+            return placed;
+        }
+
+        update() {
+            if (!this.running) {
+                return;
+            }
+            this.tick += 1;
+
+            // Power-up timers and movement; a snake faster than the tick rate
+            // moves one cell per step (engine.py takes a shortcut on quiet
+            // ticks with the same result)
+            const moves = new Map();
+            let steps = 0;
+            for (const [id, snake] of this.snakes) {
+                if (snake.alive) {
+                    const count = snake.advance(this.powerUps, this.snakeSpeed);
+                    moves.set(id, count);
+                    steps = Math.max(steps, count);
+                }
+            }
+            for (let step = 0; step < steps; step++) {
+                const movers = [];
+                for (const [id, snake] of this.snakes) {
+                    if ((moves.get(id) || 0) > step && snake.alive) {
+                        movers.push([id, snake]);
+                    }
+                }
+                this.stepSnakes(movers);
+            }
+
+            if (this.foods.size < this.minFoods) {
+                this.spawnFoods(this.minFoods - this.foods.size);
+            }
+
+            let alive = 0;
+            for (const snake of this.snakes.values()) {
+                if (snake.alive) {
+                    alive++;
+                }
+            }
+            if (alive <= 1 && this.snakes.size > 1) {
+                this.running = false;
+            }
+        }
+
+        // Game.step_snakes: move each [id, snake] of movers one cell and settle the consequences
+        stepSnakes(movers) {
+            for (const [, snake] of movers) {
+                snake.move();
+            }
+
+            for (const [, snake] of movers) {
+                snake.checkCollision(this.width, this.height);
+            }
+
+            for (const [, snake] of movers) {
+                if (snake.justDied) {
+                    snake.justDied = false;
+                    if (this.players.size >= 3) {
+                        this.spawnFoods(Math.min(snake.score, this.maxFoods - this.foods.size));
+                    }
+                }
+            }
+
+            const growth = new Map();
+            const eaten = [];
+            for (const [id, snake] of movers) {
+                if (snake.alive && snake.body.length > 0) {
+                    growth.set(id, 0);
+                    const key = cellKey(snake.body[0]);
+                    const food = this.foods.get(key);
+                    if (food) {
+                        const props = this.powerUps[food.type];
+                        snake.score += 1;
+                        growth.set(id, props.growth);
+                        if (props.effect) {
+                            snake.applyPowerUp(props.effect, this.powerUps);
+                        }
+                        eaten.push(key);
+                    }
+                }
+            }
+            for (const key of eaten) {
+                this.foods.delete(key);
+            }
+
+            for (const [id, snake] of movers) {
+                if (snake.alive && snake.body.length > 1) {
+                    const amount = growth.get(id) || 0;
+                    if (amount === 0) {
+                        snake.popTail();
+                    } else {
+                        snake.grow(amount - 1);
+                    }
+                }
+            }
+        }
+
+        // 32-bit FNV-1a over the same values as Game.state_hash
+        stateHash() {
+            const values = [this.tick];
+            for (const snake of this.snakes.values()) {
+                values.push(snake.alive ? 1 : 0, snake.score, DIRECTIONS.indexOf(snake.direction),
+                            snake.speedBoostTime, snake.invincibleTime, snake.shieldActive ? 1 : 0,
+                            snake.moveProgress, snake.turns.length);
+                for (const direction of snake.turns) {
+                    values.push(DIRECTIONS.indexOf(direction));
+                }
+                values.push(snake.body.length);
+                for (const cell of snake.body) {
+                    values.push(cell[0], cell[1]);
+                }
+            }
+            const foods = Array.from(this.foods.values());
+            foods.sort((a, b) => a.x - b.x || a.y - b.y);
+            for (const food of foods) {
+                values.push(food.x, food.y, this.foodTypes.indexOf(food.type));
+            }
+
+            let h = 0x811C9DC5;
+            for (const value of values) {
+                h = Math.imul(h ^ value, 0x01000193) >>> 0;
+            }
+            return h;
+        }
+
+        // Same layout as a game_state keyframe, for renderGameState
+        renderState() {
+            const snakes = {};
+            for (const [id, snake] of this.snakes) {
+                snakes[id] = {
+                    body: snake.body,
+                    color: snake.color,
+                    alive: snake.alive,
+                    score: snake.score,
+                    direction: snake.direction,
+                    power_ups: snake.powerUpStatus()
+                };
+            }
+            const foods = Array.from(this.foods.values(), (food) => ({
+                x: food.x,
+                y: food.y,
+                type: food.type,
+                color: this.powerUps[food.type].color
+            }));
+            return { snakes, foods, running: this.running, tick: this.tick, board: [this.width, this.height] };
+        }
+    }
+
+    return { PortableRandom, buildAliasTable, spawnPoint, Snake, Game };
+})();
+if (typeof module !== 'undefined') {
+    module.exports = SnakeEngine;
+}
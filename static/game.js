@@ -0,0 +1,1236 @@
+const socket = io();
+
+// Game state
+let currentRoom = null;
+let gameRunning = false;
+let canvas, ctx;
+let currentPlayerId = null; // Track the current player's ID
+let world = null; // Last decoded game state (keyframe + applied deltas)
+let palette = null; // Lookup tables for binary frames
+let spectating = false; // Watching a room instead of playing in it
+
+// Binary frames are the default; add ?encoding=json to the URL to opt out
+const useBinary = new URLSearchParams(window.location.search).get('encoding') !== 'json';
+
+// Rooms created with ?netcode=lockstep only send each tick's inputs; the
+// client runs the rules itself (engine.js) and predicts its own moves
+const netcode = new URLSearchParams(window.location.search).get('netcode') === 'lockstep' ? 'lockstep' : 'state';
+const LOCKSTEP_LEAD = 1; // Ticks the prediction runs ahead of the last confirmed tick
+const LOCKSTEP_MAX_LEAD_MS = 600; // ... at most this far ahead, when tick frames arrive late
+const PENDING_MOVE_MS = 1000; // Forget own moves the server has not confirmed by then
+let confirmed = null; // SnakeEngine.Game at the last tick confirmed by the server
+let confirmedAt = 0; // performance.now() when it arrived
+let skipInputs = 0; // Inputs of the next tick already included in the last sync
+let tickMs = 200;
+let pendingMoves = []; // Own moves not yet seen in a lockstep_tick
+let moveSeq = 0; // Number of our last move; the server acknowledges each one
+const moveSentAt = new Map(); // seq -> performance.now() when sent
+
+// DOM elements
+const lobby = document.getElementById('lobby');
+const roomInfo = document.getElementById('roomInfo');
+const gameArea = document.getElementById('gameArea');
+const status = document.getElementById('status');
+const playerNameInput = document.getElementById('playerName');
+const roomIdInput = document.getElementById('roomId');
+const createRoomBtn = document.getElementById('createRoom');
+const arenaSelect = document.getElementById('arenaSelect');
+const joinRoomBtn = document.getElementById('joinRoom');
+const watchRoomBtn = document.getElementById('watchRoom');
+const startGameBtn = document.getElementById('startGame');        const currentRoomIdSpan = document.getElementById('currentRoomId');
+const playersListDiv = document.getElementById('playersList');
+const scoreboardDiv = document.getElementById('scoreboard');
+const countdownOverlay = document.getElementById('countdownOverlay');
+const countdownNumber = document.getElementById('countdownNumber');
+const countdownText = document.getElementById('countdownText');
+
+// Initialize canvas
+function initCanvas() {
+    canvas = document.getElementById('gameCanvas');
+    ctx = canvas.getContext('2d');
+}
+
+// Show status message
+function showStatus(message, isError = false) {
+    status.textContent = message;
+    status.className = `status ${isError ? 'error' : 'success'}`;
+    status.style.display = 'block';
+    setTimeout(() => {
+        status.style.display = 'none';
+    }, 3000);
+}
+
+// Event listeners
+createRoomBtn.addEventListener('click', () => {
+    const playerName = playerNameInput.value.trim();
+    if (!playerName) {
+        showStatus('Please enter your name!', true);
+        return;
+    }
+    
+    console.log('Creating room with player name:', playerName);
+    socket.emit('create_room', { playerName: playerName, netcode: netcode, arena: arenaSelect.value });
+});
+
+joinRoomBtn.addEventListener('click', () => {
+    const playerName = playerNameInput.value.trim();
+    const roomId = roomIdInput.value.trim();
+    
+    if (!playerName || !roomId) {
+        showStatus('Please enter your name and room ID!', true);
+        return;
+    }
+    
+    console.log('Joining room:', roomId, 'with player name:', playerName);
+    socket.emit('join_room', { roomId: roomId, playerName: playerName });
+});
+
+watchRoomBtn.addEventListener('click', () => {
+    const roomId = roomIdInput.value.trim();
+    if (!roomId) {
+        showStatus('Please enter a room ID!', true);
+        return;
+    }
+    socket.emit('spectate_room', { roomId: roomId });
+});
+
+startGameBtn.addEventListener('click', () => {
+    console.log('Start game button clicked');
+    startGameBtn.disabled = true;
+    startGameBtn.textContent = 'Starting...';
+    socket.emit('start_game');
+});
+
+// Keyboard controls
+document.addEventListener('keydown', (e) => {
+    if (!gameRunning || spectating) {
+        console.log('Game not running, ignoring keypress');
+        return;
+    }
+    
+    let direction = null;
+    switch(e.key) {
+        case 'ArrowUp':
+        case 'w':
+        case 'W':
+            direction = 'UP';
+            break;
+        case 'ArrowDown':
+        case 's':
+        case 'S':
+            direction = 'DOWN';
+            break;
+        case 'ArrowLeft':
+        case 'a':
+        case 'A':
+            direction = 'LEFT';
+            break;
+        case 'ArrowRight':
+        case 'd':
+        case 'D':
+            direction = 'RIGHT';
+            break;
+    }
+    
+    if (direction) {
+        console.log('Sending move direction:', direction);
+        e.preventDefault();
+        moveSeq++;
+        moveSentAt.set(moveSeq, performance.now());
+        socket.emit('player_move', { direction: direction, seq: moveSeq });
+        if (confirmed) {
+            pendingMoves.push({ direction: direction, tick: confirmed.tick });
+            renderPrediction();
+        }
+    }
+});
+
+// Socket event handlers
+socket.on('room_created', (data) => {
+    console.log('Room created:', data);
+    currentRoom = data.roomId;
+    currentPlayerId = socket.id; // Set current player ID
+    currentRoomIdSpan.textContent = data.roomId;
+    
+    lobby.style.display = 'none';
+    roomInfo.style.display = 'block';
+    startGameBtn.style.display = 'block';
+    
+    showStatus(`Room created! Share ID: ${data.roomId}`);
+});
+
+socket.on('room_joined', (data) => {
+    console.log('Room joined:', data);
+    currentRoom = data.roomId;
+    currentPlayerId = socket.id; // Set current player ID
+    currentRoomIdSpan.textContent = data.roomId;
+    lobby.style.display = 'none';
+    roomInfo.style.display = 'block';
+    
+    updatePlayersList(data.players);
+    showStatus('Joined room successfully!');
+    
+    // Show start button only if you're the first player (room creator)
+    if (data.isRoomCreator) {
+        startGameBtn.style.display = 'block';
+    }
+});
+
+// Spectators get a full game_state every few ticks and never play
+socket.on('spectating', (data) => {
+    spectating = true;
+    currentRoom = data.roomId;
+    currentRoomIdSpan.textContent = data.roomId;
+    lobby.style.display = 'none';
+    roomInfo.style.display = 'none';
+    gameArea.style.display = 'block';
+    initCanvas();
+    updatePlayersList(data.players);
+    showStatus(`Watching room ${data.roomId}`);
+});
+
+socket.on('room_closed', (data) => {
+    spectating = false;
+    currentRoom = null;
+    gameRunning = false;
+    world = null;
+    confirmed = null;
+    pendingMoves = [];
+    gameArea.style.display = 'none';
+    roomInfo.style.display = 'none';
+    startGameBtn.style.display = 'none';
+    countdownOverlay.style.display = 'none';
+    lobby.style.display = 'block';
+    showStatus(data && data.reason === 'idle' ? 'The room was closed after being idle' : 'The room was closed');
+});
+
+socket.on('player_joined', (data) => {
+    console.log('Player joined:', data);
+    updatePlayersList(data.players); // Update with the new players list
+    showStatus(`${data.player_name} joined the game!`);
+});
+
+socket.on('player_left', (data) => {
+    console.log('Player left:', data);
+    updatePlayersList(data.players); // Update with remaining players
+    showStatus('A player left the game');
+});
+
+socket.on('game_started', () => {
+    console.log('Game started - showing game area');
+    roomInfo.style.display = 'none';
+    gameArea.style.display = 'block';
+    initCanvas();
+    showStatus('Game started!');
+    console.log('Canvas initialized, waiting for countdown...');
+    // Don't set gameRunning = true here, wait for actual game state
+});
+  socket.on('countdown', (data) => {
+    console.log('Countdown:', data);
+    
+    // Show countdown overlay
+    countdownOverlay.style.display = 'flex';
+    
+    if (data.count > 0) {
+        // Show countdown number
+        countdownNumber.textContent = data.count;
+        countdownNumber.className = 'countdown-number';
+        countdownText.textContent = 'Get Ready!';
+        countdownText.className = 'countdown-text';
+        
+        // Also show in status for backup
+        showStatus(`Starting in ${data.count}...`);
+    } else {
+        // Show "GO!" message
+        countdownNumber.textContent = 'GO!';
+        countdownNumber.className = 'go-text';
+        countdownText.textContent = 'Fight!';
+        countdownText.className = 'countdown-text';
+        
+        showStatus('GO!');
+        
+        // Hide countdown overlay after showing GO!
+        setTimeout(() => {
+            countdownOverlay.style.display = 'none';
+        }, 1000);
+        
+        console.log('Countdown finished, waiting for game state...');
+    }
+});
+
+socket.on('connect', () => {
+    if (useBinary) {
+        socket.emit('set_encoding', { encoding: 'binary' });
+    }
+});
+
+socket.on('palette', (data) => {
+    palette = data;
+});
+
+// Binary cells arrive as little-endian int16 x,y pairs
+function unpackCells(buffer) {
+    const values = new Int16Array(buffer);
+    const cells = new Array(values.length / 2);
+    for (let i = 0, j = 0; i < values.length; i += 2, j++) {
+        cells[j] = [values[i], values[i + 1]];
+    }
+    return cells;
+}
+
+// Binary foods arrive as int16 x,y,type-index triples
+function unpackFoods(buffer) {
+    const values = new Int16Array(buffer);
+    const foods = [];
+    for (let i = 0; i < values.length; i += 3) {
+        const typeIndex = values[i + 2];
+        foods.push({
+            x: values[i],
+            y: values[i + 1],
+            type: palette.food_types[typeIndex],
+            color: palette.food_colors[typeIndex]
+        });
+    }
+    return foods;
+}
+
+// Turn a binary frame back into the JSON frame layout
+function decodeFrame(frame) {
+    if (!frame.binary) {
+        return frame;
+    }
+    for (const snake of Object.values(frame.snakes)) {
+        for (const key of ['body', 'h', 'g']) {
+            if (key in snake) {
+                snake[key] = unpackCells(snake[key]);
+            }
+        }
+        if (typeof snake.color === 'number') {
+            snake.color = palette.colors[snake.color];
+        }
+        if ('direction' in snake) {
+            snake.direction = palette.directions[snake.direction];
+        }
+    }
+    for (const key of ['foods', 'foods_add']) {
+        if (key in frame) {
+            frame[key] = unpackFoods(frame[key]);
+        }
+    }
+    if ('foods_remove' in frame) {
+        frame.foods_remove = unpackCells(frame.foods_remove);
+    }
+    return frame;
+}
+
+// Keyframes carry the full state; keep a decoded copy that deltas patch
+socket.on('game_state', (frame) => {
+    const gameState = decodeFrame(frame);
+    const foods = new Map();
+    for (const food of gameState.foods) {
+        foods.set(food.x + ',' + food.y, food);
+    }
+    world = {
+        tick: gameState.tick,
+        running: gameState.running,
+        board: gameState.board,
+        snakes: gameState.snakes,
+        foods: foods
+    };
+    if (spectating && gameState.running) {
+        // Next match in the room we are watching
+        roomInfo.style.display = 'none';
+        gameArea.style.display = 'block';
+    }
+    renderGameState(gameState);
+});
+
+socket.on('game_delta', (frame) => {
+    const delta = decodeFrame(frame);
+    if (!world || delta.base !== world.tick) {
+        // Missed a frame - wait for a fresh keyframe
+        console.log('Delta out of sync, requesting keyframe');
+        world = null;
+        socket.emit('request_keyframe');
+        return;
+    }
+    
+    for (const [playerId, change] of Object.entries(delta.snakes)) {
+        let snake = world.snakes[playerId];
+        if (!snake) {
+            snake = world.snakes[playerId] = { body: [], power_ups: {} };
+        }
+        if (change.body) {
+            snake.body = change.body;
+        } else {
+            if (change.h) {
+                for (const head of change.h) {
+                    snake.body.unshift(head);
+                }
+            }
+            if (change.p) {
+                snake.body.length = Math.max(0, snake.body.length - change.p);
+            }
+            if (change.g) {
+                snake.body.push(...change.g);
+            }
+        }
+        for (const key of ['color', 'alive', 'score', 'direction', 'power_ups']) {
+            if (key in change) {
+                snake[key] = change[key];
+            }
+        }
+    }
+    for (const playerId of delta.removed_snakes || []) {
+        delete world.snakes[playerId];
+    }
+    for (const pos of delta.foods_remove || []) {
+        world.foods.delete(pos[0] + ',' + pos[1]);
+    }
+    for (const food of delta.foods_add || []) {
+        world.foods.set(food.x + ',' + food.y, food);
+    }
+    world.tick = delta.tick;
+    world.running = delta.running;
+    
+    renderGameState({
+        snakes: world.snakes,
+        foods: Array.from(world.foods.values()),
+        running: world.running,
+        board: world.board
+    });
+});
+
+// Lockstep: a full simulation state, sent at match start and on request
+socket.on('lockstep_sync', (sync) => {
+    confirmed = new SnakeEngine.Game(sync);
+    confirmedAt = performance.now();
+    skipInputs = sync.inputs_applied;
+    tickMs = sync.tick_interval * 1000;
+    pendingMoves = [];
+    renderPrediction();
+});
+
+// Lockstep: the inputs applied before one tick, and now and then the state hash
+socket.on('lockstep_tick', (frame) => {
+    if (!confirmed) {
+        return; // Waiting for the sync we asked for
+    }
+    if (frame.tick !== confirmed.tick + 1) {
+        console.log('Lockstep tick out of order, requesting sync');
+        confirmed = null;
+        socket.emit('request_keyframe');
+        return;
+    }
+    
+    for (const input of frame.inputs.slice(skipInputs)) {
+        confirmed.applyInput(input);
+        if (input[0] === 'move' && input[1] === currentPlayerId) {
+            // Confirmed: drop it (and anything older) from the pending moves
+            const index = pendingMoves.findIndex((move) => move.direction === input[2]);
+            pendingMoves.splice(0, index + 1);
+        }
+    }
+    skipInputs = 0;
+    confirmed.update();
+    confirmedAt = performance.now();
+    
+    if ('hash' in frame && confirmed.stateHash() !== frame.hash) {
+        console.log('Lockstep state diverged at tick', frame.tick, '- requesting sync');
+        confirmed = null;
+        socket.emit('request_keyframe');
+        return;
+    }
+    const pendingTicks = Math.ceil(PENDING_MOVE_MS / tickMs);
+    pendingMoves = pendingMoves.filter((move) => move.tick + pendingTicks >= confirmed.tick);
+    renderPrediction();
+});
+
+// Draw the confirmed state plus our unconfirmed moves, stepped ahead to
+// the tick the server is about to run
+function renderPrediction() {
+    if (!confirmed) {
+        return;
+    }
+    const predicted = confirmed.clone();
+    for (const move of pendingMoves) {
+        predicted.setDirection(currentPlayerId, move.direction);
+    }
+    const late = Math.floor((performance.now() - confirmedAt) / tickMs);
+    const steps = Math.min(LOCKSTEP_LEAD + late, Math.max(LOCKSTEP_LEAD, Math.floor(LOCKSTEP_MAX_LEAD_MS / tickMs)));
+    for (let i = 0; i < steps; i++) {
+        predicted.update();
+    }
+    
+    // Only the server decides when the match is over
+    const gameState = predicted.renderState();
+    gameState.running = confirmed.running;
+    renderGameState(gameState);
+}
+
+// Keep extrapolating while tick frames are late
+setInterval(() => {
+    if (confirmed && confirmed.running && performance.now() - confirmedAt > tickMs) {
+        renderPrediction();
+    }
+}, 50);
+
+// Boards larger than the canvas are drawn through a viewport that follows
+// the player's own snake, with a minimap of the whole board; spectators
+// and dead players see the whole board scaled down instead
+const CELL_SIZE = 20;
+const MINIMAP_SIZE = 150;
+
+function computeView(gameState) {
+    const cols = canvas.width / CELL_SIZE;
+    const rows = canvas.height / CELL_SIZE;
+    const [width, height] = gameState.board || [cols, rows];
+    const view = { x0: 0, y0: 0, cols: cols, rows: rows, cell: CELL_SIZE, partial: false, width: width, height: height };
+    if (width <= cols && height <= rows) {
+        return view;
+    }
+    
+    const own = gameState.snakes[currentPlayerId];
+    if (own && own.alive && own.body.length) {
+        const head = own.body[0];
+        view.x0 = Math.max(0, Math.min(width - cols, head[0] - Math.floor(cols / 2)));
+        view.y0 = Math.max(0, Math.min(height - rows, head[1] - Math.floor(rows / 2)));
+        view.partial = true;
+        return view;
+    }
+    
+    view.cols = width;
+    view.rows = height;
+    view.cell = Math.min(canvas.width / width, canvas.height / height);
+    return view;
+}
+
+function inView(view, cell) {
+    return cell[0] >= view.x0 && cell[0] < view.x0 + view.cols &&
+           cell[1] >= view.y0 && cell[1] < view.y0 + view.rows;
+}
+
+// One rectangle per live segment and food, for the minimap and tiny cells
+function drawOverview(gameState, left, top, scale) {
+    const [width, height] = gameState.board;
+    const size = Math.max(scale, 1);
+    ctx.fillStyle = 'rgba(0, 17, 34, 0.85)';
+    ctx.fillRect(left, top, width * scale, height * scale);
+    for (const food of gameState.foods) {
+        ctx.fillStyle = food.color || '#ff4444';
+        ctx.fillRect(left + food.x * scale, top + food.y * scale, size, size);
+    }
+    for (const snake of Object.values(gameState.snakes)) {
+        if (!snake.alive) {
+            continue;
+        }
+        ctx.fillStyle = snake.color;
+        for (const segment of snake.body) {
+            ctx.fillRect(left + segment[0] * scale, top + segment[1] * scale, size, size);
+        }
+    }
+}
+
+function drawMinimap(gameState, view) {
+    const scale = MINIMAP_SIZE / Math.max(view.width, view.height);
+    const left = canvas.width - view.width * scale - 10;
+    const top = 10;
+    drawOverview(gameState, left, top, scale);
+    ctx.strokeStyle = '#888';
+    ctx.lineWidth = 1;
+    ctx.strokeRect(left, top, view.width * scale, view.height * scale);
+    ctx.strokeStyle = '#fff';
+    ctx.strokeRect(left + view.x0 * scale, top + view.y0 * scale, view.cols * scale, view.rows * scale);
+}
+
+function renderGameState(gameState) {
+    console.log('=== GAME STATE RECEIVED ===');
+    console.log('Game running:', gameState.running);
+    console.log('Snakes data:', gameState.snakes);
+    console.log('Foods data:', gameState.foods);
+    
+    if (!canvas || !ctx) {
+        console.log('Canvas not ready, initializing...');
+        initCanvas();
+        if (!canvas || !ctx) {
+            console.error('Failed to initialize canvas');
+            return;
+        }
+    }
+    
+    // Update gameRunning based on actual game state
+    if (gameState.running && !gameRunning) {
+        console.log('*** GAME IS NOW ACTUALLY RUNNING - ENABLING CONTROLS ***');
+        gameRunning = true;
+    } else if (!gameState.running && gameRunning) {
+        console.log('Game ended');
+        gameRunning = false;
+        showStatus('Game Over!');
+        setTimeout(() => {
+            gameArea.style.display = 'none';
+            roomInfo.style.display = 'block';
+            startGameBtn.disabled = false;
+            startGameBtn.textContent = 'Start Game';
+        }, 3000);
+        return; // Don't draw anything for ended game
+    }
+    
+    // Clear canvas with a visible background
+    ctx.fillStyle = '#001122';
+    ctx.fillRect(0, 0, canvas.width, canvas.height);
+    
+    const view = computeView(gameState);
+    const gridSize = view.cell;
+    if (gridSize < 8) {
+        // Whole large board: too small for the detailed drawing below
+        drawOverview(gameState, 0, 0, gridSize);
+        updateScoreboard(gameState.snakes);
+        return;
+    }
+    ctx.save();
+    ctx.translate(-view.x0 * gridSize, -view.y0 * gridSize);
+    
+    // Draw grid lines for debugging
+    const gridLeft = view.x0 * gridSize;
+    const gridTop = view.y0 * gridSize;
+    const gridRight = Math.min(view.x0 + view.cols, view.width) * gridSize;
+    const gridBottom = Math.min(view.y0 + view.rows, view.height) * gridSize;
+    ctx.strokeStyle = '#333';
+    ctx.lineWidth = 0.5;
+    for (let x = gridLeft; x <= gridRight; x += gridSize) {
+        ctx.beginPath();
+        ctx.moveTo(x, gridTop);
+        ctx.lineTo(x, gridBottom);
+        ctx.stroke();
+    }
+    for (let y = gridTop; y <= gridBottom; y += gridSize) {
+        ctx.beginPath();
+        ctx.moveTo(gridLeft, y);
+        ctx.lineTo(gridRight, y);
+        ctx.stroke();
+    }
+    
+    // Draw snakes
+    console.log('=== DRAWING SNAKES ===');
+    let snakeCount = 0;
+    for (const [playerId, snake] of Object.entries(gameState.snakes)) {
+        snakeCount++;
+        console.log(`Snake ${snakeCount} (${playerId}):`);
+        console.log(`  - Body: ${JSON.stringify(snake.body)}`);
+        console.log(`  - Color: ${snake.color}`);
+        console.log(`  - Alive: ${snake.alive}`);
+        console.log(`  - Score: ${snake.score}`);
+        console.log(`  - Is current player: ${playerId === currentPlayerId}`);
+        
+        if (!snake.alive) {
+            console.log(`  - SKIPPING (dead)`);
+            continue;
+        }                const isCurrentPlayer = playerId === currentPlayerId;
+        
+        // Check for power-up effects using new structure
+        const powerUps = snake.power_ups || {};
+        const hasSpeedBoost = powerUps.speed_boost?.active || false;
+        const isInvincible = powerUps.invincible?.active || false;
+        const hasShield = powerUps.shield?.active || false;
+        
+        // Check for blinking effects (power-ups about to expire)
+        const speedBlinking = powerUps.speed_boost?.blinking || false;
+        const invincibleBlinking = powerUps.invincible?.blinking || false;
+          // Add glow effect for current player and power-ups
+        if (isCurrentPlayer || hasSpeedBoost || isInvincible || hasShield) {
+            // Apply blinking effect for expiring power-ups
+            let glowIntensity = 1.0;
+            if (speedBlinking || invincibleBlinking) {
+                // Create blinking effect using timestamp
+                const blinkSpeed = 8; // 8 blinks per second
+                glowIntensity = (Math.sin(Date.now() / 1000 * blinkSpeed * Math.PI) + 1) / 2;
+                glowIntensity = 0.3 + (glowIntensity * 0.7); // Range from 0.3 to 1.0
+            }
+            
+            if (isInvincible) {
+                ctx.shadowColor = '#4444ff';
+                ctx.shadowBlur = 20 * glowIntensity;
+            } else if (hasSpeedBoost) {
+                ctx.shadowColor = '#ffff44';
+                ctx.shadowBlur = 15 * glowIntensity;
+            } else if (hasShield) {
+                ctx.shadowColor = '#44ff44';
+                ctx.shadowBlur = 12;
+            } else {
+                ctx.shadowColor = snake.color;
+                ctx.shadowBlur = 15;
+            }
+            ctx.shadowOffsetX = 0;
+            ctx.shadowOffsetY = 0;
+        }
+          // Modify snake color based on power-ups with blinking effect
+        let snakeColor = snake.color;
+        let colorIntensity = 1.0;
+        
+        // Apply blinking effect for expiring power-ups
+        if (speedBlinking || invincibleBlinking) {
+            const blinkSpeed = 8; // 8 blinks per second
+            colorIntensity = (Math.sin(Date.now() / 1000 * blinkSpeed * Math.PI) + 1) / 2;
+            colorIntensity = 0.4 + (colorIntensity * 0.6); // Range from 0.4 to 1.0
+        }
+        
+        if (isInvincible) {
+            // Add blue tint for invincibility
+            snakeColor = blendColors(snake.color, '#4444ff', 0.3 * colorIntensity);
+        } else if (hasSpeedBoost) {
+            // Add yellow tint for speed boost
+            snakeColor = blendColors(snake.color, '#ffff44', 0.2 * colorIntensity);
+        }
+        
+        ctx.fillStyle = snakeColor;
+        
+        for (const [index, segment] of snake.body.entries()) {
+            if (!inView(view, segment)) {
+                continue;
+            }
+            const x = segment[0] * gridSize;
+            const y = segment[1] * gridSize;
+            
+            console.log(`  - Drawing segment ${index} at grid(${segment[0]}, ${segment[1]}) = canvas(${x}, ${y})`);
+              if (index === 0) {
+                // Head - make it more visible
+                ctx.fillStyle = snakeColor;
+                ctx.fillRect(x + 1, y + 1, gridSize - 2, gridSize - 2);
+                
+                // Add border for head (enhanced for current player)
+                if (isCurrentPlayer) {
+                    ctx.strokeStyle = '#fff';
+                    ctx.lineWidth = 3;
+                    ctx.strokeRect(x + 1, y + 1, gridSize - 2, gridSize - 2);
+                    // Add inner glow border
+                    ctx.strokeStyle = snakeColor;
+                    ctx.lineWidth = 1;
+                    ctx.strokeRect(x + 2, y + 2, gridSize - 4, gridSize - 4);
+                    
+                    // Add direction arrow for current player (one block ahead)
+                    const arrowX = x + gridSize/2 + (snake.direction === 'RIGHT' ? gridSize : snake.direction === 'LEFT' ? -gridSize : 0);
+                    const arrowY = y + gridSize/2 + (snake.direction === 'DOWN' ? gridSize : snake.direction === 'UP' ? -gridSize : 0);
+                    drawDirectionArrow(arrowX, arrowY, snake.direction);
+                } else {
+                    ctx.strokeStyle = '#fff';
+                    ctx.lineWidth = 2;
+                    ctx.strokeRect(x + 1, y + 1, gridSize - 2, gridSize - 2);
+                }
+                
+                // Draw shield effect around head if active
+                if (hasShield) {
+                    ctx.strokeStyle = '#44ff44';
+                    ctx.lineWidth = 3;
+                    ctx.setLineDash([5, 5]);
+                    ctx.strokeRect(x - 2, y - 2, gridSize + 4, gridSize + 4);
+                    ctx.setLineDash([]); // Reset line dash
+                }
+            } else {
+                // Body
+                ctx.fillStyle = snakeColor;
+                if (isCurrentPlayer) {
+                    // Slightly larger body segments for current player
+                    ctx.fillRect(x + 2, y + 2, gridSize - 4, gridSize - 4);
+                } else {
+                    ctx.fillRect(x + 3, y + 3, gridSize - 6, gridSize - 6);
+                }
+            }
+        }
+        
+        // Reset shadow for other snakes
+        if (isCurrentPlayer) ctx.shadowBlur = 0;
+    }
+      // Draw foods
+    console.log('=== DRAWING FOODS ===');
+    console.log(`Total foods: ${gameState.foods.length}`);
+    
+    gameState.foods.forEach((food, index) => {
+        if (!inView(view, [food.x, food.y])) {
+            return;
+        }
+        console.log(`Food ${index + 1} at grid(${food.x}, ${food.y}) - Type: ${food.type}, Color: ${food.color}`);
+        const foodX = (food.x * gridSize) + (gridSize / 2);
+        const foodY = (food.y * gridSize) + (gridSize / 2);
+        console.log(`Food ${index + 1} at canvas(${foodX}, ${foodY})`);
+        
+        // Use the food's specific color
+        ctx.fillStyle = food.color || '#ff4444';
+        
+        // Different shapes based on food type
+        if (food.type === 'normal') {
+            // Regular circle for normal food
+            ctx.beginPath();
+            ctx.arc(foodX, foodY, gridSize / 3, 0, 2 * Math.PI);
+            ctx.fill();
+        } else if (food.type === 'speed') {
+            // Star shape for speed boost
+            drawStar(ctx, foodX, foodY, 5, gridSize / 3, gridSize / 6);
+        } else if (food.type === 'invincible') {
+            // Diamond shape for invincibility
+            drawDiamond(ctx, foodX, foodY, gridSize / 3);
+        } else if (food.type === 'super') {
+            // Larger circle for super food
+            ctx.beginPath();
+            ctx.arc(foodX, foodY, gridSize / 2.5, 0, 2 * Math.PI);
+            ctx.fill();
+        } else if (food.type === 'shield') {
+            // Shield shape
+            drawShield(ctx, foodX, foodY, gridSize / 3);
+        } else {
+            // Fallback to circle
+            ctx.beginPath();
+            ctx.arc(foodX, foodY, gridSize / 3, 0, 2 * Math.PI);
+            ctx.fill();
+        }
+        
+        // Add glow effect for special foods
+        if (food.type !== 'normal') {
+            ctx.shadowColor = food.color || '#ff4444';
+            ctx.shadowBlur = 12;
+            ctx.beginPath();
+            ctx.arc(foodX, foodY, gridSize / 4, 0, 2 * Math.PI);
+            ctx.fill();
+            ctx.shadowBlur = 0; // Reset shadow
+        }
+    });
+    
+    ctx.restore();
+    if (view.partial) {
+        drawMinimap(gameState, view);
+    }
+    
+    // Update scoreboard
+    updateScoreboard(gameState.snakes);
+    
+    console.log('=== GAME STATE PROCESSING COMPLETE ===');
+}
+
+socket.on('error', (data) => {
+    console.error('Socket error:', data);
+    showStatus(data.message, true);
+});
+
+// The tick that took a move in, and the time from key press to server
+socket.on('input_ack', (data) => {
+    const sentAt = moveSentAt.get(data.seq);
+    moveSentAt.delete(data.seq);
+    if (sentAt !== undefined) {
+        console.log('Move', data.seq, data.accepted ? 'queued for tick' : 'ignored at tick', data.tick,
+                    'after', Math.round(performance.now() - sentAt), 'ms');
+    }
+});
+
+// New event handlers for death, winning, and mean comments
+socket.on('player_died', (data) => {
+    console.log('Player died:', data);
+    showPopup('death', '💀 You Died!', `Sorry ${data.player_name}, you lost this round!`, true);
+});
+
+socket.on('player_won', (data) => {
+    console.log('Player won:', data);
+    showPopup('winner', '🎉 Victory!', `Congratulations ${data.player_name}! You won with ${data.score} points!`, true);
+});
+
+socket.on('mean_comment', (data) => {
+    console.log('Mean comment:', data);
+    showMeanComment(data.comment);
+});
+
+socket.on('foods_spawned', (data) => {
+    console.log('Foods spawned:', data);
+    if (data.foods_count > 0) {
+        showStatus(`💥 ${data.player_name} died and dropped ${data.foods_count} foods! (${data.total_foods} total on field)`);
+    }
+});
+
+socket.on('power_up_activated', (data) => {
+    console.log('Power-up activated:', data);
+    const effectNames = {
+        'speed_boost': '⚡ Speed Boost',
+        'invincibility': '🛡️ Invincibility',
+        'shield': '🔰 Shield Protection'
+    };
+    const effectName = effectNames[data.effect] || data.effect;
+    showStatus(`${effectName} activated by ${data.player_name}!`);
+});
+
+// Helper functions
+function drawDirectionArrow(centerX, centerY, direction) {
+    const arrowSize = 6; // Small arrow size
+    ctx.fillStyle = '#ffffff';
+    ctx.strokeStyle = '#000000';
+    ctx.lineWidth = 1;
+    
+    ctx.beginPath();
+    
+    // Calculate arrow points based on direction
+    let points = [];
+    switch(direction) {
+        case 'UP':
+            points = [
+                [centerX, centerY - arrowSize],      // tip
+                [centerX - arrowSize/2, centerY + arrowSize/2], // left
+                [centerX + arrowSize/2, centerY + arrowSize/2]  // right
+            ];
+            break;
+        case 'DOWN':
+            points = [
+                [centerX, centerY + arrowSize],      // tip
+                [centerX - arrowSize/2, centerY - arrowSize/2], // left
+                [centerX + arrowSize/2, centerY - arrowSize/2]  // right
+            ];
+            break;
+        case 'LEFT':
+            points = [
+                [centerX - arrowSize, centerY],      // tip
+                [centerX + arrowSize/2, centerY - arrowSize/2], // top
+                [centerX + arrowSize/2, centerY + arrowSize/2]  // bottom
+            ];
+            break;
+        case 'RIGHT':
+            points = [
+                [centerX + arrowSize, centerY],      // tip
+                [centerX - arrowSize/2, centerY - arrowSize/2], // top
+                [centerX - arrowSize/2, centerY + arrowSize/2]  // bottom
+            ];
+            break;
+    }
+    
+    // Draw the arrow
+    ctx.moveTo(points[0][0], points[0][1]);
+    ctx.lineTo(points[1][0], points[1][1]);
+    ctx.lineTo(points[2][0], points[2][1]);
+    ctx.closePath();
+    
+    ctx.fill();
+    ctx.stroke();
+}
+
+function showPopup(type, title, message, showCloseButton = false, autoCloseTime = null) {
+    // Remove any existing popups first (except mean comments)
+    const existingPopups = document.querySelectorAll('.popup-overlay:not(.mean-comment-overlay)');
+    existingPopups.forEach(popup => popup.remove());
+
+    // Create popup overlay
+    const overlay = document.createElement('div');
+    overlay.className = 'popup-overlay';
+
+    // Create popup content
+    const popup = document.createElement('div');
+    popup.className = `popup ${type}`;
+
+    popup.innerHTML = `
+        <h2>${title}</h2>
+        <p>${message}</p>
+        ${showCloseButton ? '<button class="close-popup" onclick="this.closest(\'.popup-overlay\').remove()">Close</button>' : ''}
+    `;
+
+    overlay.appendChild(popup);
+    document.body.appendChild(overlay);
+
+    // Auto-close if specified
+    if (autoCloseTime) {
+        setTimeout(() => {
+            if (overlay.parentNode) {
+                overlay.remove();
+            }
+        }, autoCloseTime);
+    }
+
+    // Close on overlay click (but not popup click)
+    overlay.addEventListener('click', (e) => {
+        if (e.target === overlay) {
+            overlay.remove();
+        }
+    });
+}
+
+function showMeanComment(comment) {
+    // Create a small floating comment that appears randomly anywhere on screen
+    const meanCommentDiv = document.createElement('div');
+    meanCommentDiv.className = 'mean-comment-floating';
+    
+    // Calculate random positions across the entire screen
+    const maxWidth = window.innerWidth - 250; // Account for comment width
+    const maxHeight = window.innerHeight - 100; // Account for comment height
+    const randomX = Math.random() * Math.max(maxWidth, 100);
+    const randomY = Math.random() * Math.max(maxHeight, 100);
+    
+    // Choose random animation direction
+    const animations = ['bounceIn', 'slideInRandom', 'popIn', 'wiggleIn'];
+    const randomAnimation = animations[Math.floor(Math.random() * animations.length)];
+    
+    meanCommentDiv.style.cssText = `
+        position: fixed;
+        top: ${randomY}px;
+        left: ${randomX}px;
+        background: linear-gradient(135deg, #ff9a9e 0%, #fecfef 100%);
+        color: #333;
+        padding: 15px 20px;
+        border-radius: 15px;
+        border: 2px solid rgba(255, 255, 255, 0.5);
+        box-shadow: 0 10px 25px rgba(0, 0, 0, 0.3);
+        z-index: 1001;
+        font-size: 14px;
+        font-weight: bold;
+        max-width: 250px;
+        animation: ${randomAnimation} 0.6s ease-out;
+        cursor: pointer;
+        transform-origin: center;
+    `;
+    meanCommentDiv.textContent = comment;
+
+    // Add CSS animations for random positioning
+    if (!document.querySelector('#meanCommentStyles')) {
+        const style = document.createElement('style');
+        style.id = 'meanCommentStyles';
+        style.textContent = `
+            @keyframes bounceIn {
+                from {
+                    transform: scale(0.3) rotate(-10deg);
+                    opacity: 0;
+                }
+                50% {
+                    transform: scale(1.1) rotate(5deg);
+                }
+                to {
+                    transform: scale(1) rotate(0deg);
+                    opacity: 1;
+                }
+            }
+            @keyframes slideInRandom {
+                from {
+                    transform: translateY(-50px) rotate(20deg);
+                    opacity: 0;
+                }
+                to {
+                    transform: translateY(0) rotate(0deg);
+                    opacity: 1;
+                }
+            }
+            @keyframes popIn {
+                from {
+                    transform: scale(0) rotate(180deg);
+                    opacity: 0;
+                }
+                50% {
+                    transform: scale(1.2) rotate(90deg);
+                }
+                to {
+                    transform: scale(1) rotate(0deg);
+                    opacity: 1;
+                }
+            }
+            @keyframes wiggleIn {
+                from {
+                    transform: scale(0.8) rotate(-15deg);
+                    opacity: 0;
+                }
+                25% {
+                    transform: scale(0.9) rotate(10deg);
+                }
+                50% {
+                    transform: scale(1.1) rotate(-5deg);
+                }
+                75% {
+                    transform: scale(0.95) rotate(3deg);
+                }
+                to {
+                    transform: scale(1) rotate(0deg);
+                    opacity: 1;
+                }
+            }
+            @keyframes fadeOutScale {
+                from {
+                    transform: scale(1) rotate(0deg);
+                    opacity: 1;
+                }
+                to {
+                    transform: scale(0.3) rotate(15deg);
+                    opacity: 0;
+                }
+            }
+        `;
+        document.head.appendChild(style);
+    }
+
+    document.body.appendChild(meanCommentDiv);
+
+    // Remove on click
+    meanCommentDiv.addEventListener('click', () => {
+        meanCommentDiv.style.animation = 'fadeOutScale 0.3s ease-in forwards';
+        setTimeout(() => {
+            if (meanCommentDiv.parentNode) {
+                meanCommentDiv.remove();
+            }
+        }, 300);
+    });
+
+    // Auto-remove after 3 seconds
+    setTimeout(() => {
+        if (meanCommentDiv.parentNode) {
+            meanCommentDiv.style.animation = 'fadeOutScale 0.3s ease-in forwards';
+            setTimeout(() => {
+                if (meanCommentDiv.parentNode) {
+                    meanCommentDiv.remove();
+                }
+            }, 300);
+        }
+    }, 3000);
+}
+
+function updatePlayersList(players) {
+    playersListDiv.innerHTML = '';
+    players.forEach(player => {
+        const playerCard = document.createElement('div');
+        const isCurrentPlayer = player.id === currentPlayerId;
+        
+        playerCard.className = 'player-card';
+        playerCard.style.borderLeftColor = player.color;
+        
+        // Highlight current player in lobby
+        if (isCurrentPlayer) {
+            playerCard.style.backgroundColor = 'rgba(255, 255, 255, 0.4)';
+            playerCard.style.fontWeight = 'bold';
+            playerCard.textContent = `👤 ${player.name} (You)`;
+        } else {
+            playerCard.textContent = player.name;
+        }
+        
+        playersListDiv.appendChild(playerCard);
+    });
+}
+  function updateScoreboard(snakes) {
+    scoreboardDiv.innerHTML = '';
+    for (const [playerId, snake] of Object.entries(snakes)) {
+        const scoreCard = document.createElement('div');
+        const isCurrentPlayer = playerId === currentPlayerId;
+        
+        scoreCard.className = 'player-score';
+        scoreCard.style.backgroundColor = snake.color + '40';
+        
+        // Add glow effect for current player in scoreboard
+        if (isCurrentPlayer) {
+            scoreCard.style.border = `2px solid ${snake.color}`;
+            scoreCard.style.boxShadow = `0 0 15px ${snake.color}80`;
+            scoreCard.style.transform = 'scale(1.05)';
+        }
+          // Build power-up status with new structure and blinking
+        let powerUpStatus = '';
+        const powerUps = snake.power_ups || {};
+        
+        if (powerUps.speed_boost?.active) {
+            const timeLeft = powerUps.speed_boost.time_left;
+            const isBlinking = powerUps.speed_boost.blinking;
+            powerUpStatus += isBlinking ? '<span class="blinking-power-up">⚡</span> ' : '⚡ ';
+            if (timeLeft > 0) {
+                powerUpStatus += `(${timeLeft}s) `;
+            }
+        }
+        
+        if (powerUps.invincible?.active) {
+            const timeLeft = powerUps.invincible.time_left;
+            const isBlinking = powerUps.invincible.blinking;
+            powerUpStatus += isBlinking ? '<span class="blinking-power-up">🛡️</span> ' : '🛡️ ';
+            if (timeLeft > 0) {
+                powerUpStatus += `(${timeLeft}s) `;
+            }
+        }
+        
+        if (powerUps.shield?.active) {
+            powerUpStatus += '🔰 ';
+        }
+        
+        scoreCard.innerHTML = `
+            <div style="color: ${snake.color}; font-weight: ${isCurrentPlayer ? 'bold' : 'normal'}">
+                ${isCurrentPlayer ? '👤 You' : 'Player'} ${powerUpStatus}
+            </div>
+            <div>Score: ${snake.score}</div>
+            <div>${snake.alive ? '🐍 Alive' : '💀 Dead'}</div>
+        `;
+        scoreboardDiv.appendChild(scoreCard);
+    }
+}
+
+// Allow Enter key to submit forms
+playerNameInput.addEventListener('keypress', (e) => {
+    if (e.key === 'Enter') {
+        createRoomBtn.click();
+    }
+});
+
+roomIdInput.addEventListener('keypress', (e) => {
+    if (e.key === 'Enter') {
+        joinRoomBtn.click();
+    }
+});
+
+// Helper functions for drawing food shapes
+function drawStar(ctx, x, y, spikes, outerRadius, innerRadius) {
+    let rot = Math.PI / 2 * 3;
+    let cx = x;
+    let cy = y;
+    let step = Math.PI / spikes;
+    
+    ctx.beginPath();
+    ctx.moveTo(cx, cy - outerRadius);
+    
+    for (let i = 0; i < spikes; i++) {
+        let x1 = cx + Math.cos(rot) * outerRadius;
+        let y1 = cy + Math.sin(rot) * outerRadius;
+        ctx.lineTo(x1, y1);
+        rot += step;
+        
+        let x2 = cx + Math.cos(rot) * innerRadius;
+        let y2 = cy + Math.sin(rot) * innerRadius;
+        ctx.lineTo(x2, y2);
+        rot += step;
+    }
+    
+    ctx.lineTo(cx, cy - outerRadius);
+    ctx.closePath();
+    ctx.fill();
+}
+
+function drawDiamond(ctx, x, y, size) {
+    ctx.beginPath();
+    ctx.moveTo(x, y - size);
+    ctx.lineTo(x + size, y);
+    ctx.lineTo(x, y + size);
+    ctx.lineTo(x - size, y);
+    ctx.closePath();
+    ctx.fill();
+}
+
+function drawShield(ctx, x, y, size) {
+    ctx.beginPath();
+    ctx.moveTo(x, y - size);
+    ctx.quadraticCurveTo(x + size, y - size/2, x + size/2, y);
+    ctx.quadraticCurveTo(x, y + size/2, x, y + size);
+    ctx.quadraticCurveTo(x, y + size/2, x - size/2, y);
+    ctx.quadraticCurveTo(x - size, y - size/2, x, y - size);
+    ctx.fill();
+}
+
+// Helper function to blend colors
+function blendColors(color1, color2, ratio) {
+    // Convert hex to RGB
+    const hex1 = color1.replace('#', '');
+    const hex2 = color2.replace('#', '');
+    
+    const r1 = parseInt(hex1.substr(0, 2), 16);
+    const g1 = parseInt(hex1.substr(2, 2), 16);
+    const b1 = parseInt(hex1.substr(4, 2), 16);
+    
+    const r2 = parseInt(hex2.substr(0, 2), 16);
+    const g2 = parseInt(hex2.substr(2, 2), 16);
+    const b2 = parseInt(hex2.substr(4, 2), 16);
+    
+    // Blend
+    const r = Math.round(r1 * (1 - ratio) + r2 * ratio);
+    const g = Math.round(g1 * (1 - ratio) + g2 * ratio);
+    const b = Math.round(b1 * (1 - ratio) + b2 * ratio);
+    
+    // Convert back to hex
+    return '#' + ((1 << 24) + (r << 16) + (g << 8) + b).toString(16).slice(1);
+}